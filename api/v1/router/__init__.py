@@ -1,9 +1,10 @@
 from fastapi import APIRouter
 
-from api.v1.router import dataset, tag, user
+from api.v1.router import dataset, job, tag, user
 
 router = APIRouter()
 
 router.include_router(dataset.router, prefix="/dataset", tags=["Dataset"])
 router.include_router(tag.router, prefix="/tag", tags=["Tag"])
 router.include_router(user.router, prefix="/user", tags=["User"])
+router.include_router(job.router, prefix="/job", tags=["Job"])
@@ -1,19 +1,327 @@
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Literal, Optional, Tuple, Union
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, delete, false, func, or_, select, tuple_
 from sqlalchemy.exc import IntegrityError
-
-from core import Session, db, logger, verify_user
-from schema import Dataset, Metadata, Page, Tag
+from sqlalchemy.orm import selectinload
+
+from core import AsyncSession, config, db, logger, response_cache, verify_user
+from core.cache import TTLCache
+from core.conditional import Version, Versioned
+from schema import (
+    DATASET_FIELDS,
+    Counter,
+    Dataset,
+    DatasetTag,
+    DatasetWithTags,
+    Page,
+    PartialDataset,
+    Tag,
+    decode_cursor,
+    encode_cursor,
+    search_document,
+    search_query,
+)
+from services import (
+    MEDIA_TYPES,
+    DatasetsNotFound,
+    ExportFormatUnavailable,
+    Facets,
+    ImportResult,
+    TagBatch,
+    TagBatchResult,
+    VoteResult,
+    apply_tag_batch,
+    adjust_facets,
+    adjust_tag_facets,
+    cast_vote,
+    count_facets,
+    dataset_facets,
+    import_datasets,
+    open_export,
+    parse_csv,
+    parse_ndjson,
+    read_facets,
+    read_lines,
+    resolve_tag_ids,
+    retract_vote,
+    schedule_probe,
+    vote_buffer,
+)
 
 router = APIRouter()
 
+search_counts = TTLCache(maxsize=1024, ttl=config.SEARCH_COUNT_TTL)
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, UUID]]:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Turns a comma separated fields parameter into column names in response order
+    """
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested.difference(DATASET_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+    return [field for field in DATASET_FIELDS if field in requested]
+
+
+def paginate(
+    statement: Select, page: int, limit: int, after: Optional[Tuple[datetime, UUID]]
+) -> Select:
+    """
+    Orders datasets by (created_at, id) and seeks past the cursor when given, falling back to offset paging.
+    One extra row is fetched to tell whether a next page exists.
+    """
+    statement = statement.order_by(Dataset.created_at, Dataset.id).limit(limit + 1)
+    if after is not None:
+        return statement.filter(tuple_(Dataset.created_at, Dataset.id) > tuple_(*after))
+    return statement.offset((page - 1) * limit)
+
+
+def tag_filter(tag_ids: List[UUID], tags_mode: str):
+    """
+    Matches datasets linked to any or all of the tags through one pass over the tag_id index,
+    rather than an EXISTS probe per dataset
+    """
+    linked = select(DatasetTag.dataset_id).filter(DatasetTag.tag_id.in_(tag_ids))
+    if tags_mode == "all":
+        # (dataset_id, tag_id) is the primary key, so each tag counts at most once
+        linked = linked.group_by(DatasetTag.dataset_id).having(func.count() == len(tag_ids))
+    return Dataset.id.in_(linked)
+
+
+async def resolve_tag_filter(
+    session: AsyncSession, tags: Optional[List[str]], tags_mode: str
+) -> Optional[List[UUID]]:
+    """
+    Ids of the tags to filter on, None without a tag filter. Unknown names match nothing,
+    so with tags_mode "all" a single unknown name leaves no ids and no results.
+    """
+    if not tags:
+        return None
+    tag_ids = await resolve_tag_ids(session, tags)
+    if tags_mode == "all" and len(tag_ids) < len(set(tags)):
+        return []
+    return sorted(tag_ids.values())
+
+
+def search_filters(
+    q: Optional[str],
+    name: Optional[str],
+    source: Optional[str],
+    license: Optional[str],
+    tag_ids: Optional[List[UUID]] = None,
+    tags_mode: str = "any",
+) -> list:
+    filters = [Dataset.deleted_at == None]
+    if q:
+        filters.append(
+            or_(search_document.op("@@")(search_query(q)), Dataset.name.op("%")(q))
+        )
+    if name:
+        filters.append(Dataset.name.ilike(f"%{name}%"))
+    if source:
+        filters.append(Dataset.source.ilike(f"%{source}%"))
+    if license:
+        filters.append(Dataset.license.ilike(f"%{license}%"))
+    if tag_ids is not None:
+        filters.append(tag_filter(tag_ids, tags_mode) if tag_ids else false())
+    return filters
+
+
+def search_rank(q: str):
+    """
+    Relevance of a dataset to a full text search, the better of its text rank and its name's similarity
+    """
+    return func.greatest(func.ts_rank(search_document, search_query(q)), func.similarity(Dataset.name, q))
+
+
+async def count_datasets(session: AsyncSession, filters: list, key: tuple) -> int:
+    """
+    Counts the datasets matching a search, totals are cached per filter set for SEARCH_COUNT_TTL seconds
+    so paging through results only pays for the COUNT once
+    """
+    count = search_counts.get(key)
+    if count is None:
+        count = await session.scalar(
+            select(func.count()).select_from(Dataset).filter(*filters)
+        )
+        search_counts.set(key, count)
+    return count
+
+
+def with_tags(statement: Select, include_tags: bool) -> Select:
+    """
+    Loads the active tags of every dataset in one extra query instead of one per dataset
+    """
+    if include_tags:
+        return statement.options(selectinload(Dataset.tags.and_(Tag.deleted_at == None)))
+    return statement
+
+
+def serialize(dataset: Dataset, include_tags: bool) -> dict:
+    if include_tags:
+        return {**dataset.to_dict(), "tags": [tag.to_dict() for tag in dataset.tags]}
+    return dataset.to_dict()
+
+
+# Most recent write to any dataset and to any tag, soft deletes included. Scalar subqueries,
+# so they can ride along with the query that loads a page or dataset.
+DATASETS_UPDATED_AT = select(func.max(Dataset.updated_at)).scalar_subquery().label("datasets_updated_at")
+TAGS_UPDATED_AT = select(func.max(Tag.updated_at)).scalar_subquery().label("tags_updated_at")
+
+
+def latest_columns(include_tags: bool) -> list:
+    return [DATASETS_UPDATED_AT, TAGS_UPDATED_AT] if include_tags else [DATASETS_UPDATED_AT]
+
+
+async def latest_updates(session: AsyncSession, include_tags: bool) -> Tuple[datetime, Optional[datetime]]:
+    row = (await session.execute(select(*latest_columns(include_tags)))).one()
+    return row[0], row[1] if include_tags else None
+
+
+def page_version(
+    rows: List[dict],
+    item_count: int,
+    datasets_updated_at: Optional[datetime],
+    tags_updated_at: Optional[datetime],
+) -> Version:
+    """
+    Validators of a page from the ids, update times and votes of its rows. Flushed votes do not touch
+    updated_at, so they are part of the ETag themselves.
+    """
+    return Version.of(
+        [(row["id"], row["updated_at"], row["votes"]) for row in rows],
+        item_count,
+        tags_updated_at,
+        last_modified=max(filter(None, (datasets_updated_at, tags_updated_at)), default=None),
+    )
+
+
+async def validate_page(
+    session: AsyncSession, statement: Select, item_count: int, include_tags: bool
+) -> Version:
+    """
+    Validators of a page for a conditional request, without loading the rows themselves
+    """
+    rows = (
+        await session.execute(
+            statement.with_only_columns(Dataset.id, Dataset.updated_at, Dataset.votes)
+        )
+    ).mappings().all()
+    return page_version(rows, item_count, *await latest_updates(session, include_tags))
+
+
+async def invalidate(*groups: str):
+    """
+    Drops cached search totals and the cached responses of the given groups after a write
+    """
+    search_counts.clear()
+    await response_cache.invalidate(*groups)
+
+
+async def fetch_page(
+    session: AsyncSession,
+    statement: Select,
+    include_tags: bool,
+    fields: Optional[List[str]] = None,
+    extra_columns: Optional[list] = None,
+) -> List[dict]:
+    """
+    Loads datasets as plain column dicts, encoded straight to JSON without ORM instances or model validation.
+    With fields, only those columns are selected, plus id, created_at, updated_at and votes which tags,
+    cursors and validators need. Labeled extra_columns are added to each row. Tags are embedded from one extra
+    query over the link table.
+    """
+    columns = Dataset.__table__.columns
+    if fields is not None:
+        columns = [
+            column
+            for column in columns
+            if column.name in {*fields, "id", "created_at", "updated_at", "votes"}
+        ]
+    rows = [
+        dict(row)
+        for row in (
+            await session.execute(statement.with_only_columns(*columns, *(extra_columns or [])))
+        ).mappings()
+    ]
+    for row in rows:
+        row["tags"] = [] if include_tags else None
+    if not include_tags or not rows:
+        return rows
+
+    by_id = {row["id"]: row for row in rows}
+    links = await session.execute(
+        select(DatasetTag.dataset_id, *Tag.__table__.columns)
+        .join(Tag, Tag.id == DatasetTag.tag_id)
+        .filter(DatasetTag.dataset_id.in_(by_id), Tag.deleted_at == None)
+    )
+    names = [column.name for column in Tag.__table__.columns]
+    for dataset_id, *tag in links:
+        by_id[dataset_id]["tags"].append(dict(zip(names, tag)))
+    return rows
+
+
+async def fetch_versioned_page(
+    session: AsyncSession,
+    statement: Select,
+    include_tags: bool,
+    fields: Optional[List[str]],
+    item_count: int,
+) -> Tuple[List[dict], Version]:
+    """
+    A page and its validators, which come from the rows themselves and the page query, not extra round trips
+    """
+    latest = latest_columns(include_tags)
+    rows = await fetch_page(session, statement, include_tags, fields, latest)
+    if rows:
+        updates = [rows[0].get(column.name) for column in latest]
+        for row in rows:
+            for column in latest:
+                del row[column.name]
+        datasets_updated_at, tags_updated_at = [*updates, None][:2]
+    else:
+        datasets_updated_at, tags_updated_at = await latest_updates(session, include_tags)
+    return rows, page_version(rows, item_count, datasets_updated_at, tags_updated_at)
+
+
+def project(rows: List[dict], fields: Optional[List[str]], include_tags: bool) -> List[dict]:
+    if fields is None:
+        return rows
+    if include_tags:
+        fields = [*fields, "tags"]
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def next_cursor(rows: List[dict], limit: int) -> Optional[str]:
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last["created_at"], last["id"])
+
 
 @router.post("/", response_model=Dataset)
 async def create_dataset(
     input: Dataset,
-    session: Session = Depends(db.get_session),
+    session: AsyncSession = Depends(db.get_async_session),
     user=Depends(verify_user),
 ):
     """
@@ -21,135 +329,384 @@ async def create_dataset(
     """
     try:
         dataset = Dataset(**input.model_dump(exclude=Dataset.get_ignored_fields()))
-        active_datasets_count = (
-            session.query(Metadata)
-            .filter(Metadata.item == "active_datasets_count")
-            .first()
-        )
-
-        if active_datasets_count is None:
-            active_datasets_count = Metadata(item="active_datasets_count", value=0)
-            session.add(active_datasets_count)
-
-        active_datasets_count.value += 1
-
         session.add(dataset)
-        session.commit()
+        await Counter.increment(session, "active_datasets_count")
+        await adjust_facets(session, added=dataset_facets(dataset.license, dataset.format))
+        await session.commit()
+        await invalidate("datasets")
+        await schedule_probe(dataset.id)
         return dataset.to_dict()
     except IntegrityError as e:
-        session.rollback()
+        await session.rollback()
         logger.error(e._message())
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=e._message())
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(str(e))
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-@router.get("/", response_model=Page[Dataset])
-async def get_datasets(
-    page: int = 1,
-    limit: int = Query(10, ge=1, le=100, description="Number of datasets to return"),
-    session: Session = Depends(db.get_session),
+@router.post("/bulk", response_model=ImportResult)
+async def import_datasets_in_bulk(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = Query(
+        None, description="Format of the request body, taken from Content-Type when omitted"
+    ),
+    user=Depends(verify_user),
 ):
     """
-    Use this endpoint to get lists of datasets
+    Use this endpoint to create or update many datasets at once from an NDJSON or CSV body.
+    Datasets are matched by name, rows that fail are listed in errors without stopping the import.
     """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    parse = parse_csv if format == "csv" else parse_ndjson
 
     try:
-        datasets = (
-            session.query(Dataset)
-            .filter(Dataset.deleted_at == None)
-            .limit(limit)
-            .offset((page - 1) * limit)
-            .all()
-        )
-        return Page[Dataset](
-            items=datasets,
-            page=page,
-            limit=limit,
-            item_count=int(
-                session.query(Metadata)
-                .filter(Metadata.item == "active_datasets_count")
-                .first()
-                .value
-            ),
-        )
+        result = await import_datasets(parse(read_lines(request.stream())))
     except Exception as e:
         logger.error(str(e))
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    # Imports update datasets by name, so any cached dataset may be stale
+    await invalidate("datasets", "dataset:*", "tags")
+    return result
+
+
+@router.get("/", response_model=Page[Union[DatasetWithTags, PartialDataset]])
+async def get_datasets(
+    request: Request,
+    page: int = 1,
+    limit: int = Query(10, ge=1, le=100, description="Number of datasets to return"),
+    include_tags: bool = Query(False, description="Embed each dataset's tags"),
+    fields: Optional[str] = Query(
+        None,
+        description="Comma separated dataset fields to return, e.g. id,name,format,votes. All fields when omitted",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor from the previous page, takes precedence over page"
+    ),
+    session: AsyncSession = Depends(db.get_async_session),
+):
+    """
+    Use this endpoint to get lists of datasets
+    """
 
-@router.get("/search", response_model=Page[Dataset])
+    after = parse_cursor(cursor)
+    fields = parse_fields(fields)
+    statement = paginate(select(Dataset).filter(Dataset.deleted_at == None), page, limit, after)
+
+    async def validate():
+        try:
+            item_count = await Counter.total(session, "active_datasets_count")
+            return await validate_page(session, statement, item_count, include_tags)
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def build():
+        try:
+            item_count = await Counter.total(session, "active_datasets_count")
+            datasets, version = await fetch_versioned_page(
+                session, statement, include_tags, fields, item_count
+            )
+            content = {
+                "items": project(datasets[:limit], fields, include_tags),
+                "item_count": item_count,
+                "page": page,
+                "limit": limit,
+                "next_cursor": next_cursor(datasets, limit),
+            }
+            return Versioned(content, version)
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    groups = ["datasets", "tags"] if include_tags else ["datasets"]
+    return await response_cache.respond(request, groups, build, validate)
+
+
+@router.get("/search", response_model=Page[Union[DatasetWithTags, PartialDataset]])
 async def search_datasets(
+    request: Request,
     page: int = 1,
     limit: int = Query(10, ge=1, le=100, description="Number of datasets to return"),
+    include_tags: bool = Query(False, description="Embed each dataset's tags"),
+    fields: Optional[str] = Query(
+        None,
+        description="Comma separated dataset fields to return, e.g. id,name,format,votes. All fields when omitted",
+    ),
+    q: Optional[str] = Query(
+        None,
+        description="Full text search over name, description and source, results are ranked by relevance",
+    ),
     name: str = None,
     source: str = None,
     license: str = None,
-    tags: List[str] = None,
-    session: Session = Depends(db.get_session),
+    tags: List[str] = Query(None),
+    tags_mode: Literal["any", "all"] = Query(
+        "any", description="Whether datasets need any or all of the given tags"
+    ),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor from the previous page, takes precedence over page"
+    ),
+    session: AsyncSession = Depends(db.get_async_session),
 ):
     """
     Use this endpoint to search datasets
     """
 
-    try:
-        datasets = session.query(Dataset).filter(Dataset.deleted_at == None)
-        if name:
-            datasets = datasets.filter(Dataset.name.ilike(f"%{name}%"))
-        if source:
-            datasets = datasets.filter(Dataset.source.ilike(f"%{source}%"))
-        if license:
-            datasets = datasets.filter(Dataset.license.ilike(f"%{license}%"))
-        if tags:
-            datasets = datasets.filter(Dataset.tags.any(Tag.name.in_(tags)))
-
-        datasets = datasets.limit(limit).offset((page - 1) * limit).all()
-        return Page[Dataset](
-            items=[dataset.to_dict() for dataset in datasets],
-            page=page,
-            limit=limit,
-            item_count=len(datasets),
+    after = parse_cursor(cursor)
+    fields = parse_fields(fields)
+    if q and after is not None:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail="Relevance ranked results are paged with page, not cursor",
         )
+
+    try:
+        tag_ids = await resolve_tag_filter(session, tags, tags_mode)
     except Exception as e:
         logger.error(str(e))
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-
-@router.get("/{dataset_id}", response_model=Dataset)
-async def get_dataset(dataset_id: str, session: Session = Depends(db.get_session)):
+    filters = search_filters(q, name, source, license, tag_ids, tags_mode)
+    count_key = (q, name, source, license, tuple(sorted(tags or [])), tags_mode)
+    statement = select(Dataset).filter(*filters)
+    if q:
+        statement = statement.order_by(search_rank(q).desc())
+    statement = paginate(statement, page, limit, after)
+
+    async def validate():
+        try:
+            item_count = await count_datasets(session, filters, count_key)
+            return await validate_page(session, statement, item_count, include_tags)
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def build():
+        try:
+            item_count = await count_datasets(session, filters, count_key)
+            datasets, version = await fetch_versioned_page(
+                session, statement, include_tags, fields, item_count
+            )
+            content = {
+                "items": project(datasets[:limit], fields, include_tags),
+                "item_count": item_count,
+                "page": page,
+                "limit": limit,
+                "next_cursor": None if q else next_cursor(datasets, limit),
+            }
+            return Versioned(content, version)
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    # Tag names are part of the filters, so renaming or deleting a tag changes the results
+    groups = ["datasets", "tags"] if include_tags or tags else ["datasets"]
+    return await response_cache.respond(request, groups, build, validate)
+
+
+@router.get("/export")
+async def export_datasets(
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson",
+    q: Optional[str] = None,
+    name: str = None,
+    source: str = None,
+    license: str = None,
+    tags: List[str] = Query(None),
+    tags_mode: Literal["any", "all"] = Query(
+        "any", description="Whether datasets need any or all of the given tags"
+    ),
+    session: AsyncSession = Depends(db.get_async_session),
+):
     """
-    Use this endpoint to get a specific dataset
+    Use this endpoint to download every dataset matching a search as NDJSON, CSV or Parquet
     """
 
     try:
-        dataset = (
-            session.query(Dataset)
-            .filter(Dataset.id == dataset_id, Dataset.deleted_at == None)
-            .first()
-        )
-        return dataset
+        tag_ids = await resolve_tag_filter(session, tags, tags_mode)
     except Exception as e:
         logger.error(str(e))
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    statement = (
+        select(*Dataset.__table__.columns)
+        .filter(*search_filters(q, name, source, license, tag_ids, tags_mode))
+        .order_by(Dataset.created_at, Dataset.id)
+    )
+    try:
+        content = open_export(statement, format)
+    except ExportFormatUnavailable as e:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return StreamingResponse(
+        content,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="datasets.{format}"'},
+    )
+
+
+@router.get("/facets", response_model=Facets)
+async def get_facets(
+    request: Request,
+    q: Optional[str] = None,
+    name: str = None,
+    source: str = None,
+    license: str = None,
+    tags: List[str] = Query(None),
+    tags_mode: Literal["any", "all"] = Query(
+        "any", description="Whether datasets need any or all of the given tags"
+    ),
+    limit: int = Query(50, ge=1, le=1000, description="Most values returned per facet"),
+    session: AsyncSession = Depends(db.get_async_session),
+):
+    """
+    Use this endpoint to get how many active datasets have each tag, license and format,
+    optionally within the results of a search
+    """
+    try:
+        tag_ids = await resolve_tag_filter(session, tags, tags_mode)
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+    filtered = any((q, name, source, license, tags))
+
+    async def build():
+        try:
+            # Without a search the counts are kept up to date by the write paths
+            if not filtered:
+                return await read_facets(session, limit)
+            filters = search_filters(q, name, source, license, tag_ids, tags_mode)
+            return await count_facets(session, filters, limit)
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return await response_cache.respond(request, ["datasets", "tags"], build)
+
+
+@router.get("/top", response_model=List[DatasetWithTags])
+async def get_top_datasets(
+    request: Request,
+    limit: int = Query(10, ge=1, le=100, description="Number of datasets to return"),
+    session: AsyncSession = Depends(db.get_async_session),
+):
+    """
+    Use this endpoint to get the most voted datasets
+    """
+    # Read in the order of ix_datasets_active_votes, the response is cached until votes are flushed
+    statement = (
+        select(Dataset)
+        .filter(Dataset.deleted_at == None)
+        .order_by(Dataset.votes.desc(), Dataset.id)
+        .limit(limit)
+    )
+
+    async def build():
+        try:
+            return await fetch_page(session, statement, include_tags=False)
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return await response_cache.respond(request, ["datasets", "top"], build)
+
+
+@router.get("/{dataset_id}", response_model=DatasetWithTags)
+async def get_dataset(
+    request: Request,
+    dataset_id: str,
+    include_tags: bool = Query(False, description="Embed the dataset's tags"),
+    session: AsyncSession = Depends(db.get_async_session),
+):
+    """
+    Use this endpoint to get a specific dataset
+    """
+
+    async def validate():
+        try:
+            row = (
+                await session.execute(
+                    select(Dataset.updated_at, Dataset.votes).filter(
+                        Dataset.id == dataset_id, Dataset.deleted_at == None
+                    )
+                )
+            ).one_or_none()
+            if row is not None:
+                _, tags_updated_at = await latest_updates(session, include_tags)
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if row is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+        return dataset_version(row.updated_at, row.votes, tags_updated_at)
+
+    def dataset_version(
+        updated_at: datetime, votes: int, tags_updated_at: Optional[datetime]
+    ) -> Version:
+        # Flushed votes do not touch updated_at, so they are part of the ETag themselves
+        return Version.of(
+            dataset_id,
+            updated_at,
+            votes,
+            tags_updated_at,
+            last_modified=max(filter(None, (updated_at, tags_updated_at))),
+        )
+
+    async def build():
+        try:
+            # The latest tag write rides along with the dataset for the validators
+            row = (
+                await session.execute(
+                    with_tags(
+                        select(Dataset, *([TAGS_UPDATED_AT] if include_tags else [])).filter(
+                            Dataset.id == dataset_id, Dataset.deleted_at == None
+                        ),
+                        include_tags,
+                    )
+                )
+            ).one_or_none()
+        except Exception as e:
+            logger.error(str(e))
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if row is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+        dataset, tags_updated_at = [*row, None][:2]
+        return Versioned(
+            DatasetWithTags.model_validate(serialize(dataset, include_tags)),
+            dataset_version(dataset.updated_at, dataset.votes, tags_updated_at),
+        )
+
+    groups = [f"dataset:{dataset_id}", "dataset:*"]
+    if include_tags:
+        groups.append("tags")
+    return await response_cache.respond(request, groups, build, validate)
+
 
 @router.get("/tags/{dataset_id}", response_model=List[Tag])
 async def get_tags_for_dataset(
-    dataset_id: str, session: Session = Depends(db.get_session)
+    dataset_id: str, session: AsyncSession = Depends(db.get_async_session)
 ):
     """
     Use this endpoint to get all tags for a specific dataset
     """
 
     try:
-        dataset = (
-            session.query(Dataset)
-            .filter(Dataset.id == dataset_id, Dataset.deleted_at == None)
-            .first()
+        tags = await session.scalars(
+            select(Tag)
+            .join(DatasetTag, DatasetTag.tag_id == Tag.id)
+            .join(Dataset, Dataset.id == DatasetTag.dataset_id)
+            .filter(
+                DatasetTag.dataset_id == dataset_id,
+                Dataset.deleted_at == None,
+                Tag.deleted_at == None,
+            )
         )
-        return [tag for tag in dataset.tags if tag.deleted_at == None]
+        return tags.all()
     except Exception as e:
         logger.error(str(e))
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -157,128 +714,240 @@ async def get_tags_for_dataset(
 
 @router.patch("/add_tag/{dataset_id}/{tag_id}", response_model=Dataset)
 async def add_tag_to_dataset(
-    dataset_id: str, tag_id: str, session: Session = Depends(db.get_session)
+    dataset_id: str, tag_id: str, session: AsyncSession = Depends(db.get_async_session)
 ):
     """
     Use this endpoint to add a tag to a specific dataset
     """
     try:
-        dataset = (
-            session.query(Dataset)
-            .filter(Dataset.id == dataset_id, Dataset.deleted_at == None)
-            .first()
+        dataset = await session.scalar(
+            select(Dataset).filter(Dataset.id == dataset_id, Dataset.deleted_at == None)
         )
         if dataset is None:
             raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Dataset not found")
 
-        tag = (
-            session.query(Tag).filter(Tag.id == tag_id, Tag.deleted_at == None).first()
+        tag = await session.scalar(
+            select(Tag).filter(Tag.id == tag_id, Tag.deleted_at == None)
         )
         if tag is None:
             raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Tag not found")
 
-        if tag in dataset.tags:
+        # Check the single link row instead of loading the dataset's whole tag collection
+        if await session.get(DatasetTag, (dataset.id, tag.id)) is not None:
             return dataset
 
-        dataset.tags.append(tag)
-        session.commit()
+        session.add(DatasetTag(dataset_id=dataset.id, tag_id=tag.id))
+        await adjust_tag_facets(session, added=[(dataset.id, tag.id)])
+        # The link lives in its own table, touch the dataset so its validators change
+        dataset.update(updated_at=datetime.now(timezone.utc))
+        await session.commit()
+        await invalidate("datasets", f"dataset:{dataset.id}")
         return dataset
+    except HTTPException:
+        raise
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(str(e))
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 @router.patch("/remove_tag/{dataset_id}/{tag_id}", response_model=Dataset)
 async def remove_tag_from_dataset(
-    dataset_id: str, tag_id: str, session: Session = Depends(db.get_session)
+    dataset_id: str, tag_id: str, session: AsyncSession = Depends(db.get_async_session)
 ):
     """
     Use this endpoint to remove a tag from a specific dataset
     """
 
     try:
-        dataset = (
-            session.query(Dataset)
-            .filter(Dataset.id == dataset_id, Dataset.deleted_at == None)
-            .first()
+        dataset = await session.scalar(
+            select(Dataset).filter(Dataset.id == dataset_id, Dataset.deleted_at == None)
         )
         if not dataset:
             raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Dataset not found")
 
-        tag = (
-            session.query(Tag).filter(Tag.id == tag_id, Tag.deleted_at == None).first()
+        tag = await session.scalar(
+            select(Tag).filter(Tag.id == tag_id, Tag.deleted_at == None)
         )
         if not tag:
             raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Tag not found")
 
-        dataset.tags.remove(tag)
-        session.commit()
+        removed = await session.execute(
+            delete(DatasetTag)
+            .filter(DatasetTag.dataset_id == dataset.id, DatasetTag.tag_id == tag.id)
+            .returning(DatasetTag.dataset_id, DatasetTag.tag_id)
+        )
+        await adjust_tag_facets(session, removed=removed.all())
+        dataset.update(updated_at=datetime.now(timezone.utc))
+        await session.commit()
+        await invalidate("datasets", f"dataset:{dataset.id}")
         return dataset
+    except HTTPException:
+        raise
+    except Exception as e:
+        await session.rollback()
+        logger.error(str(e))
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@router.post("/tags/batch", response_model=TagBatchResult)
+async def update_tags_in_batch(
+    input: TagBatch,
+    session: AsyncSession = Depends(db.get_async_session),
+    user=Depends(verify_user),
+):
+    """
+    Use this endpoint to attach, detach or replace tags on many datasets at once.
+    Operations are applied in order in one transaction and tags that do not exist yet are created.
+    """
+    try:
+        result = await apply_tag_batch(session, input)
+        await session.commit()
+    except DatasetsNotFound as e:
+        await session.rollback()
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail=str(e))
+    except IntegrityError as e:
+        await session.rollback()
+        logger.error(e._message())
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=e._message())
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(str(e))
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    groups = ["datasets", "dataset:*"]
+    if result.created_tags:
+        groups.append("tags")
+    await invalidate(*groups)
+    return result
 
-# @router.put("/upvote/{dataset_id}")
-# async def upvote_dataset(dataset_id: str, session: Session = Depends(db.get_session)):
-#     """
-#     Use this endpoint to upvote a specific dataset
-#     """
 
-#     dataset = session.query(Dataset).filter(Dataset.id == dataset_id, Dataset.deleted_at == None).first()
-#     if not dataset:
-#         raise HTTPException(status.HTTP_404_NOT_FOUND)
+async def record_vote(
+    session: AsyncSession, dataset_id: str, user: dict, value: int
+) -> VoteResult:
+    """
+    Casts, changes or with a value of 0 retracts the user's vote. The dataset's total is updated by the
+    vote buffer, the votes returned include this worker's pending deltas.
+    """
+    try:
+        dataset = await session.scalar(
+            select(Dataset).filter(Dataset.id == dataset_id, Dataset.deleted_at == None)
+        )
+        if dataset is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Dataset not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-#     dataset.votes += 1
-#     session.commit()
-#     return dataset.to_dict()
+    try:
+        if value:
+            delta = await cast_vote(session, user["sub"], dataset.id, value)
+        else:
+            delta = await retract_vote(session, user["sub"], dataset.id)
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.error(str(e))
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    vote_buffer.add(dataset.id, delta)
+    return VoteResult(dataset.id, value, dataset.votes + vote_buffer.pending(dataset.id))
+
+
+@router.put("/upvote/{dataset_id}", response_model=VoteResult)
+async def upvote_dataset(
+    dataset_id: str,
+    session: AsyncSession = Depends(db.get_async_session),
+    user=Depends(verify_user),
+):
+    """
+    Use this endpoint to upvote a specific dataset, voting again has no effect
+    """
+    return await record_vote(session, dataset_id, user, 1)
+
+
+@router.put("/downvote/{dataset_id}", response_model=VoteResult)
+async def downvote_dataset(
+    dataset_id: str,
+    session: AsyncSession = Depends(db.get_async_session),
+    user=Depends(verify_user),
+):
+    """
+    Use this endpoint to downvote a specific dataset, voting again has no effect
+    """
+    return await record_vote(session, dataset_id, user, -1)
+
+
+@router.delete("/vote/{dataset_id}", response_model=VoteResult)
+async def retract_dataset_vote(
+    dataset_id: str,
+    session: AsyncSession = Depends(db.get_async_session),
+    user=Depends(verify_user),
+):
+    """
+    Use this endpoint to take back your vote on a specific dataset
+    """
+    return await record_vote(session, dataset_id, user, 0)
 
 
 @router.patch("/{dataset_id}", response_model=Dataset)
 async def update_dataset(
-    dataset_id: str, input: Dataset, session: Session = Depends(db.get_session)
+    dataset_id: str,
+    input: Dataset,
+    session: AsyncSession = Depends(db.get_async_session),
+    user=Depends(verify_user),
 ):
     """
     Use this endpoint to update a specific dataset
     """
 
     try:
-        dataset = (
-            session.query(Dataset)
-            .filter(Dataset.id == dataset_id, Dataset.deleted_at == None)
-            .first()
+        dataset = await session.scalar(
+            select(Dataset).filter(Dataset.id == dataset_id, Dataset.deleted_at == None)
         )
         if not dataset:
             raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Dataset not found")
 
+        previous = dataset_facets(dataset.license, dataset.format)
+        previous_source = dataset.source
         dataset.update(
             **input.model_dump(exclude=Dataset.get_ignored_fields(), exclude_unset=True)
         )
-        session.commit()
+        await adjust_facets(
+            session, added=dataset_facets(dataset.license, dataset.format), removed=previous
+        )
+        await session.commit()
+        await invalidate("datasets", f"dataset:{dataset.id}")
+        if dataset.source != previous_source:
+            await schedule_probe(dataset.id)
         return dataset
     except IntegrityError as e:
-        session.rollback()
+        await session.rollback()
         logger.error(e._message())
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=e._message())
+    except HTTPException:
+        raise
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(str(e))
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 @router.delete("/{dataset_id}", response_model=str)
-async def delete_dataset(dataset_id: str, session: Session = Depends(db.get_session)):
+async def delete_dataset(dataset_id: str, session: AsyncSession = Depends(db.get_async_session)):
     """
     Use this endpoint to delete a specific dataset
     """
 
     try:
-        dataset = (
-            session.query(Dataset)
+        # Locked so a concurrent delete of the same dataset waits, then finds it deleted and does not
+        # decrement the counters a second time
+        dataset = await session.scalar(
+            select(Dataset)
             .filter(Dataset.id == dataset_id, Dataset.deleted_at == None)
-            .first()
+            .with_for_update()
         )
         if not dataset:
             raise HTTPException(status.HTTP_404_NOT_FOUND)
@@ -288,15 +957,19 @@ async def delete_dataset(dataset_id: str, session: Session = Depends(db.get_sess
         dataset.update(
             deleted_at=datetime.now(timezone.utc), name=f"deleted_{dataset.name}"
         )
-        active_datasets_count = (
-            session.query(Metadata)
-            .filter(Metadata.item == "active_datasets_count")
-            .first()
+        await Counter.increment(session, "active_datasets_count", -1)
+        tag_ids = await session.scalars(
+            select(DatasetTag.tag_id).filter(DatasetTag.dataset_id == dataset.id)
+        )
+        await adjust_facets(
+            session, removed=dataset_facets(dataset.license, dataset.format, tag_ids)
         )
-        active_datasets_count.value -= 1
-        session.commit()
-        return dataset.id
+        await session.commit()
+        await invalidate("datasets", f"dataset:{dataset.id}")
+        return str(dataset.id)
+    except HTTPException:
+        raise
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(str(e))
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,24 @@
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, status
+
+from core import logger
+from services import job_queue
+
+router = APIRouter()
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: UUID):
+    """
+    Use this endpoint to check on a background job, such as a queued verification email
+    """
+    try:
+        job = await job_queue.status(job_id)
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    if job is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    return job
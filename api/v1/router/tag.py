@@ -1,14 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from core import db, Session
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from api.v1.router.dataset import invalidate
+from core import db, AsyncSession, response_cache
+from core.conditional import Version, Versioned
 from schema import Tag
+from services import MEDIA_TYPES, ExportFormatUnavailable, forget_tag_ids, open_export
 from datetime import datetime, timezone
 
 
 router = APIRouter()
 
 
+# Most recent write to any tag, soft deletes included, so the latest write includes tags that left the list
+TAGS_UPDATED_AT = select(func.max(Tag.updated_at)).scalar_subquery().label("tags_updated_at")
+
+
+def list_version(rows: list, last_modified: Optional[datetime]) -> Version:
+    """
+    Validators of a tag list from the ids and update times of its tags
+    """
+    return Version.of(
+        sorted((row["id"], row["updated_at"]) for row in rows), last_modified=last_modified
+    )
+
+
+async def validate_list(session: AsyncSession, filters: list) -> Version:
+    rows = (await session.execute(select(Tag.id, Tag.updated_at).filter(*filters))).mappings().all()
+    return list_version(rows, await session.scalar(select(TAGS_UPDATED_AT)))
+
+
+async def fetch_list(session: AsyncSession, filters: list) -> Versioned:
+    """
+    Tags as plain column dicts, with validators from the same query
+    """
+    rows = [
+        dict(row)
+        for row in (
+            await session.execute(select(*Tag.__table__.columns, TAGS_UPDATED_AT).filter(*filters))
+        ).mappings()
+    ]
+    last_modified = (
+        rows[0]["tags_updated_at"] if rows else await session.scalar(select(TAGS_UPDATED_AT))
+    )
+    for row in rows:
+        del row["tags_updated_at"]
+    return Versioned(rows, list_version(rows, last_modified))
+
+
 @router.post("/")
-async def create_tag(input: Tag, session: Session = Depends(db.get_session)):
+async def create_tag(input: Tag, session: AsyncSession = Depends(db.get_async_session)):
     """
     Use this endpoint to create a new tag
     """
@@ -16,72 +59,137 @@ async def create_tag(input: Tag, session: Session = Depends(db.get_session)):
 
     try:
         session.add(tag)
-        session.commit()
+        await session.commit()
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    await response_cache.invalidate("tags")
     return tag.to_dict()
 
 
 @router.get("/")
-async def get_all_tags(session: Session = Depends(db.get_session)):
+async def get_all_tags(request: Request, session: AsyncSession = Depends(db.get_async_session)):
     """
     Use this endpoint to get all tags
     """
 
-    tags = session.query(Tag).filter(Tag.deleted_at == None).all()
-    return [tag.to_dict() for tag in tags]
+    filters = [Tag.deleted_at == None]
+
+    async def validate():
+        return await validate_list(session, filters)
+
+    async def build():
+        return await fetch_list(session, filters)
+
+    return await response_cache.respond(request, ["tags"], build, validate)
 
 
 @router.get("/search")
-async def search_tags(name: str = None, session: Session = Depends(db.get_session)):
+async def search_tags(
+    request: Request, name: str = None, session: AsyncSession = Depends(db.get_async_session)
+):
     """
     Use this endpoint to search tags
     """
 
-    tags = session.query(Tag).filter(Tag.name.ilike(f"%{name}%"), Tag.deleted_at == None)
-    return [tag.to_dict() for tag in tags.all()]
+    filters = [Tag.name.ilike(f"%{name}%"), Tag.deleted_at == None]
+
+    async def validate():
+        return await validate_list(session, filters)
+
+    async def build():
+        return await fetch_list(session, filters)
+
+    return await response_cache.respond(request, ["tags"], build, validate)
+
+
+@router.get("/export")
+async def export_tags(
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson", name: str = None
+):
+    """
+    Use this endpoint to download all tags as NDJSON, CSV or Parquet
+    """
+
+    statement = (
+        select(*Tag.__table__.columns)
+        .filter(Tag.deleted_at == None)
+        .order_by(Tag.created_at, Tag.id)
+    )
+    if name:
+        statement = statement.filter(Tag.name.ilike(f"%{name}%"))
+    try:
+        content = open_export(statement, format)
+    except ExportFormatUnavailable as e:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return StreamingResponse(
+        content,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="tags.{format}"'},
+    )
 
 
 @router.get("/{tag_id}")
-async def get_tag(tag_id: str, session: Session = Depends(db.get_session)):
+async def get_tag(
+    request: Request, tag_id: str, session: AsyncSession = Depends(db.get_async_session)
+):
     """
     Use this endpoint to get a specific tag
     """
 
-    tag = session.query(Tag).filter(Tag.id == tag_id, Tag.deleted_at == None).first()
-    if not tag:
-        raise HTTPException(status.HTTP_404_NOT_FOUND)
-    return tag.to_dict()
+    async def validate():
+        updated_at = await session.scalar(
+            select(Tag.updated_at).filter(Tag.id == tag_id, Tag.deleted_at == None)
+        )
+        if updated_at is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND)
+        return tag_version(updated_at)
+
+    def tag_version(updated_at: datetime) -> Version:
+        return Version.of(tag_id, updated_at, last_modified=updated_at)
+
+    async def build():
+        tag = await session.scalar(select(Tag).filter(Tag.id == tag_id, Tag.deleted_at == None))
+        if not tag:
+            raise HTTPException(status.HTTP_404_NOT_FOUND)
+        return Versioned(tag.to_dict(), tag_version(tag.updated_at))
+
+    return await response_cache.respond(request, [f"tag:{tag_id}"], build, validate)
 
 
 @router.put("/{tag_id}")
-async def update_tag(tag_id: str, input: Tag, session: Session = Depends(db.get_session)):
+async def update_tag(tag_id: str, input: Tag, session: AsyncSession = Depends(db.get_async_session)):
     """
     Use this endpoint to update a specific tag
     """
 
-    tag = session.query(Tag).filter(Tag.id == tag_id, Tag.deleted_at == None).first()
+    tag = await session.scalar(select(Tag).filter(Tag.id == tag_id, Tag.deleted_at == None))
     if not tag:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
 
     tag.update(**input.model_dump(exclude=Tag.get_ignored_fields()))
-    session.commit()
+    await session.commit()
+    forget_tag_ids()
+    # Tag filtered searches resolve tags by name, their cached totals may count the old tag
+    await invalidate("tags", f"tag:{tag_id}")
     return tag.to_dict()
 
 
 @router.delete("/{tag_id}")
-async def delete_tag(tag_id: str, session: Session = Depends(db.get_session)):
+async def delete_tag(tag_id: str, session: AsyncSession = Depends(db.get_async_session)):
     """
     Use this endpoint to delete a specific tag
     """
 
-    tag = session.query(Tag).filter(Tag.id == tag_id, Tag.deleted_at == None).first()
+    tag = await session.scalar(select(Tag).filter(Tag.id == tag_id, Tag.deleted_at == None))
     if not tag:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
 
     if tag.deleted_at:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
     tag.update(deleted_at=datetime.now(timezone.utc))
-    session.commit()
+    await session.commit()
+    forget_tag_ids()
+    await invalidate("tags", f"tag:{tag_id}")
     return tag.id
\ No newline at end of file
@@ -1,20 +1,29 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 
 from core import logger, supabase
 from schema import UserModel
+from services import JobQueueFull, job_queue
 
 router = APIRouter()
 
 
+@job_queue.register("resend_verification")
+def resend_verification(email: str):
+    supabase.auth.resend({"email": email, "type": "signup"})
+
+
 @router.post("/login")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Use this endpoint to login
     """
     try:
-        response = supabase.auth.sign_in_with_password(
-            {"email": form_data.username, "password": form_data.password}
+        # The Supabase client blocks on its HTTP calls, they run on the thread pool
+        response = await run_in_threadpool(
+            supabase.auth.sign_in_with_password,
+            {"email": form_data.username, "password": form_data.password},
         )
 
         return {"access_token": response.session.access_token, "token_type": "bearer"}
@@ -30,12 +39,13 @@ async def register(form_data: UserModel):
     Use this endpoint to register
     """
     try:
-        response = supabase.auth.sign_up(
+        response = await run_in_threadpool(
+            supabase.auth.sign_up,
             {
                 "email": form_data.email,
                 "password": form_data.password,
                 "options": {"data": {"username": form_data.username}},
-            }
+            },
         )
 
         return {
@@ -51,15 +61,18 @@ async def register(form_data: UserModel):
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
-@router.get("/resend-verification")
+@router.get("/resend-verification", status_code=status.HTTP_202_ACCEPTED)
 async def resent_verification(email: str):
     """
-    Use this endpoint to resend verification
+    Use this endpoint to resend verification, the email is sent in the background and retried on failure
     """
     try:
-        response = supabase.auth.resend({"email": email, "type": "signup"})
-        return {"details": {"message": "Verification email sent successfully"}}
-
+        job = await job_queue.enqueue("resend_verification", email=email)
+    except JobQueueFull as e:
+        logger.error(str(e))
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         logger.error(str(e))
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(e))
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return {"details": {"message": "Verification email queued", "job_id": job.id}}
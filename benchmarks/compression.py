@@ -0,0 +1,41 @@
+"""
+Measures the bytes saved and the CPU spent per encoding and level on a synthetic dataset page.
+
+    python -m benchmarks.compression --items 100 --repeat 50
+"""
+import argparse
+import timeit
+
+import orjson
+
+from benchmarks.serialization import make_rows
+from core.compression import ENCODINGS, LEVELS, compress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--tags", type=int, default=3, help="Tags embedded per dataset")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = make_rows(args.items, args.tags)
+    body = orjson.dumps(
+        {"items": rows, "item_count": len(rows), "page": 1, "limit": len(rows), "next_cursor": None}
+    )
+    print(f"{args.items} items, identity: {len(body)} bytes")
+
+    for encoding in ENCODINGS:
+        for mode in ("dynamic", "cached"):
+            size = len(compress(body, encoding, mode))
+            seconds = min(
+                timeit.repeat(lambda: compress(body, encoding, mode), number=args.repeat, repeat=3)
+            ) / args.repeat
+            print(
+                f"{encoding:>5} {mode:>7} (level {LEVELS[encoding][mode]:>2}): {size:>7} bytes, "
+                f"{size / len(body):6.1%} of identity, {seconds * 1000:7.3f} ms per response"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Checks that the hot dataset queries are planned onto their indexes. Each query is EXPLAINed with sequential
+scans disabled and the script exits non-zero when a plan misses its index. Postgres only, run it after the
+migrations against a seeded database, on near-empty tables the planner may settle on the primary keys instead.
+tests/test_explain.py runs the same checks against the test database.
+
+    DATABASE_URL=postgresql://localhost/odg_bench python -m benchmarks.explain
+"""
+import argparse
+import sys
+from datetime import datetime, timezone
+from uuid import UUID
+
+from sqlalchemy import select
+
+from api.v1.router.dataset import paginate, search_filters
+from core import db
+from schema import Dataset, DatasetTag
+
+
+def hot_queries() -> list:
+    """
+    (name, statement, indexes) of the queries behind list, search and tag lookups,
+    a plan passes when it uses at least one of its indexes
+    """
+    active = select(Dataset).filter(Dataset.deleted_at == None)
+    after = (datetime(2020, 1, 1, tzinfo=timezone.utc), UUID(int=0))
+    return [
+        ("list page", paginate(active, 5, 20, None), ["ix_datasets_active_created_at"]),
+        ("list cursor", paginate(active, 1, 20, after), ["ix_datasets_active_created_at"]),
+        (
+            "search name",
+            paginate(
+                select(Dataset).filter(*search_filters(None, "bench", None, None, None)), 1, 20, None
+            ),
+            ["ix_datasets_active_name_trgm", "ix_datasets_active_created_at"],
+        ),
+        (
+            "search source",
+            select(Dataset).filter(*search_filters(None, None, "statsghana", None, None)),
+            ["ix_datasets_active_source_trgm"],
+        ),
+        (
+            "search license",
+            select(Dataset).filter(*search_filters(None, None, None, "ODbL", None)),
+            ["ix_datasets_active_license_trgm"],
+        ),
+        (
+            "full text",
+            select(Dataset).filter(*search_filters("health survey", None, None, None, None)),
+            ["ix_datasets_search"],
+        ),
+        (
+            "top voted",
+            select(Dataset)
+            .filter(Dataset.deleted_at == None)
+            .order_by(Dataset.votes.desc(), Dataset.id)
+            .limit(10),
+            ["ix_datasets_active_votes"],
+        ),
+        (
+            "all of tags",
+            select(Dataset).filter(
+                *search_filters(None, None, None, None, [UUID(int=1), UUID(int=2)], "all")
+            ),
+            ["ix_dataset_tags_tag_id"],
+        ),
+        (
+            "datasets of tag",
+            select(DatasetTag.dataset_id).filter(DatasetTag.tag_id == UUID(int=0)),
+            ["ix_dataset_tags_tag_id"],
+        ),
+    ]
+
+
+def explain(connection, statement) -> str:
+    compiled = statement.compile(
+        dialect=connection.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    rows = connection.exec_driver_sql(f"EXPLAIN {compiled.string}", compiled.params)
+    return "\n".join(row[0] for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--verbose", action="store_true", help="Print every plan, not only failures")
+    args = parser.parse_args()
+
+    if db.engine.dialect.name != "postgresql":
+        sys.exit(f"explain needs Postgres, DATABASE_URL points at {db.engine.dialect.name}")
+
+    failures = 0
+    with db.engine.connect() as connection:
+        # Fresh statistics, so the planner picks between indexes as it would in production
+        connection.exec_driver_sql("ANALYZE datasets, dataset_tags")
+        connection.exec_driver_sql("SET enable_seqscan = off")
+        for name, statement, indexes in hot_queries():
+            plan = explain(connection, statement)
+            used = [index for index in indexes if index in plan]
+            print(f"{'ok' if used else 'MISSING':>7}  {name}: {', '.join(used or indexes)}")
+            if not used:
+                failures += 1
+            if args.verbose or not used:
+                print(plan, end="\n\n")
+        connection.rollback()
+
+    if failures:
+        sys.exit(f"{failures} queries did not use their index")
+
+
+if __name__ == "__main__":
+    main()
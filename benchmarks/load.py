@@ -0,0 +1,258 @@
+"""
+Drives main.app in process with concurrent clients and writes throughput and latency percentiles as JSON,
+so runs on different commits can be compared. Point DATABASE_URL at a scratch Postgres database.
+The read scenarios also run on SQLite as a stand-in (search falls back to name filters there), the
+create and tag_ops scenarios write through Postgres upserts (ON CONFLICT) and are skipped on it.
+
+    DATABASE_URL=postgresql://localhost/odg_bench python -m benchmarks.load --scale 100k --concurrency 32
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter as Tally
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import select
+
+from benchmarks.seed import SCALES, seed
+from benchmarks.serialization import WORDS
+from core import db, verify_user
+from schema import Dataset, Tag
+
+SCENARIOS = ["list", "search", "detail", "top", "tags", "tag_ops", "create"]
+# Their writes use Postgres INSERT .. ON CONFLICT, for tag links and the sharded counters
+POSTGRES_SCENARIOS = {"tag_ops", "create"}
+
+
+class Workload:
+    """
+    Builds the requests of each scenario from the seeded ids
+    """
+
+    def __init__(self, dataset_ids: list, tag_ids: list, bust_cache: bool, rng: random.Random):
+        self.dataset_ids = dataset_ids
+        self.tag_ids = tag_ids
+        self.bust_cache = bust_cache
+        self.rng = rng
+        self.full_text = db.engine.dialect.name == "postgresql"
+        self.created = itertools.count()
+        self.run_id = f"{time.time_ns():x}"
+
+    def params(self, **params) -> dict:
+        # An unused parameter gives every request its own cache key, measuring the uncached path
+        if self.bust_cache:
+            params["nocache"] = self.rng.getrandbits(64)
+        return params
+
+    def list(self):
+        page = self.rng.randint(1, max(1, min(50, len(self.dataset_ids) // 20)))
+        return "GET", "/api/v1/dataset/", {"params": self.params(page=page, limit=20)}
+
+    def search(self):
+        word = self.rng.choice(WORDS)
+        filters = {"q": word} if self.full_text else {"name": f"bench-00{self.rng.randint(0, 9)}"}
+        return "GET", "/api/v1/dataset/search", {"params": self.params(limit=20, **filters)}
+
+    def detail(self):
+        dataset_id = self.rng.choice(self.dataset_ids)
+        return "GET", f"/api/v1/dataset/{dataset_id}", {"params": self.params(include_tags=True)}
+
+    def top(self):
+        return "GET", "/api/v1/dataset/top", {"params": self.params(limit=20)}
+
+    def tags(self):
+        return "GET", "/api/v1/tag/", {"params": self.params()}
+
+    def tag_ops(self):
+        action = self.rng.choice(["add_tag", "remove_tag"])
+        dataset_id = self.rng.choice(self.dataset_ids)
+        tag_id = self.rng.choice(self.tag_ids)
+        return "PATCH", f"/api/v1/dataset/{action}/{dataset_id}/{tag_id}", {}
+
+    def create(self):
+        index = next(self.created)
+        body = {
+            # Outside the bench-NNNNNNN names, seeding resumes by counting those
+            "name": f"load-{self.run_id}-{index}",
+            "description": " ".join(self.rng.choices(WORDS, k=30)),
+            "source": "https://data.gov.gh/load",
+            "license": "CC-BY-4.0",
+            "format": "csv",
+        }
+        return "POST", "/api/v1/dataset/", {"json": body}
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def summarize(latencies: list, statuses: Tally, errors: int, elapsed: float) -> dict:
+    requests = len(latencies)
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(milliseconds), 3),
+            "p50": round(percentile(milliseconds, 0.50), 3),
+            "p90": round(percentile(milliseconds, 0.90), 3),
+            "p95": round(percentile(milliseconds, 0.95), 3),
+            "p99": round(percentile(milliseconds, 0.99), 3),
+            "max": round(max(milliseconds), 3),
+        }
+        if requests
+        else {},
+        "status": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, make_request, concurrency: int, duration: float, warmup: float
+) -> dict:
+    latencies, statuses = [], Tally()
+    errors = 0
+    measuring = False
+
+    async def worker(deadline: float):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, url, options = make_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **options)
+                await response.aread()
+                status = response.status_code
+            except Exception:
+                status = "exception"
+            latency = time.perf_counter() - start
+            if measuring:
+                latencies.append(latency)
+                statuses[status] += 1
+                if status == "exception" or status >= 500:
+                    errors += 1
+
+    if warmup:
+        await asyncio.gather(*(worker(time.perf_counter() + warmup) for _ in range(concurrency)))
+
+    measuring = True
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(start + duration) for _ in range(concurrency)))
+    return summarize(latencies, statuses, errors, time.perf_counter() - start)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(args) -> dict:
+    from main import app
+
+    # Writes run as a fixed benchmark user instead of verifying tokens with Supabase
+    app.dependency_overrides[verify_user] = lambda: {"sub": "benchmark", "role": "authenticated"}
+
+    seeded = seed(SCALES[args.scale], args.seed) if not args.skip_seed else {}
+    with db.engine.connect() as connection:
+        dataset_ids = [
+            str(id)
+            for id in connection.scalars(
+                select(Dataset.id).filter(Dataset.deleted_at == None).limit(args.sample_ids)
+            )
+        ]
+        tag_ids = [
+            str(id) for id in connection.scalars(select(Tag.id).filter(Tag.deleted_at == None))
+        ]
+
+    scenarios = list(args.scenarios)
+    skipped = []
+    if db.engine.dialect.name != "postgresql":
+        skipped = [name for name in scenarios if name in POSTGRES_SCENARIOS]
+        scenarios = [name for name in scenarios if name not in POSTGRES_SCENARIOS]
+        if skipped:
+            print(f"skipping {', '.join(skipped)}, they need Postgres", flush=True)
+
+    workload = Workload(dataset_ids, tag_ids, args.bust_cache, random.Random(args.seed))
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for name in scenarios:
+                print(f"running {name} for {args.duration}s", flush=True)
+                results[name] = await run_scenario(
+                    client, getattr(workload, name), args.concurrency, args.duration, args.warmup
+                )
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "database": db.engine.dialect.name,
+            "scale": args.scale,
+            "seeded": seeded,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "bust_cache": args.bust_cache,
+            "skipped_scenarios": skipped,
+        },
+        "scenarios": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds measured per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds run before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-seed", action="store_true", help="Use the data already in the database")
+    parser.add_argument(
+        "--bust-cache", action="store_true", help="Give every read its own response cache key"
+    )
+    parser.add_argument(
+        "--sample-ids",
+        type=int,
+        default=10000,
+        help="Dataset ids drawn from for detail and tag requests",
+    )
+    parser.add_argument("--output", default="benchmark-report.json")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    for name, result in report["scenarios"].items():
+        latency = result["latency_ms"]
+        print(
+            f"{name:>8}: {result['throughput_rps']:>8} req/s, p50 {latency.get('p50')} ms, "
+            f"p99 {latency.get('p99')} ms, {result['errors']} errors"
+        )
+    print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
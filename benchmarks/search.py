@@ -0,0 +1,125 @@
+"""
+Times dataset searches at the database, before and after the full text and trigram indexes: the leading
+wildcard ILIKE on name run as a sequential scan like it was before, the same ILIKE on the trigram index,
+and the relevance ranked q search. Each round runs a search's two statements, the COUNT and the first
+page, and the report gives their latency percentiles as JSON. Postgres only.
+
+    DATABASE_URL=postgresql://localhost/odg_bench python -m benchmarks.search --scale 1m
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+
+from api.v1.router.dataset import paginate, search_filters, search_rank
+from benchmarks.load import git_commit, percentile
+from benchmarks.seed import SCALES, seed
+from benchmarks.serialization import WORDS
+from core import db
+from schema import Dataset
+
+VARIANTS = ["ilike_seqscan", "ilike_trigram", "full_text"]
+
+
+def term_for(variant: str, rng: random.Random) -> str:
+    # Seeded names are bench- and seven digits, descriptions are made of WORDS
+    if variant.startswith("ilike"):
+        return f"{rng.randint(0, 9999):04d}"
+    return rng.choice(WORDS)
+
+
+def statements_for(variant: str, term: str) -> tuple:
+    if variant.startswith("ilike"):
+        filters = search_filters(None, term, None, None, None)
+        page = paginate(select(Dataset.id).filter(*filters), 1, 20, None)
+    else:
+        filters = search_filters(term, None, None, None, None)
+        page = paginate(
+            select(Dataset.id).filter(*filters).order_by(search_rank(term).desc()), 1, 20, None
+        )
+    return select(func.count()).select_from(Dataset).filter(*filters), page
+
+
+def run_round(connection, variant: str, term: str) -> float:
+    count, page = statements_for(variant, term)
+    start = time.perf_counter()
+    connection.scalar(count)
+    connection.execute(page).all()
+    return time.perf_counter() - start
+
+
+def run(args) -> dict:
+    seeded = seed(SCALES[args.scale], args.seed) if not args.skip_seed else {}
+    rng = random.Random(args.seed)
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql("ANALYZE datasets")
+        results = {}
+        for variant in args.variants:
+            # GIN indexes are only read through bitmap scans, without them ILIKE scans the table as it did
+            # before the trigram indexes
+            connection.exec_driver_sql(
+                f"SET enable_bitmapscan = {'off' if variant == 'ilike_seqscan' else 'on'}"
+            )
+            timings = []
+            for index in range(args.rounds):
+                elapsed = run_round(connection, variant, term_for(variant, rng))
+                if index >= args.warmup:
+                    timings.append(elapsed * 1000)
+            results[variant] = {
+                "rounds": len(timings),
+                "latency_ms": {
+                    "mean": round(statistics.fmean(timings), 3),
+                    "p50": round(percentile(timings, 0.50), 3),
+                    "p95": round(percentile(timings, 0.95), 3),
+                    "max": round(max(timings), 3),
+                },
+            }
+            print(f"{variant:>13}: p50 {results[variant]['latency_ms']['p50']} ms", flush=True)
+        connection.rollback()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "database": db.engine.dialect.name,
+            "scale": args.scale,
+            "seeded": seeded,
+            "rounds": args.rounds,
+            "warmup": args.warmup,
+        },
+        "variants": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scale", choices=SCALES, default="1m")
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=VARIANTS)
+    parser.add_argument("--rounds", type=int, default=50, help="Searches run per variant")
+    parser.add_argument("--warmup", type=int, default=5, help="Rounds run before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-seed", action="store_true", help="Use the data already in the database")
+    parser.add_argument("--output", default="search-report.json")
+    args = parser.parse_args()
+    if args.warmup >= args.rounds:
+        parser.error("--warmup must be lower than --rounds")
+    if db.engine.dialect.name != "postgresql":
+        sys.exit(f"search needs Postgres, DATABASE_URL points at {db.engine.dialect.name}")
+
+    report = run(args)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
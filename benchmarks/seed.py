@@ -0,0 +1,124 @@
+"""
+Seeds the database from DATABASE_URL with synthetic datasets and tags for the load benchmarks.
+Seeding is resumable: datasets are named bench-0000000 onwards and only the missing ones are inserted.
+
+    python -m benchmarks.seed --scale 100k
+"""
+import argparse
+import random
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import delete, func, insert, select
+
+from benchmarks.serialization import WORDS
+from core import db
+from schema import Counter, Dataset, DatasetTag, Tag
+from services.facets import rebuild_statements
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# Rows per INSERT, 13 dataset columns stay well under Postgres' 32767 bind parameters
+BATCH_SIZE = 2000
+LICENSES = ["CC-BY-4.0", "CC0-1.0", "ODbL-1.0", "MIT", "Proprietary"]
+FORMATS = ["csv", "json", "xlsx", "parquet", "pdf", "shp"]
+SOURCES = ["data.gov.gh", "statsghana.gov.gh", "mofep.gov.gh", "ghs.gov.gh", "cocobod.gh"]
+
+
+def tag_count(datasets: int) -> int:
+    return max(50, datasets // 100)
+
+
+def uuid_for(rng: random.Random) -> UUID:
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def make_tags(count: int, rng: random.Random) -> list:
+    now = datetime.now(tz=timezone.utc)
+    return [
+        {"id": uuid_for(rng), "name": f"bench-tag-{i:05d}", "created_at": now, "updated_at": now}
+        for i in range(count)
+    ]
+
+
+def make_dataset(index: int, rng: random.Random, start: datetime) -> dict:
+    created_at = start + timedelta(seconds=index)
+    return {
+        "id": uuid_for(rng),
+        "name": f"bench-{index:07d}",
+        "description": " ".join(rng.choices(WORDS, k=rng.randint(10, 80))),
+        "source": f"https://{rng.choice(SOURCES)}/datasets/{index}",
+        "license": rng.choice(LICENSES),
+        "format": rng.choice(FORMATS),
+        "size": rng.randint(1_000, 500_000_000),
+        "row_count": rng.randint(10, 5_000_000),
+        "column_count": rng.randint(2, 60),
+        "votes": int(rng.paretovariate(1.2)) - 1,
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+
+def seed(datasets: int, random_seed: int = 0, max_tags_per_dataset: int = 5) -> dict:
+    """
+    Inserts bench datasets up to the requested count and links each to up to max_tags_per_dataset tags.
+    Returns what the database holds afterwards.
+    """
+    rng = random.Random(random_seed)
+    with db.engine.begin() as connection:
+        tag_ids = list(
+            connection.scalars(
+                select(Tag.id).filter(Tag.name.like("bench-tag-%")).order_by(Tag.name)
+            )
+        )
+        if not tag_ids:
+            tags = make_tags(tag_count(datasets), rng)
+            connection.execute(insert(Tag), tags)
+            tag_ids = [tag["id"] for tag in tags]
+
+        # Exactly the seeded names, bench- and seven digits
+        existing = connection.scalar(
+            select(func.count()).select_from(Dataset).filter(Dataset.name.like("bench-" + "_" * 7))
+        )
+
+    # Each index gets its own generator, so resuming produces the same rows as a single run
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    for offset in range(existing, datasets, BATCH_SIZE):
+        rows, links = [], []
+        for index in range(offset, min(offset + BATCH_SIZE, datasets)):
+            row_rng = random.Random(f"{random_seed}-{index}")
+            row = make_dataset(index, row_rng, start)
+            rows.append(row)
+            for tag_id in row_rng.sample(tag_ids, row_rng.randint(0, max_tags_per_dataset)):
+                links.append({"dataset_id": row["id"], "tag_id": tag_id})
+        with db.engine.begin() as connection:
+            connection.execute(insert(Dataset), rows)
+            if links:
+                connection.execute(insert(DatasetTag), links)
+        print(f"seeded {offset + len(rows)}/{datasets} datasets", flush=True)
+
+    with db.engine.begin() as connection:
+        active = connection.scalar(
+            select(func.count()).select_from(Dataset).filter(Dataset.deleted_at == None)
+        )
+        # Replaces the sharded counters' rows with the live counts
+        connection.execute(delete(Counter).filter(Counter.name == "active_datasets_count"))
+        connection.execute(
+            insert(Counter), [{"name": "active_datasets_count", "shard": 0, "value": active}]
+        )
+        for statement in rebuild_statements():
+            connection.execute(statement)
+        tags = connection.scalar(select(func.count()).select_from(Tag))
+    return {"datasets": active, "tags": tags}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(seed(SCALES[args.scale], args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Times tag filtered searches at the database: the old per dataset EXISTS over tag names against the
+tag_id subqueries behind tags_mode=any and tags_mode=all. Each round runs a search's two statements,
+the COUNT and the first page, and the report gives their latency percentiles as JSON.
+
+    DATABASE_URL=postgresql://localhost/odg_bench python -m benchmarks.tag_filter --scale 1m
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+
+from api.v1.router.dataset import paginate, search_filters
+from benchmarks.load import git_commit, percentile
+from benchmarks.seed import SCALES, seed
+from core import db
+from schema import Dataset, Tag
+
+VARIANTS = ["exists", "any", "all"]
+
+
+def filters_for(variant: str, names: list, ids: list) -> list:
+    if variant == "exists":
+        # The filter search used before tags_mode, kept here as the baseline
+        return [Dataset.deleted_at == None, Dataset.tags.any(Tag.name.in_(names))]
+    return search_filters(None, None, None, None, ids, variant)
+
+
+def run_round(connection, filters: list) -> float:
+    start = time.perf_counter()
+    connection.scalar(select(func.count()).select_from(Dataset).filter(*filters))
+    connection.execute(paginate(select(Dataset.id).filter(*filters), 1, 20, None)).all()
+    return time.perf_counter() - start
+
+
+def run(args) -> dict:
+    seeded = seed(SCALES[args.scale], args.seed) if not args.skip_seed else {}
+    rng = random.Random(args.seed)
+    with db.engine.connect() as connection:
+        tags = connection.execute(
+            select(Tag.name, Tag.id).filter(Tag.deleted_at == None).order_by(Tag.name)
+        ).all()
+        # Ids are resolved once, as the cached lookup does in the app
+        searches = [
+            rng.sample(tags, rng.randint(1, min(args.max_tags, len(tags))))
+            for _ in range(args.rounds)
+        ]
+
+        results = {}
+        for variant in args.variants:
+            timings = []
+            for index, search in enumerate(searches):
+                names = [name for name, _ in search]
+                ids = sorted(tag_id for _, tag_id in search)
+                elapsed = run_round(connection, filters_for(variant, names, ids))
+                if index >= args.warmup:
+                    timings.append(elapsed * 1000)
+            results[variant] = {
+                "rounds": len(timings),
+                "latency_ms": {
+                    "mean": round(statistics.fmean(timings), 3),
+                    "p50": round(percentile(timings, 0.50), 3),
+                    "p95": round(percentile(timings, 0.95), 3),
+                    "max": round(max(timings), 3),
+                },
+            }
+            print(f"{variant:>7}: p50 {results[variant]['latency_ms']['p50']} ms", flush=True)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "database": db.engine.dialect.name,
+            "scale": args.scale,
+            "seeded": seeded,
+            "rounds": args.rounds,
+            "warmup": args.warmup,
+            "max_tags": args.max_tags,
+        },
+        "variants": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scale", choices=SCALES, default="100k")
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=VARIANTS)
+    parser.add_argument("--rounds", type=int, default=100, help="Searches run per variant")
+    parser.add_argument("--warmup", type=int, default=10, help="Rounds run before measuring")
+    parser.add_argument("--max-tags", type=int, default=3, help="Most tags in one search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-seed", action="store_true", help="Use the data already in the database")
+    parser.add_argument("--output", default="tag-filter-report.json")
+    args = parser.parse_args()
+    if args.warmup >= args.rounds:
+        parser.error("--warmup must be lower than --rounds")
+
+    report = run(args)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
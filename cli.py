@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import json
+from dataclasses import asdict
+from uuid import UUID
+
+from core import db, response_cache
+from services import (
+    import_datasets,
+    parse_csv,
+    parse_ndjson,
+    probe_datasets,
+    read_lines,
+    rebuild_facets,
+    reconcile_votes,
+)
+
+
+async def read_file(path: str, chunk_size: int = 1 << 16):
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+async def import_command(args):
+    format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    parse = parse_csv if format == "csv" else parse_ndjson
+    result = await import_datasets(
+        parse(read_lines(read_file(args.path))), batch_size=args.batch_size
+    )
+    print(json.dumps(asdict(result), indent=2))
+
+
+async def reconcile_votes_command(args):
+    print(json.dumps({"datasets_updated": await reconcile_votes()}, indent=2))
+
+
+async def rebuild_facets_command(args):
+    async with db.async_session() as session:
+        await rebuild_facets(session)
+        await session.commit()
+    await response_cache.invalidate("datasets")
+    print("facet counts rebuilt")
+
+
+async def probe_command(args):
+    result = await probe_datasets(
+        args.dataset_ids or None,
+        missing_only=not (args.all or args.dataset_ids),
+        limit=args.limit,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+    )
+    print(json.dumps(asdict(result), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open Data Ghana maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser(
+        "import-datasets", help="Create or update datasets from an NDJSON or CSV file"
+    )
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["ndjson", "csv"])
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    import_parser.set_defaults(handler=import_command)
+
+    reconcile_parser = commands.add_parser(
+        "reconcile-votes",
+        help="Recount dataset votes from the votes table, run it while the API is stopped",
+    )
+    reconcile_parser.set_defaults(handler=reconcile_votes_command)
+
+    facets_parser = commands.add_parser(
+        "rebuild-facets", help="Recount the tag, license and format facets of active datasets"
+    )
+    facets_parser.set_defaults(handler=rebuild_facets_command)
+
+    probe_parser = commands.add_parser(
+        "probe-datasets",
+        help="Measure the size, row count and column count of datasets from their sources",
+    )
+    probe_parser.add_argument(
+        "dataset_ids", nargs="*", type=UUID, help="Datasets to probe, all that have no size by default"
+    )
+    probe_parser.add_argument(
+        "--all", action="store_true", help="Probe every active dataset, not only the ones without a size"
+    )
+    probe_parser.add_argument("--limit", type=int)
+    probe_parser.add_argument("--concurrency", type=int)
+    probe_parser.add_argument("--batch-size", type=int)
+    probe_parser.set_defaults(handler=probe_command)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
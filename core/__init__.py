@@ -1,7 +1,9 @@
 # isort:skip_file
-from core.logger import logger
 from core.config import config
+from core.logger import logger
 from core.db import db
 from core.supabase import supabase
 from core.auth import verify_user
+from core.cache import response_cache
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
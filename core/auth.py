@@ -1,14 +1,98 @@
+import hashlib
+import time
+
+import jwt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from core import supabase
+from core import config, logger, supabase
+from core.cache import TTLCache
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/user/login")
 
+# Verified claims keyed by token digest, entries never outlive the token's exp
+verified_tokens = TTLCache(maxsize=config.AUTH_CACHE_SIZE, ttl=config.AUTH_CACHE_TTL)
+
+jwks_client = (
+    jwt.PyJWKClient(config.SUPABASE_JWKS_URL, cache_keys=True)
+    if config.SUPABASE_JWKS_URL
+    else None
+)
+
+# Algorithms accepted for keys from the JWKS, HMAC keys are only ever taken from SUPABASE_JWT_SECRET
+JWKS_ALGORITHMS = {"RS256", "RS384", "RS512", "PS256", "PS384", "PS512", "ES256", "ES384", "ES512", "EdDSA"}
+
+
+class LocalVerificationUnavailable(Exception):
+    pass
+
+
+def verify_locally(token: str) -> dict:
+    """
+    Checks the token's signature, expiry and audience without calling Supabase.
+    Raises jwt.InvalidTokenError for bad tokens and LocalVerificationUnavailable when no local key can verify it
+    """
+    algorithm = jwt.get_unverified_header(token).get("alg")
+
+    if algorithm == "HS256" and config.SUPABASE_JWT_SECRET:
+        key = config.SUPABASE_JWT_SECRET
+    elif algorithm != "HS256" and jwks_client is not None:
+        try:
+            # Fetches the JWKS on first use and whenever an unknown key id shows up
+            signing_key = jwks_client.get_signing_key_from_jwt(token)
+        except jwt.PyJWKClientError as e:
+            raise LocalVerificationUnavailable(str(e))
+        # The key decides the algorithm, the unverified header only has to agree with it
+        algorithm, key = signing_key.algorithm_name, signing_key.key
+        if algorithm not in JWKS_ALGORITHMS:
+            raise jwt.InvalidAlgorithmError(f"{algorithm} keys are not accepted from the JWKS")
+    else:
+        raise LocalVerificationUnavailable(f"No local key for {algorithm} tokens")
+
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=config.JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+
+
+def verify_remotely(token: str) -> dict:
+    user = supabase.auth.get_user(token).user
+    claims = jwt.decode(token, options={"verify_signature": False})
+    return {**claims, "sub": user.id, "email": user.email, "role": user.role}
+
+
 async def verify_user(token: str = Depends(oauth2_scheme)):
-    try:
-        response = supabase.auth.get_user(token)
-        return response
+    key = hashlib.sha256(token.encode()).hexdigest()
+    claims = verified_tokens.get(key)
+    if claims is not None:
+        return claims
 
+    try:
+        if jwt.get_unverified_header(token).get("alg") == "HS256":
+            claims = verify_locally(token)
+        else:
+            # JWKS lookups may block on an HTTP fetch
+            claims = await run_in_threadpool(verify_locally, token)
+    except LocalVerificationUnavailable as e:
+        if not config.AUTH_REMOTE_FALLBACK:
+            logger.warning(f"Token rejected, local verification unavailable: {e}")
+            raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+        try:
+            claims = await run_in_threadpool(verify_remotely, token)
+        except Exception as e:
+            raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    except jwt.InvalidTokenError as e:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
     except Exception as e:
-        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        # Keys that do not fit the token's algorithm surface as TypeError or ValueError from PyJWT
+        logger.warning(f"Token rejected, verification failed: {e!r}")
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+
+    ttl = min(config.AUTH_CACHE_TTL, claims.get("exp", 0) - time.time())
+    if ttl > 0:
+        verified_tokens.set(key, claims, ttl=ttl)
+    return claims
@@ -0,0 +1,250 @@
+import hashlib
+import itertools
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Hashable, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from core import config, logger
+from core.compression import compress, encoded_headers, negotiate
+from core.conditional import Version, Versioned, is_conditional
+
+
+class TTLCache:
+    """
+    In-process LRU cache whose entries also expire after ttl seconds
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MemoryBackend:
+    """
+    Cache backend local to the worker process
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Bounded like the entries. Every version handed out is new, so a group whose version was evicted
+        # starts over at an unused one rather than reviving entries cached under an old one.
+        self.versions = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.clock = itertools.count(1)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self.entries.get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self.entries.set(key, value, ttl=ttl)
+
+    async def get_versions(self, keys: List[str]) -> List[int]:
+        versions = []
+        for key in keys:
+            version = self.versions.get(key)
+            if version is None:
+                version = next(self.clock)
+            # Read versions are kept for a ttl, as long as the entries cached under them
+            self.versions.set(key, version)
+            versions.append(version)
+        return versions
+
+    async def incr(self, key: str):
+        self.versions.set(key, next(self.clock))
+
+
+class RedisBackend:
+    """
+    Cache backend shared by every worker, takes any client with the redis.asyncio interface
+    """
+
+    def __init__(self, client, prefix: str = "opendataghana:cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return await self.client.mget([self.prefix + key for key in keys])
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(self.prefix + key, value, ex=int(ttl))
+
+    async def get_versions(self, keys: List[str]) -> List[int]:
+        values = await self.client.mget([self.prefix + key for key in keys])
+        return [int(value or 0) for value in values]
+
+    async def incr(self, key: str):
+        await self.client.incr(self.prefix + key)
+
+
+class ResponseCache:
+    """
+    Caches encoded JSON responses by route and query parameters.
+    Each entry depends on invalidation groups (e.g. "datasets", "dataset:<id>"), whose current versions are part of
+    the key, so invalidating a group makes every entry that depends on it unreachable.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    async def key(self, request: Request, groups: Iterable[str]) -> str:
+        groups = sorted(groups)
+        versions = await self.backend.get_versions([f"version:{group}" for group in groups])
+        params = urlencode(sorted(request.query_params.multi_items()))
+        raw = f"{request.url.path}?{params}|" + ",".join(
+            f"{group}={version}" for group, version in zip(groups, versions)
+        )
+        return "response:" + hashlib.sha256(raw.encode()).hexdigest()
+
+    async def respond(
+        self,
+        request: Request,
+        groups: Iterable[str],
+        build: Callable[[], Awaitable[Any]],
+        validate: Optional[Callable[[], Awaitable[Version]]] = None,
+    ) -> Response:
+        """
+        Returns the cached response when there is one, otherwise builds, encodes and stores it.
+        Builds that return Versioned give responses ETag and Last-Modified. Conditional requests for an
+        unchanged resource get a 304 from the cached validators or from validate without building the body.
+        """
+        route = request.scope["route"].path
+        encoding = negotiate(request.headers.get("accept-encoding", ""))
+        try:
+            key = await self.key(request, groups)
+            # The compressed variant is fetched alongside, so a hit is one round trip
+            keys = [key, f"{key}:{encoding}"] if encoding else [key]
+            body, compressed = [*await self.backend.get_many(keys), None][:2]
+        except Exception as e:
+            # The cache is an optimization, a broken backend degrades to uncached reads
+            logger.warning(f"Response cache unavailable: {e}")
+            key = body = compressed = None
+
+        if body is not None:
+            self.hits[route] += 1
+            version, body = unpack(body)
+            if version and version.matches(request):
+                return version.not_modified()
+            return await self.response(key, version, body, encoding, compressed, "HIT")
+
+        self.misses[route] += 1
+        # Only a conditional request is worth the extra queries of validating before the build
+        if validate and is_conditional(request):
+            version = await validate()
+            if version and version.matches(request):
+                return version.not_modified()
+
+        content, version = await build(), None
+        if isinstance(content, Versioned):
+            content, version = content.content, content.version
+        body = encode(content)
+        if key is not None:
+            try:
+                await self.backend.set(key, pack(version, body), self.ttl)
+            except Exception as e:
+                logger.warning(f"Response cache unavailable: {e}")
+        return await self.response(key, version, body, encoding, None, "MISS")
+
+    async def response(
+        self,
+        key: Optional[str],
+        version: Optional[Version],
+        body: bytes,
+        encoding: Optional[str],
+        compressed: Optional[bytes],
+        cache_status: str,
+    ) -> Response:
+        """
+        Serves the payload in the negotiated encoding, compressing it once per encoding and caching the result
+        """
+        headers = {"X-Cache": cache_status, **(version.headers() if version else {})}
+        if encoding is None or len(body) < config.COMPRESSION_MIN_SIZE:
+            return Response(body, media_type="application/json", headers=headers)
+
+        if compressed is None:
+            compressed = compress(body, encoding, mode="cached")
+            if key is not None:
+                try:
+                    await self.backend.set(f"{key}:{encoding}", compressed, self.ttl)
+                except Exception as e:
+                    logger.warning(f"Response cache unavailable: {e}")
+
+        response = Response(compressed, media_type="application/json", headers=headers)
+        encoded_headers(response.headers, encoding)
+        return response
+
+    async def invalidate(self, *groups: str):
+        for group in groups:
+            try:
+                await self.backend.incr(f"version:{group}")
+            except Exception as e:
+                logger.error(f"Failed to invalidate cached responses for {group}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            route: {"hits": self.hits[route], "misses": self.misses[route]}
+            for route in set(self.hits) | set(self.misses)
+        }
+
+
+def encode(content: Any) -> bytes:
+    if isinstance(content, BaseModel):
+        return content.model_dump_json().encode()
+    # asyncpg returns its own UUID subclass, which orjson only encodes through default
+    return orjson.dumps(content, default=str)
+
+
+def pack(version: Optional[Version], body: bytes) -> bytes:
+    return (version.dumps() if version else b"null") + b"\n" + body
+
+
+def unpack(data: bytes) -> Tuple[Optional[Version], bytes]:
+    header, body = data.split(b"\n", 1)
+    return (Version.loads(header) if header != b"null" else None), body
+
+
+def get_backend():
+    if config.CACHE_BACKEND == "redis":
+        import redis.asyncio
+
+        return RedisBackend(redis.asyncio.Redis.from_url(config.CACHE_REDIS_URL))
+    return MemoryBackend(maxsize=config.CACHE_MAX_ENTRIES, ttl=config.CACHE_TTL)
+
+
+response_cache = ResponseCache(get_backend(), ttl=config.CACHE_TTL)
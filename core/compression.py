@@ -0,0 +1,174 @@
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from core import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Media types worth compressing, Parquet and images are already compressed
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Levels for responses compressed on every request, and for cached payloads compressed once and served many times
+LEVELS = {
+    "br": {"dynamic": 4, "cached": 9},
+    "zstd": {"dynamic": 3, "cached": 10},
+    "gzip": {"dynamic": 6, "cached": 6},
+}
+
+
+def available_encodings() -> list:
+    """
+    Encodings this process can produce, in order of preference
+    """
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+ENCODINGS = available_encodings()
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Picks the preferred encoding the client accepts, None means the response goes out uncompressed
+    """
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if coding:
+            weights[coding.strip()] = weight
+
+    accepted = [
+        encoding for encoding in ENCODINGS if weights.get(encoding, weights.get("*", 0)) > 0
+    ]
+    if not accepted:
+        return None
+    # Server preference breaks ties, a client weight only reorders when it is strictly higher
+    return max(accepted, key=lambda encoding: weights.get(encoding, weights.get("*", 0)))
+
+
+class Compressor:
+    """
+    Incremental compressor with the same interface for every encoding
+    """
+
+    def __init__(self, encoding: str, mode: str = "dynamic"):
+        level = LEVELS[encoding][mode]
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=level)
+            self.compress = compressor.process
+            self.flush = compressor.finish
+        elif encoding == "zstd":
+            compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self.compress = compressor.compress
+            self.flush = compressor.flush
+        else:
+            # wbits of 16 + MAX_WBITS writes the gzip header and trailer
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.compress = compressor.compress
+            self.flush = compressor.flush
+
+
+def compress(body: bytes, encoding: str, mode: str = "dynamic") -> bytes:
+    compressor = Compressor(encoding, mode)
+    return compressor.compress(body) + compressor.flush()
+
+
+def is_compressible(headers: Headers) -> bool:
+    return "content-encoding" not in headers and headers.get("content-type", "").startswith(
+        COMPRESSIBLE_TYPES
+    )
+
+
+def encoded_headers(headers: MutableHeaders, encoding: str):
+    headers["Content-Encoding"] = encoding
+    headers.add_vary_header("Accept-Encoding")
+    # The compressed bytes differ from the identity representation, so the ETag can only be weak
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least minimum_size bytes with the encoding negotiated from Accept-Encoding.
+    Streaming responses are compressed chunk by chunk, responses that already carry a Content-Encoding
+    (such as precompressed cached payloads) pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = config.COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                return await send(message)
+
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether compression applies
+                start = message
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not is_compressible(headers) or (
+                    not more_body and len(body) < self.minimum_size
+                ):
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+
+                compressor = Compressor(encoding)
+                encoded_headers(headers, encoding)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = compressor.compress(body) + compressor.flush()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    return await send({"type": "http.response.body", "body": body})
+                await send(start)
+
+            body = compressor.compress(body)
+            if not more_body:
+                body += compressor.flush()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
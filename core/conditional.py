@@ -0,0 +1,86 @@
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request, Response, status
+
+
+def as_utc(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+@dataclass
+class Version:
+    """
+    Validators of a response, checked against If-None-Match and If-Modified-Since before the body is built
+    """
+
+    etag: str
+    last_modified: Optional[datetime] = None
+
+    @classmethod
+    def of(cls, *parts: Any, last_modified: Optional[datetime] = None) -> "Version":
+        """
+        Strong ETag over the parts, e.g. the (id, updated_at) rows a response is built from
+        """
+        digest = hashlib.sha256(orjson.dumps(parts, default=str)).hexdigest()[:32]
+        return cls(
+            etag=f'"{digest}"',
+            last_modified=as_utc(last_modified) if last_modified else None,
+        )
+
+    def matches(self, request: Request) -> bool:
+        """
+        Whether the client's copy is current, If-None-Match takes precedence over If-Modified-Since
+        """
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            etags = [etag.strip() for etag in if_none_match.split(",")]
+            return "*" in etags or any(etag.removeprefix("W/") == self.etag for etag in etags)
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified:
+            try:
+                since = as_utc(parsedate_to_datetime(if_modified_since))
+            except (TypeError, ValueError):
+                return False
+            # HTTP dates have whole second precision
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag}
+        if self.last_modified:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def not_modified(self) -> Response:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=self.headers())
+
+    def dumps(self) -> bytes:
+        return orjson.dumps([self.etag, self.last_modified])
+
+    @classmethod
+    def loads(cls, data: bytes) -> "Version":
+        etag, last_modified = orjson.loads(data)
+        return cls(etag, datetime.fromisoformat(last_modified) if last_modified else None)
+
+
+@dataclass
+class Versioned:
+    """
+    A response body with the validators of the rows it was built from
+    """
+
+    content: Any
+    version: Version
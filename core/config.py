@@ -1,7 +1,87 @@
+from typing import List, Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
+    # Adds debugging aids to responses, such as the Server-Timing header
+    DEBUG: bool = False
+
     DATABASE_URL: str
+    # Defaults to DATABASE_URL with its driver swapped for an asyncio one (e.g. asyncpg)
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # "null" disables client side pooling (use behind Supabase's transaction/session pooler),
+    # "queue" keeps a pool of connections open (use with a direct connection)
+    DB_POOL_MODE: Literal["null", "queue"] = "null"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Seconds a search result total is reused for the same set of filters
+    SEARCH_COUNT_TTL: int = 30
+    # Seconds a tag name's id is reused by tag filtered searches
+    TAG_LOOKUP_TTL: int = 300
+
+    # Votes are recorded per user right away, datasets.votes catches up every VOTE_FLUSH_INTERVAL seconds
+    VOTE_FLUSH_INTERVAL: float = 5
+    VOTE_FLUSH_BATCH_SIZE: int = 1000
+
+    # Slow side effects run on JOB_WORKERS in process workers, enqueueing fails once JOB_QUEUE_SIZE jobs are waiting.
+    # Failed attempts are retried after JOB_RETRY_BACKOFF seconds, doubling up to JOB_RETRY_BACKOFF_MAX
+    JOB_WORKERS: int = 4
+    JOB_QUEUE_SIZE: int = 1000
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_TIMEOUT: float = 60
+    JOB_RETRY_BACKOFF: float = 1
+    JOB_RETRY_BACKOFF_MAX: float = 60
+    # Seconds a finished job's status stays available in memory
+    JOB_STATUS_TTL: int = 3600
+    # Also record jobs in the jobs table, so queued and retrying jobs are picked up again after a restart
+    JOB_PERSIST: bool = False
+
+    # Dataset sources are probed for size, row and column counts, PROBE_CONCURRENCY at a time and written back
+    # PROBE_BATCH_SIZE at a time. Rows are only counted for sources of at most PROBE_MAX_BYTES.
+    PROBE_CONCURRENCY: int = 8
+    PROBE_BATCH_SIZE: int = 100
+    PROBE_TIMEOUT: float = 300
+    PROBE_MAX_BYTES: int = 1 << 30
+    # Probe new datasets and changed sources in the background, counting rows of at most PROBE_ON_WRITE_MAX_BYTES
+    PROBE_ON_WRITE: bool = True
+    PROBE_ON_WRITE_MAX_BYTES: int = 1 << 24
+    # Local file sources are only probed inside this directory, unset disables them
+    PROBE_LOCAL_ROOT: Optional[str] = None
+
+    # Access tokens are verified locally with the project's JWT secret (HS256) and/or its JWKS (asymmetric keys),
+    # asking Supabase only when neither can verify a token and the fallback is enabled
+    SUPABASE_JWT_SECRET: Optional[str] = None
+    SUPABASE_JWKS_URL: Optional[str] = None
+    JWT_AUDIENCE: str = "authenticated"
+    AUTH_REMOTE_FALLBACK: bool = True
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: int = 300
+
+    # Response cache for catalog reads, "redis" shares it between workers (requires the redis extra)
+    CACHE_BACKEND: Literal["memory", "redis"] = "memory"
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_TTL: int = 60
+    CACHE_MAX_ENTRIES: int = 2048
+
+    # Responses smaller than this go out uncompressed, the framing overhead outweighs the savings
+    COMPRESSION_MIN_SIZE: int = 1024
+
+    # Records are queued and written by a background thread, sinks take a JSON list (e.g. '["file", "stdout"]')
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["json", "text"] = "json"
+    LOG_SINKS: List[Literal["file", "stdout"]] = ["file"]
+    LOG_FILE: str = "./logs/backend.log"
+    LOG_FILE_MAX_BYTES: int = 1000000
+    LOG_FILE_BACKUPS: int = 3
+    # Records beyond this many waiting to be written are dropped instead of blocking the request
+    LOG_QUEUE_SIZE: int = 10000
+    # Fraction of hot path records (such as the per request access line) that are kept
+    LOG_SAMPLE_RATE: float = 1.0
 
-config = Settings()
\ No newline at end of file
+config = Settings()
@@ -1,29 +1,128 @@
-from sqlalchemy import create_engine
-from sqlalchemy.pool import NullPool
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from sqlalchemy_utils import database_exists, create_database
 import os
 from sqlalchemy.orm import sessionmaker
 from core import logger, config
 
 
+# Async drivers used when deriving the asyncio URL from DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_url(url: str) -> str:
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)).render_as_string(
+        hide_password=False
+    )
+
+
+def get_pool_options(timed: bool = False) -> dict:
+    # If using Transaction Pooler or Session Pooler, we want to ensure we disable SQLAlchemy client side pooling -
+    # https://docs.sqlalchemy.org/en/20/core/pooling.html#switching-pool-implementations
+    if config.DB_POOL_MODE == "null":
+        return {"poolclass": TimedNullPool if timed else NullPool}
+
+    # If using IPv4 direct connection, keep connections open between requests
+    return {
+        **({"poolclass": TimedAsyncQueuePool} if timed else {}),
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checkout_wait_count = 0
+        self.checkout_wait_seconds = 0.0
+        self.checkout_wait_max_seconds = 0.0
+
+    def listen(self, engine):
+        event.listen(engine, "connect", self.on_connect)
+        event.listen(engine, "checkout", self.on_checkout)
+        event.listen(engine, "checkin", self.on_checkin)
+        event.listen(engine, "invalidate", self.on_invalidate)
+
+    def on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        self.checkins += 1
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+
+    def record_wait(self, seconds: float):
+        self.checkout_wait_count += 1
+        self.checkout_wait_seconds += seconds
+        self.checkout_wait_max_seconds = max(self.checkout_wait_max_seconds, seconds)
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedPool:
+    """
+    Records how long each checkout waits, covering both queueing for a pooled connection and opening a new one
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - start)
+
+
+class TimedNullPool(TimedPool, NullPool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPool, AsyncAdaptedQueuePool):
+    pass
+
 
 class Database:
     def __init__(self):
 
         self.DATABASE_URL = config.DATABASE_URL
+        self.ASYNC_DATABASE_URL = config.ASYNC_DATABASE_URL or get_async_url(self.DATABASE_URL)
         if not database_exists(self.DATABASE_URL):
             create_database(self.DATABASE_URL)
 
-        # If using IPv4 direct connection, use the following connection string
-        # self.engine = create_engine(self.DATABASE_URL, echo=True)
-        # If using Transaction Pooler or Session Pooler, we want to ensure we disable SQLAlchemy client side pooling -
-        # https://docs.sqlalchemy.org/en/20/core/pooling.html#switching-pool-implementations
-        self.engine = create_engine(self.DATABASE_URL, poolclass=NullPool, echo=False)
-        self.connection = self.engine.connect()
+        self.engine = create_engine(self.DATABASE_URL, echo=False, **get_pool_options())
+
+        # The sync engine is kept for migrations and table creation, request handlers use the async engine
+        self.async_engine = create_async_engine(
+            self.ASYNC_DATABASE_URL, echo=False, **get_pool_options(timed=True)
+        )
+        self.async_session = async_sessionmaker(
+            self.async_engine, autoflush=False, expire_on_commit=False
+        )
+
+        self.pool_metrics = pool_metrics
+        self.pool_metrics.listen(self.async_engine.sync_engine)
 
         # Test the connection
         try:
-            with self.engine.connect() as self.connection:
+            with self.engine.connect():
                 logger.info("Connection successful!")
         except Exception as e:
             logger.error(f"Failed to connect: {e}")
@@ -37,4 +136,29 @@ class Database:
         finally:
             session.close()
 
+    async def get_async_session(self):
+        async with self.async_session() as session:
+            yield session
+
+    def pool_stats(self) -> dict:
+        pool = self.async_engine.pool
+        stats = {
+            "mode": config.DB_POOL_MODE,
+            "connects": self.pool_metrics.connects,
+            "checkouts": self.pool_metrics.checkouts,
+            "checkins": self.pool_metrics.checkins,
+            "invalidations": self.pool_metrics.invalidations,
+            "checkout_wait_count": self.pool_metrics.checkout_wait_count,
+            "checkout_wait_seconds": self.pool_metrics.checkout_wait_seconds,
+            "checkout_wait_max_seconds": self.pool_metrics.checkout_wait_max_seconds,
+        }
+        if config.DB_POOL_MODE == "queue":
+            stats.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        return stats
+
 db = Database()
\ No newline at end of file
@@ -1,17 +1,170 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+
+from core.config import config
 
 logger = logging.getLogger(__name__)
 
-# Set up logging configuration
-logging.basicConfig(
-    level=logging.INFO,  # Capture all logs from DEBUG level and above
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s ",  # Log format
-    handlers=[
-        # logging.StreamHandler(),  # Logs to console
-        RotatingFileHandler("./logs/backend.log", maxBytes=1000000, backupCount=3),  # Logs to a file
-    ],
-)
+# Correlation ID of the request being handled, "-" outside of requests
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has, anything else was passed through extra= and is logged as a field
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+class ContextFilter(logging.Filter):
+    """
+    Runs in the logging thread of the caller, so it can read the request's context and drop sampled records
+    before they are queued. Records logged with extra={"sampled": True} are kept at LOG_SAMPLE_RATE,
+    warnings and errors are always kept.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            getattr(record, "sampled", False)
+            and record.levelno < logging.WARNING
+            and random.random() >= config.LOG_SAMPLE_RATE
+        ):
+            return False
+        record.request_id = request_id.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread, dropping them when the queue is full rather than waiting
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep the message and traceback as separate fields for the formatter on the other side
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES
+        )
+        entry.pop("sampled", None)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+def get_sinks() -> list:
+    formatter = (
+        JSONFormatter()
+        if config.LOG_FORMAT == "json"
+        else logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s "
+        )
+    )
+
+    handlers = []
+    if "file" in config.LOG_SINKS:
+        os.makedirs(os.path.dirname(config.LOG_FILE) or ".", exist_ok=True)
+        handlers.append(
+            RotatingFileHandler(
+                config.LOG_FILE,
+                maxBytes=config.LOG_FILE_MAX_BYTES,
+                backupCount=config.LOG_FILE_BACKUPS,
+            )
+        )
+    if "stdout" in config.LOG_SINKS:
+        handlers.append(logging.StreamHandler(sys.stdout))
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+# Handlers write from the listener's thread, a log call only pays for putting the record on the queue
+log_queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+queue_handler = NonBlockingQueueHandler(log_queue)
+queue_handler.addFilter(ContextFilter())
+listener = QueueListener(log_queue, *get_sinks(), respect_handler_level=True)
+
+logging.basicConfig(level=config.LOG_LEVEL, handlers=[queue_handler], force=True)
+listener.start()
+# Flushes what is still queued on shutdown
+atexit.register(listener.stop)
 
 logging.getLogger("watchman.main").setLevel(logging.WARNING)
-logging.getLogger("uvicorn.error").setLevel(logging.WARNING)
\ No newline at end of file
+logging.getLogger("uvicorn.error").setLevel(logging.WARNING)
+
+
+class RequestContextMiddleware:
+    """
+    Assigns each request a correlation ID, taken from X-Request-ID when the client sends a usable one,
+    echoes it in the response and logs a sampled access line
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = Headers(scope=scope).get("x-request-id", "")
+        current = (
+            incoming if 0 < len(incoming) <= 128 and incoming.isprintable() else uuid.uuid4().hex
+        )
+        token = request_id.set(current)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message)["X-Request-ID"] = current
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            logger.log(
+                logging.WARNING if status >= 500 else logging.INFO,
+                "request",
+                extra={
+                    "sampled": True,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                },
+            )
+            request_id.reset(token)
@@ -0,0 +1,200 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from core import config, db, response_cache
+from core.logger import NonBlockingQueueHandler
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the start of its response",
+    ["method", "route", "status"],
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_duration_seconds",
+    "Time a request spent executing SQL statements",
+    ["method", "route"],
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+REQUEST_ROWS = Histogram(
+    "http_request_db_rows",
+    # Rows read through server side cursors (exports) are not reported by the driver
+    "Rows returned by SQL statements per request",
+    ["method", "route"],
+    buckets=(0, 1, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing a single SQL statement",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that raised an error")
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    rows: int = 0
+    db_seconds: float = 0.0
+
+
+# Statement stats of the request being handled, None outside of requests
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    QUERY_LATENCY.observe(elapsed)
+
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        # For statements returning rows the drivers report how many were fetched, -1 when unknown
+        if cursor.description is not None and cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+
+
+def handle_error(exception_context):
+    QUERY_ERRORS.inc()
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start"):
+        connection.info["query_start"].pop()
+
+
+def instrument(engine):
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+# The async engine's events fire in the request's context, SQLAlchemy's greenlets share it
+instrument(db.async_engine.sync_engine)
+instrument(db.engine)
+
+
+class StatsCollector:
+    """
+    Reports the counters kept by the pool, the response cache and the log queue when /metrics is scraped
+    """
+
+    def collect(self):
+        pool = db.pool_stats()
+        for name in ("connects", "checkouts", "checkins", "invalidations", "checkout_wait_count"):
+            yield CounterMetricFamily(
+                f"db_pool_{name}", f"Pool {name.replace('_', ' ')}", pool[name]
+            )
+        yield CounterMetricFamily(
+            "db_pool_checkout_wait_seconds",
+            "Total time spent waiting for a pooled connection",
+            pool["checkout_wait_seconds"],
+        )
+        yield GaugeMetricFamily(
+            "db_pool_checkout_wait_max_seconds",
+            "Longest wait for a pooled connection",
+            pool["checkout_wait_max_seconds"],
+        )
+        for name in ("size", "checked_in", "checked_out", "overflow"):
+            if name in pool:
+                yield GaugeMetricFamily(
+                    f"db_pool_{name}", f"Pool {name.replace('_', ' ')}", pool[name]
+                )
+
+        hits = CounterMetricFamily(
+            "response_cache_hits", "Responses served from the cache", labels=["route"]
+        )
+        misses = CounterMetricFamily(
+            "response_cache_misses", "Responses built on a cache miss", labels=["route"]
+        )
+        for route, counts in response_cache.stats().items():
+            hits.add_metric([route], counts["hits"])
+            misses.add_metric([route], counts["misses"])
+        yield hits
+        yield misses
+
+        yield CounterMetricFamily(
+            "log_records_dropped",
+            "Log records dropped because the queue was full",
+            NonBlockingQueueHandler.dropped,
+        )
+
+
+REGISTRY.register(StatsCollector())
+
+
+def render_metrics() -> tuple:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def server_timing(stats: RequestStats, total: float) -> str:
+    return (
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries, {stats.rows} rows", '
+        f"total;dur={total * 1000:.1f}"
+    )
+
+
+class MetricsMiddleware:
+    """
+    Records per route latency and the SQL work each request did, and adds a Server-Timing header in DEBUG.
+    Routes are labelled by their path template, unmatched paths share one label to keep cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+        started = False
+
+        async def send_with_timing(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                elapsed = time.perf_counter() - start
+                route = route_label(scope)
+                REQUEST_LATENCY.labels(scope["method"], route, message["status"]).observe(elapsed)
+                if config.DEBUG:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", server_timing(stats, elapsed)
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = route_label(scope)
+            if not started:
+                # The handler raised, the error response is sent by the server error middleware further out
+                REQUEST_LATENCY.labels(scope["method"], route, 500).observe(
+                    time.perf_counter() - start
+                )
+            # Recorded once the body has been sent, streaming responses keep querying after the response starts
+            REQUEST_DB_TIME.labels(scope["method"], route).observe(stats.db_seconds)
+            REQUEST_QUERIES.labels(scope["method"], route).observe(stats.queries)
+            REQUEST_ROWS.labels(scope["method"], route).observe(stats.rows)
+            request_stats.reset(token)
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
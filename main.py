@@ -1,13 +1,50 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from api.v1.router import router
+from core.compression import CompressionMiddleware
+from core.logger import RequestContextMiddleware
+from core.metrics import MetricsMiddleware, render_metrics
+from services import job_queue, vote_buffer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    flusher = asyncio.create_task(vote_buffer.run())
+    jobs = asyncio.create_task(job_queue.run())
+    yield
+    jobs.cancel()
+    flusher.cancel()
+    # Writes the votes buffered since the last flush before the worker exits
+    await vote_buffer.flush()
 
-app = FastAPI(title="Open Data Ghana API", version="0.1.0")
+
+app = FastAPI(
+    title="Open Data Ghana API",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+# Added last so it runs outermost and every log line of the request carries its ID
+app.add_middleware(RequestContextMiddleware)
 app.include_router(router, prefix="/api/v1")
 
 @app.get("/")
 def home():
     return {"details": {"status": "healthy"}}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus metrics in the text exposition format
+    """
+    content, media_type = render_metrics()
+    return Response(content, media_type=media_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
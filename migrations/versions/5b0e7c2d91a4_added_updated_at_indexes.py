@@ -0,0 +1,28 @@
+"""Added updated_at indexes
+
+Revision ID: 5b0e7c2d91a4
+Revises: fea6ee60e01e
+Create Date: 2026-10-18 10:02:47.215833
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0e7c2d91a4'
+down_revision: Union[str, None] = 'fea6ee60e01e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_datasets_updated_at', 'datasets', ['updated_at'])
+    op.create_index('ix_tags_updated_at', 'tags', ['updated_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tags_updated_at', table_name='tags')
+    op.drop_index('ix_datasets_updated_at', table_name='datasets')
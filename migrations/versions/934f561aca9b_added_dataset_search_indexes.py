@@ -0,0 +1,46 @@
+"""Added dataset search indexes
+
+Revision ID: 934f561aca9b
+Revises: 2ffbf8c1c97e
+Create Date: 2026-10-18 09:12:31.482190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '934f561aca9b'
+down_revision: Union[str, None] = '2ffbf8c1c97e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english'::regconfig, name), 'A'::\"char\") || "
+    "setweight(to_tsvector('english'::regconfig, description), 'B'::\"char\") || "
+    "setweight(to_tsvector('english'::regconfig, source), 'C'::\"char\")"
+)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        'ix_datasets_search', 'datasets', [sa.text(f"({SEARCH_DOCUMENT})")], postgresql_using='gin'
+    )
+    for column in ('name', 'source', 'license'):
+        op.create_index(
+            f'ix_datasets_{column}_trgm',
+            'datasets',
+            [column],
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'},
+        )
+
+
+def downgrade() -> None:
+    for column in ('name', 'source', 'license'):
+        op.drop_index(f'ix_datasets_{column}_trgm', table_name='datasets')
+    op.drop_index('ix_datasets_search', table_name='datasets')
@@ -0,0 +1,75 @@
+"""Added partial indexes for active rows
+
+Revision ID: a3d91f6c2e07
+Revises: 5b0e7c2d91a4
+Create Date: 2026-10-18 10:41:09.583120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d91f6c2e07'
+down_revision: Union[str, None] = '5b0e7c2d91a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ACTIVE = sa.text('deleted_at IS NULL')
+TRIGRAM_COLUMNS = ('name', 'source', 'license')
+
+
+def upgrade() -> None:
+    # Built concurrently so catalog reads and writes keep going while large tables are indexed
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_datasets_active_created_at',
+            'datasets',
+            ['created_at', 'id'],
+            postgresql_where=ACTIVE,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_dataset_tags_tag_id', 'dataset_tags', ['tag_id'], postgresql_concurrently=True
+        )
+        # The partial trigram indexes replace the full ones, which are only dropped once these exist
+        for column in TRIGRAM_COLUMNS:
+            op.create_index(
+                f'ix_datasets_active_{column}_trgm',
+                'datasets',
+                [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_where=ACTIVE,
+                postgresql_concurrently=True,
+            )
+        for column in TRIGRAM_COLUMNS:
+            op.drop_index(
+                f'ix_datasets_{column}_trgm', table_name='datasets', postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for column in TRIGRAM_COLUMNS:
+            op.create_index(
+                f'ix_datasets_{column}_trgm',
+                'datasets',
+                [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+            )
+        for column in TRIGRAM_COLUMNS:
+            op.drop_index(
+                f'ix_datasets_active_{column}_trgm',
+                table_name='datasets',
+                postgresql_concurrently=True,
+            )
+        op.drop_index('ix_dataset_tags_tag_id', table_name='dataset_tags', postgresql_concurrently=True)
+        op.drop_index(
+            'ix_datasets_active_created_at', table_name='datasets', postgresql_concurrently=True
+        )
@@ -0,0 +1,45 @@
+"""Added votes table
+
+Revision ID: c7e4b2a9d315
+Revises: a3d91f6c2e07
+Create Date: 2026-10-18 11:27:45.206318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e4b2a9d315'
+down_revision: Union[str, None] = 'a3d91f6c2e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('votes',
+    sa.Column('user_id', sa.String(length=255), nullable=False),
+    sa.Column('dataset_id', sa.UUID(), nullable=False),
+    sa.Column('value', sa.SmallInteger(), nullable=False),
+    sa.CheckConstraint('value IN (-1, 1)', name='ck_votes_value'),
+    sa.ForeignKeyConstraint(['dataset_id'], ['datasets.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'dataset_id')
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_datasets_active_votes',
+            'datasets',
+            [sa.text('votes DESC'), 'id'],
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_datasets_active_votes', table_name='datasets', postgresql_concurrently=True
+        )
+    op.drop_table('votes')
@@ -0,0 +1,33 @@
+"""Widened dataset size to bigint
+
+Revision ID: d5a9e3c0b417
+Revises: b8f2d6a41c93
+Create Date: 2026-10-18 14:52:31.086413
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a9e3c0b417'
+down_revision: Union[str, None] = 'b8f2d6a41c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Probed sizes are in bytes, sources over 2 GiB overflow an integer. Rewrites the table.
+    op.alter_column('datasets', 'size',
+               existing_type=sa.INTEGER(),
+               type_=sa.BigInteger(),
+               existing_nullable=True)
+
+
+def downgrade() -> None:
+    op.alter_column('datasets', 'size',
+               existing_type=sa.BigInteger(),
+               type_=sa.INTEGER(),
+               existing_nullable=True)
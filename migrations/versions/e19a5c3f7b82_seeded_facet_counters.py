@@ -0,0 +1,38 @@
+"""Seeded facet counters
+
+Revision ID: e19a5c3f7b82
+Revises: c7e4b2a9d315
+Create Date: 2026-10-18 12:03:18.749025
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e19a5c3f7b82'
+down_revision: Union[str, None] = 'c7e4b2a9d315'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Unfiltered facet counts live in the sharded counters, from here on the write paths keep them current
+    for column in ('license', 'format'):
+        op.execute(
+            f"INSERT INTO counters (name, shard, value) "
+            f"SELECT 'facet:{column}:' || {column}, 0, count(*) FROM datasets "
+            f"WHERE deleted_at IS NULL GROUP BY {column}"
+        )
+    op.execute(
+        "INSERT INTO counters (name, shard, value) "
+        "SELECT 'facet:tags:' || dataset_tags.tag_id::text, 0, count(*) FROM dataset_tags "
+        "JOIN datasets ON datasets.id = dataset_tags.dataset_id "
+        "WHERE datasets.deleted_at IS NULL GROUP BY dataset_tags.tag_id"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM counters WHERE name LIKE 'facet:%'")
@@ -0,0 +1,42 @@
+"""Added sharded counters table
+
+Revision ID: fea6ee60e01e
+Revises: 934f561aca9b
+Create Date: 2026-10-18 09:31:04.917352
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fea6ee60e01e'
+down_revision: Union[str, None] = '934f561aca9b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('counters',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name', 'shard')
+    )
+    # Seed from the live rows rather than the old metadata value, which could have drifted from lost updates
+    op.execute(
+        "INSERT INTO counters (name, shard, value) "
+        "SELECT 'active_datasets_count', 0, count(*) FROM datasets WHERE deleted_at IS NULL"
+    )
+    op.execute("DELETE FROM metadata WHERE item = 'active_datasets_count'")
+
+
+def downgrade() -> None:
+    op.execute(
+        "INSERT INTO metadata (id, created_at, updated_at, item, value) "
+        "SELECT gen_random_uuid(), now(), now(), 'active_datasets_count', to_json(coalesce(sum(value), 0)) "
+        "FROM counters WHERE name = 'active_datasets_count'"
+    )
+    op.drop_table('counters')
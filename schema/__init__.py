@@ -1,8 +1,20 @@
 # isort:skip_file
-from schema.base import Base, Page
-from schema.dataset import Dataset, Tag
+from schema.base import Base, Page, decode_cursor, encode_cursor
+from schema.dataset import (
+    DATASET_FIELDS,
+    Dataset,
+    DatasetTag,
+    DatasetWithTags,
+    PartialDataset,
+    Tag,
+    search_document,
+    search_query,
+)
 from schema.user import User, UserModel, UserModelBase
 from schema.metadata import Metadata
+from schema.counter import Counter
+from schema.vote import Vote
+from schema.job import Job
 from core import db
 
 Base.metadata.create_all(db.engine)
@@ -1,26 +1,48 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from datetime import datetime, timezone
-from typing import Generic, List, Optional, TypeVar
+from typing import Generic, List, Optional, Tuple, TypeVar
 from uuid import UUID, uuid4
 
 from pydantic import BaseModel
 from sqlalchemy import DateTime
 from sqlalchemy.dialects.postgresql import UUID as SQLAlchemyUUID
+from sqlalchemy.types import TypeDecorator
 from sqlmodel import Field, SQLModel
 
 
+class UTCDateTime(TypeDecorator):
+    """
+    Stores aware datetimes as naive UTC, asyncpg refuses aware values for TIMESTAMP WITHOUT TIME ZONE columns
+    """
+
+    impl = DateTime
+    cache_ok = True
+
+    @property
+    def python_type(self):
+        return datetime
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
 class Base(SQLModel):
     id: UUID = Field(
         sa_type=SQLAlchemyUUID(as_uuid=True), primary_key=True, default_factory=uuid4
     )
     created_at: datetime = Field(
-        sa_type=DateTime, default=datetime.now(tz=timezone.utc)
+        sa_type=UTCDateTime, default_factory=lambda: datetime.now(tz=timezone.utc)
     )
+    # Callables, so every insert and update gets its own timestamp rather than the one from import time
     updated_at: datetime = Field(
-        sa_type=DateTime,
-        default=datetime.now(tz=timezone.utc),
-        sa_column_kwargs={"onupdate": datetime.now(tz=timezone.utc)},
+        sa_type=UTCDateTime,
+        default_factory=lambda: datetime.now(tz=timezone.utc),
+        sa_column_kwargs={"onupdate": lambda: datetime.now(tz=timezone.utc)},
     )
-    deleted_at: datetime = Field(sa_type=DateTime, nullable=True)
+    deleted_at: Optional[datetime] = Field(sa_type=UTCDateTime, nullable=True, default=None)
 
     def to_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -45,3 +67,21 @@ class Page(BaseModel, Generic[T]):
     item_count: int
     page: int
     limit: int
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(created_at: datetime, id: UUID) -> str:
+    payload = json.dumps([created_at.isoformat(), str(id)]).encode()
+    return urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    Raises ValueError if the cursor was not produced by encode_cursor
+    """
+    try:
+        payload = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(payload)
+        return datetime.fromisoformat(created_at), UUID(id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,64 @@
+import random
+from typing import Dict
+
+from sqlalchemy import BigInteger, Integer, String, cast, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Field, SQLModel
+
+# Number of rows each counter is spread over, concurrent writers rarely pick the same row
+COUNTER_SHARDS = 16
+
+
+# Table to store counters that are updated concurrently, a counter's value is the sum of its shards
+class Counter(SQLModel, table=True):
+    __tablename__ = "counters"
+
+    name: str = Field(sa_type=String(100), primary_key=True)
+    shard: int = Field(sa_type=Integer, primary_key=True)
+    value: int = Field(sa_type=BigInteger, default=0, nullable=False)
+
+    @classmethod
+    async def increment(cls, session, name: str, delta: int = 1):
+        """
+        Atomically adds delta to a random shard of the counter as part of the session's transaction
+        """
+        statement = insert(cls).values(
+            name=name, shard=random.randrange(COUNTER_SHARDS), value=delta
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.name, cls.shard],
+            set_={"value": cls.value + statement.excluded.value},
+        )
+        await session.execute(statement)
+
+    @classmethod
+    async def increment_many(cls, session, deltas: Dict[str, int]):
+        """
+        Adds each delta to a random shard of its counter in one statement, zero deltas are skipped.
+        Rows are written in name order so concurrent writers lock shards in the same order.
+        """
+        rows = [
+            {"name": name, "shard": random.randrange(COUNTER_SHARDS), "value": delta}
+            for name, delta in sorted(deltas.items())
+            if delta
+        ]
+        if not rows:
+            return
+        statement = insert(cls).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.name, cls.shard],
+            set_={"value": cls.value + statement.excluded.value},
+        )
+        await session.execute(statement)
+
+    @classmethod
+    async def total(cls, session, name: str) -> int:
+        # Postgres sums bigints as numeric, cast back so the total is an int rather than a Decimal
+        return await session.scalar(
+            select(cast(func.coalesce(func.sum(cls.value), 0), BigInteger)).filter(
+                cls.name == name
+            )
+        )
+
+    def __repr__(self):
+        return f"<Counter(name={self.name}, shard={self.shard}, value={self.value})>"
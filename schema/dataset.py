@@ -1,8 +1,9 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID, uuid4
 
-from sqlalchemy import Integer, String, Text
+from sqlalchemy import DDL, BigInteger, Index, Integer, String, Text, event, func, literal_column
 from sqlalchemy.dialects.postgresql import UUID as SQLAlchemyUUID
+from pydantic import create_model
 from sqlmodel import Field, Relationship, SQLModel
 
 from schema import Base
@@ -18,28 +19,34 @@ class DatasetTag(SQLModel, table=True):
         nullable=False,
         primary_key=True,
     )
+    # The primary key leads on dataset_id, tag to dataset lookups need their own index
     tag_id: UUID = Field(
         sa_type=SQLAlchemyUUID(as_uuid=True),
         foreign_key="tags.id",
         nullable=False,
         primary_key=True,
+        index=True,
     )
 
 
-# Table to store dataset information
-class Dataset(Base, table=True):
-    __tablename__ = "datasets"
-
+# Dataset columns, shared by the table model and the response models built from it
+class DatasetBase(Base):
     name: str = Field(sa_type=String(255), nullable=False, unique=True)
     description: str = Field(sa_type=Text, nullable=False)
     source: str = Field(sa_type=String(255), nullable=False)
     license: str = Field(sa_type=String(50), nullable=False)
     format: str = Field(sa_type=String(50), nullable=False)
-    size: int = Field(sa_type=Integer, nullable=True)
-    row_count: int = Field(sa_type=Integer, nullable=True)
-    column_count: int = Field(sa_type=Integer, nullable=True)
+    # Bytes, sources over 2 GiB do not fit an integer
+    size: Optional[int] = Field(sa_type=BigInteger, nullable=True, default=None)
+    row_count: Optional[int] = Field(sa_type=Integer, nullable=True, default=None)
+    column_count: Optional[int] = Field(sa_type=Integer, nullable=True, default=None)
     votes: int = Field(sa_type=Integer, default=0)
 
+
+# Table to store dataset information
+class Dataset(DatasetBase, table=True):
+    __tablename__ = "datasets"
+
     # Relationship to tags
     tags: List["Tag"] = Relationship(link_model=DatasetTag, back_populates="datasets")
 
@@ -49,12 +56,81 @@ class Dataset(Base, table=True):
         )
 
 
-# Table to store tags for categorization
-class Tag(Base, table=True):
-    __tablename__ = "tags"
+# Full text search document, the GIN index below is only used by queries that repeat this exact expression.
+# The regconfig and weights are rendered as literals because an expression index never matches bound parameters.
+def _weighted(column, weight):
+    return func.setweight(
+        func.to_tsvector(literal_column("'english'::regconfig"), column),
+        literal_column(f"'{weight}'::\"char\""),
+    )
+
+
+search_document = (
+    _weighted(Dataset.name, "A")
+    .op("||")(_weighted(Dataset.description, "B"))
+    .op("||")(_weighted(Dataset.source, "C"))
+)
+
+
+def search_query(text: str):
+    return func.websearch_to_tsquery(literal_column("'english'::regconfig"), text)
+
+
+Dataset.__table__.append_constraint(
+    Index("ix_datasets_search", search_document, postgresql_using="gin").ddl_if(
+        dialect="postgresql"
+    )
+)
+# Reads only ever see active datasets, so the indexes behind them leave soft deleted rows out.
+# Queries must filter on deleted_at IS NULL for the planner to use them.
+active = Dataset.deleted_at == None
 
+# List ordering and cursor seeks on (created_at, id)
+Index(
+    "ix_datasets_active_created_at",
+    Dataset.created_at,
+    Dataset.id,
+    postgresql_where=active,
+    sqlite_where=active,
+)
+# Trigram indexes serve both fuzzy matching and the ILIKE '%...%' filters
+for column in ("name", "source", "license"):
+    Index(
+        f"ix_datasets_active_{column}_trgm",
+        getattr(Dataset, column),
+        postgresql_using="gin",
+        postgresql_ops={column: "gin_trgm_ops"},
+        postgresql_where=active,
+    ).ddl_if(dialect="postgresql")
+
+# Most voted datasets, read in index order without sorting the table
+Index(
+    "ix_datasets_active_votes",
+    Dataset.votes.desc(),
+    Dataset.id,
+    postgresql_where=active,
+    sqlite_where=active,
+)
+
+# Serves max(updated_at), the Last-Modified of dataset lists
+Index("ix_datasets_updated_at", Dataset.updated_at)
+
+event.listen(
+    Dataset.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
+# Tag columns, shared by the table model and the response models built from it
+class TagBase(Base):
     name: str = Field(sa_type=String(50), unique=True, nullable=False)
 
+
+# Table to store tags for categorization
+class Tag(TagBase, table=True):
+    __tablename__ = "tags"
+
     # Relationship to datasets
     datasets: List["Dataset"] = Relationship(
         link_model=DatasetTag, back_populates="tags"
@@ -62,3 +138,24 @@ class Tag(Base, table=True):
 
     def __repr__(self):
         return f"<Tag(name={self.name})>"
+
+
+Index("ix_tags_updated_at", Tag.updated_at)
+
+
+# Dataset response with its tags embedded, tags is None when they were not requested
+class DatasetWithTags(DatasetBase):
+    tags: Optional[List[TagBase]] = None
+
+
+# Columns a client can pick with fields= on dataset lists, in response order
+DATASET_FIELDS = tuple(column.name for column in Dataset.__table__.columns)
+
+# Dataset response limited to the requested fields, fields that were not requested are left out
+PartialDataset = create_model(
+    "PartialDataset",
+    **{
+        name: (Optional[field.annotation], None)
+        for name, field in DatasetWithTags.model_fields.items()
+    },
+)
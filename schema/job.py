@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import JSON, Index, Integer, String, Text
+from sqlmodel import Field
+
+from schema.base import Base, UTCDateTime
+
+
+# Table to store background jobs when JOB_PERSIST is enabled, so queued work survives a restart.
+# Rows are claimed by flipping their status, only one worker process runs each job.
+class Job(Base, table=True):
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_run_after", "status", "run_after"),)
+
+    name: str = Field(sa_type=String(100), nullable=False)
+    payload: Any = Field(sa_type=JSON, nullable=False)
+    # queued, running, succeeded or failed
+    status: str = Field(sa_type=String(20), default="queued", nullable=False)
+    attempts: int = Field(sa_type=Integer, default=0, nullable=False)
+    # Retries wait until this time, a restarted worker picks them up from here
+    run_after: Optional[datetime] = Field(sa_type=UTCDateTime, nullable=True, default=None)
+    result: Any = Field(sa_type=JSON, nullable=True, default=None)
+    error: Optional[str] = Field(sa_type=Text, nullable=True, default=None)
+
+    def __repr__(self):
+        return f"<Job(name={self.name}, status={self.status}, attempts={self.attempts})>"
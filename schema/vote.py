@@ -0,0 +1,23 @@
+from uuid import UUID
+
+from sqlalchemy import CheckConstraint, SmallInteger, String
+from sqlalchemy.dialects.postgresql import UUID as SQLAlchemyUUID
+from sqlmodel import Field, SQLModel
+
+
+# Table to store each user's vote on a dataset, one row per user and dataset so repeated votes count once.
+# datasets.votes is the sum of the values, kept up to date in batches by services.votes.
+class Vote(SQLModel, table=True):
+    __tablename__ = "votes"
+    __table_args__ = (CheckConstraint("value IN (-1, 1)", name="ck_votes_value"),)
+
+    user_id: str = Field(sa_type=String(255), primary_key=True)
+    dataset_id: UUID = Field(
+        sa_type=SQLAlchemyUUID(as_uuid=True),
+        foreign_key="datasets.id",
+        primary_key=True,
+    )
+    value: int = Field(sa_type=SmallInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<Vote(user_id={self.user_id}, dataset_id={self.dataset_id}, value={self.value})>"
@@ -0,0 +1,34 @@
+# isort:skip_file
+from services.dataset_import import (
+    ImportResult,
+    import_datasets,
+    parse_csv,
+    parse_ndjson,
+    read_lines,
+)
+from services.dataset_tags import (
+    DatasetsNotFound,
+    TagBatch,
+    TagBatchResult,
+    apply_tag_batch,
+)
+from services.facets import (
+    Facets,
+    adjust_facets,
+    adjust_tag_facets,
+    count_facets,
+    dataset_facets,
+    read_facets,
+    rebuild_facets,
+)
+from services.jobs import JobQueueFull, JobStatus, job_queue
+from services.dataset_probe import ProbeResult, probe_datasets, schedule_probe
+from services.export import MEDIA_TYPES, ExportFormatUnavailable, open_export
+from services.tag_lookup import forget_tag_ids, resolve_tag_ids
+from services.votes import (
+    VoteResult,
+    cast_vote,
+    reconcile_votes,
+    retract_vote,
+    vote_buffer,
+)
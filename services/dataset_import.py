@@ -0,0 +1,314 @@
+import csv
+import itertools
+import json
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Tuple, Union
+from uuid import UUID
+
+from pydantic import ValidationError
+from sqlalchemy import case, func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+
+from core import db, logger
+from schema import Counter, Dataset, DatasetTag
+from services.dataset_probe import schedule_probe
+from services.dataset_tags import ensure_tags
+from services.facets import adjust_facets, dataset_facets, facet_counter
+
+# Rows per INSERT, kept well under Postgres' limit of 32767 bind parameters per statement
+BATCH_SIZE = 1000
+
+# Columns an import overwrites when a dataset with the same name already exists
+UPSERT_COLUMNS = ["description", "source", "license", "format", "updated_at"]
+# Columns an import only overwrites when it provides a value or changes the source they were measured from
+UPSERT_IF_SET_COLUMNS = ["size", "row_count", "column_count"]
+
+
+class ConcurrentWrite(Exception):
+    def __init__(self, names: List[str]):
+        self.names = names
+        super().__init__(f"Datasets were written concurrently, import them again: {', '.join(names)}")
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    updated: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def add_error(self, row: int, error: str):
+        self.errors.append({"row": row, "error": error})
+
+
+def describe(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}"
+            for e in error.errors()
+        )
+    return str(error)
+
+
+def decode(line: bytes) -> Union[str, UnicodeDecodeError]:
+    try:
+        return line.decode().rstrip("\r")
+    except UnicodeDecodeError as e:
+        return e
+
+
+async def read_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[Union[str, UnicodeDecodeError]]:
+    """
+    Yields the lines of a UTF-8 stream, a line that does not decode is yielded as its UnicodeDecodeError
+    so the parsers report it as a bad row
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield decode(line)
+    if buffer:
+        yield decode(buffer)
+
+
+async def parse_ndjson(lines: AsyncIterable[Union[str, Exception]]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yields (line number, record) pairs, the record is the exception when a line is not a JSON object
+    """
+    number = 0
+    async for line in lines:
+        number += 1
+        if isinstance(line, Exception):
+            yield number, line
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("Expected a JSON object")
+            yield number, record
+        except ValueError as e:
+            yield number, e
+
+
+async def parse_csv(lines: AsyncIterable[Union[str, Exception]]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yields (row number, record) pairs from CSV with a header row, tags are separated by ";" within their column
+    """
+    header = None
+    number = 0
+    pending = []
+    async for line in lines:
+        if isinstance(line, Exception):
+            # The record the line belongs to is lost, a header that can not be read fails every row
+            if header is None:
+                yield 0, line
+                return
+            pending = []
+            number += 1
+            yield number, line
+            continue
+
+        pending.append(line)
+        # A quoted field may span lines, the record is complete once its quotes are balanced
+        if sum(part.count('"') for part in pending) % 2:
+            continue
+
+        values = next(csv.reader(["\n".join(pending)]), [])
+        pending = []
+        if not values:
+            continue
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+
+        number += 1
+        if len(values) != len(header):
+            yield number, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+
+        record = {key: value if value != "" else None for key, value in zip(header, values)}
+        if record.get("tags"):
+            record["tags"] = [tag.strip() for tag in record["tags"].split(";") if tag.strip()]
+        yield number, record
+
+
+async def import_datasets(
+    records: AsyncIterable[Tuple[int, Any]], batch_size: int = BATCH_SIZE
+) -> ImportResult:
+    """
+    Validates records against the Dataset model and upserts them by name in batches.
+    Bad rows are reported in the result without failing the rest of their batch.
+    """
+    result = ImportResult()
+    batch = []
+    async for row, record in records:
+        if isinstance(record, Exception):
+            result.add_error(row, describe(record))
+            continue
+
+        try:
+            tags = record.pop("tags", None) or []
+            if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+                raise ValueError("tags must be a list of tag names")
+            for key in Dataset.get_ignored_fields():
+                record.pop(key, None)
+            dataset = Dataset.model_validate(record)
+        except (ValidationError, ValueError) as e:
+            result.add_error(row, describe(e))
+            continue
+
+        batch.append((row, dataset, tags))
+        if len(batch) >= batch_size:
+            await import_batch(batch, result)
+            batch = []
+
+    if batch:
+        await import_batch(batch, result)
+    return result
+
+
+async def import_batch(batch: list, result: ImportResult):
+    # The same name twice in one statement would make ON CONFLICT touch a row twice, the last one wins
+    by_name = {}
+    for row, dataset, tags in batch:
+        if dataset.name in by_name:
+            result.add_error(by_name[dataset.name][0], f"Duplicate name {dataset.name}, replaced by row {row}")
+        by_name[dataset.name] = (row, dataset, tags)
+    # Rows are inserted in name order, concurrent imports lock the names they share in the same order
+    batch = [by_name[name] for name in sorted(by_name)]
+
+    async with db.async_session() as session:
+        try:
+            inserted, updated, to_probe = await upsert(session, batch)
+            await session.commit()
+            result.inserted += inserted
+            result.updated += updated
+            await schedule_probe(*to_probe)
+            return
+        except Exception as e:
+            await session.rollback()
+            logger.warning(f"Import batch failed, retrying row by row: {e}")
+
+        # Isolate the rows that broke the batch, each row gets its own savepoint
+        inserted = updated = 0
+        to_probe = []
+        for item in batch:
+            try:
+                async with session.begin_nested():
+                    row_inserted, row_updated, row_to_probe = await upsert(session, [item])
+                inserted += row_inserted
+                updated += row_updated
+                to_probe += row_to_probe
+            except Exception as e:
+                result.add_error(item[0], describe(e))
+        await session.commit()
+        result.inserted += inserted
+        result.updated += updated
+        await schedule_probe(*to_probe)
+
+
+async def upsert(session, batch: list) -> Tuple[int, int, List[UUID]]:
+    """
+    Inserts or updates a batch of datasets by name. Returns the inserted and updated counts, and the
+    ids of datasets that are new or got a new source, which need probing once committed.
+    """
+    # Facets and sources of the datasets about to be overwritten, to move their counts to the new values.
+    # Locked in name order, so a concurrent import of the same names waits and then reads what this one wrote.
+    previous = (
+        await session.execute(
+            select(Dataset.name, Dataset.source, Dataset.license, Dataset.format)
+            .filter(
+                Dataset.name.in_([dataset.name for _, dataset, _ in batch]),
+                Dataset.deleted_at == None,
+            )
+            .order_by(Dataset.name)
+            .with_for_update()
+        )
+    ).all()
+
+    statement = insert(Dataset).values([dataset.to_dict() for _, dataset, _ in batch])
+    statement = statement.on_conflict_do_update(
+        index_elements=[Dataset.name],
+        set_={
+            **{column: statement.excluded[column] for column in UPSERT_COLUMNS},
+            # Measurements of a replaced source are stale, they are kept only while the source stays the same
+            **{
+                column: case(
+                    (
+                        Dataset.source.is_distinct_from(statement.excluded.source),
+                        statement.excluded[column],
+                    ),
+                    else_=func.coalesce(statement.excluded[column], getattr(Dataset, column)),
+                )
+                for column in UPSERT_IF_SET_COLUMNS
+            },
+        },
+    ).returning(
+        Dataset.id,
+        Dataset.name,
+        # xmax is only set on rows that already existed and were updated
+        literal_column("xmax = 0").label("inserted"),
+    )
+    rows = (await session.execute(statement)).all()
+    ids = {row.name: row.id for row in rows}
+    inserted = sum(1 for row in rows if row.inserted)
+    sources = {name: source for name, source, _, _ in previous}
+    # A concurrent write committed the dataset after previous was read, its old facets are unknown.
+    # Failing the batch retries its rows one by one, each reading previous again.
+    unseen = sorted(row.name for row in rows if not row.inserted and row.name not in sources)
+    if unseen:
+        raise ConcurrentWrite(unseen)
+    to_probe = [
+        ids[dataset.name]
+        for _, dataset, _ in batch
+        if dataset.name not in sources or sources[dataset.name] != dataset.source
+    ]
+
+    links = await attach_tags(
+        session, [(ids[dataset.name], tags) for _, dataset, tags in batch if tags]
+    )
+    # Counters are written in name order like creates and deletes do, active_datasets_count before
+    # the facet: counters, all facets in one statement, so concurrent writers can not deadlock on shards
+    if inserted:
+        await Counter.increment(session, "active_datasets_count", inserted)
+    await adjust_facets(
+        session,
+        added=itertools.chain(
+            (
+                name
+                for _, dataset, _ in batch
+                for name in dataset_facets(dataset.license, dataset.format)
+            ),
+            (facet_counter("tags", tag_id) for _, tag_id in links),
+        ),
+        removed=(
+            name for _, _, license, format in previous for name in dataset_facets(license, format)
+        ),
+    )
+    return inserted, len(rows) - inserted, to_probe
+
+
+async def attach_tags(session, links: list) -> List[Tuple[UUID, UUID]]:
+    """
+    Creates missing tags by name and links them, links that already exist are left alone.
+    Returns the (dataset_id, tag_id) of each new link.
+    """
+    tag_ids, _ = await ensure_tags(session, (name for _, tags in links for name in tags))
+
+    pairs = {
+        (dataset_id, tag_ids[name])
+        for dataset_id, tags in links
+        for name in tags
+        if name in tag_ids
+    }
+    if not pairs:
+        return []
+    rows = await session.execute(
+        insert(DatasetTag)
+        .values([{"dataset_id": d, "tag_id": t} for d, t in pairs])
+        .on_conflict_do_nothing()
+        .returning(DatasetTag.dataset_id, DatasetTag.tag_id)
+    )
+    return [tuple(row) for row in rows]
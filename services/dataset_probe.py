@@ -0,0 +1,624 @@
+import asyncio
+import csv
+import io
+import ipaddress
+import os
+import re
+import socket
+import struct
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from uuid import UUID
+
+import httpx
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import BigInteger, Integer, String, Uuid, column, func, or_, select, update, values
+
+from core import config, db, logger, response_cache
+from schema import Dataset
+from services.jobs import job_queue
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Bytes read per step, counting memory stays within a chunk whatever the size of the source
+PROBE_CHUNK_SIZE = 1 << 16
+# Bytes the format, delimiter and header are sniffed from
+SNIFF_SIZE = 1 << 14
+# Bytes fetched from the end of a Parquet file, enough for the footer of most files in one request
+PARQUET_TAIL_SIZE = 1 << 16
+# Datasets loaded per query while listing the ones to probe
+PROBE_PAGE_SIZE = 1000
+# Errors listed in a ProbeResult, the rest are only counted and logged
+MAX_REPORTED_ERRORS = 100
+# Redirects followed from a source URL, each hop is checked like the URL itself
+MAX_REDIRECTS = 5
+
+MAGIC = [
+    (b"PAR1", "parquet"),
+    (b"PK\x03\x04", "zip"),
+    (b"%PDF", "pdf"),
+    (b"\x1f\x8b", "gzip"),
+]
+
+
+class ProbeError(Exception):
+    pass
+
+
+@dataclass
+class ProbeResult:
+    probed: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def add_error(self, dataset_id: UUID, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"dataset_id": str(dataset_id), "error": error})
+
+
+@dataclass
+class Measurement:
+    dataset_id: UUID
+    # The source that was measured, results are not written once a dataset's source changes
+    source: str
+    size: Optional[int]
+    row_count: Optional[int]
+    column_count: Optional[int]
+
+
+def sniff(sample: bytes) -> str:
+    """
+    Format of a source from its first bytes: parquet, zip (including xlsx), pdf, gzip, binary,
+    markup for web pages and XML, json, ndjson or csv for any other text
+    """
+    for magic, format in MAGIC:
+        if sample.startswith(magic):
+            return format
+    if b"\x00" in sample:
+        return "binary"
+
+    text = sample.removeprefix(b"\xef\xbb\xbf").lstrip()
+    if text.startswith(b"<"):
+        return "markup"
+    if text.startswith(b"{"):
+        try:
+            orjson.loads(text.split(b"\n", 1)[0])
+            return "ndjson"
+        except orjson.JSONDecodeError:
+            return "json"
+    if text.startswith(b"["):
+        return "json"
+    return "csv"
+
+
+class DelimitedCounter:
+    """
+    Counts the records of CSV and other delimited text, newlines inside quoted fields do not end a record.
+    The first record is taken as the header, Sniffer.has_header guesses wrong whenever every column is text.
+    """
+
+    def __init__(self, sample: bytes):
+        text = sample.decode("utf-8", errors="replace").lstrip("\ufeff")
+        # The sample may end mid record, only its whole lines are sniffed
+        lines = text[: text.rfind("\n") + 1] or text
+        try:
+            dialect = csv.Sniffer().sniff(lines, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        self.columns = len(next(csv.reader(io.StringIO(lines), dialect), []))
+        self.quote = (dialect.quotechar or '"').encode()
+        self.quoted = False
+        self.records = 0
+        self.last = b"\n"
+
+    def feed(self, chunk: bytes):
+        # Pieces between quotes alternate between outside and inside, an escaped "" flips twice
+        for index, piece in enumerate(chunk.split(self.quote)):
+            if index:
+                self.quoted = not self.quoted
+            if not self.quoted:
+                self.records += piece.count(b"\n")
+        if chunk:
+            self.last = chunk[-1:]
+
+    def counts(self) -> Tuple[Optional[int], Optional[int]]:
+        # A last record without a trailing newline still counts
+        records = self.records + (self.last != b"\n")
+        return max(0, records - 1), self.columns
+
+
+class LineCounter:
+    """
+    Counts the records of newline delimited JSON, columns are the keys of the first record
+    """
+
+    def __init__(self, sample: bytes):
+        record = orjson.loads(sample.removeprefix(b"\xef\xbb\xbf").lstrip().split(b"\n", 1)[0])
+        self.columns = len(record) if isinstance(record, dict) else None
+        self.records = 0
+        self.last = b"\n"
+
+    def feed(self, chunk: bytes):
+        self.records += chunk.count(b"\n")
+        if chunk:
+            self.last = chunk[-1:]
+
+    def counts(self) -> Tuple[Optional[int], Optional[int]]:
+        return self.records + (self.last != b"\n"), self.columns
+
+
+class JsonCounter:
+    """
+    Counts the elements of a top level JSON array by tracking nesting, without parsing the values.
+    Columns are the keys of the first element when it is an object. Other documents have no counts.
+    """
+
+    TOKENS = re.compile(rb'["\[\]{},]')
+
+    def __init__(self, sample: bytes):
+        self.depth = 0
+        self.array = None
+        self.in_string = False
+        # A backslash ended the last chunk inside a string, the next byte is escaped
+        self.escaped = False
+        self.commas = 0
+        self.nonempty = False
+        # Whether the first element is an object, None until it starts
+        self.first_object = None
+        self.keys = 0
+
+    def string_end(self, chunk: bytes, position: int) -> int:
+        while True:
+            quote = chunk.find(b'"', position)
+            if quote < 0:
+                tail = chunk[position:]
+                self.escaped = (len(tail) - len(tail.rstrip(b"\\"))) % 2 == 1
+                return -1
+            backslashes = quote - position - len(chunk[position:quote].rstrip(b"\\"))
+            if backslashes % 2 == 0:
+                return quote
+            position = quote + 1
+
+    def value(self, text: bytes):
+        # Numbers, booleans and null have no token of their own
+        if self.depth == 1 and not self.nonempty and text.strip():
+            self.nonempty = True
+            if self.first_object is None:
+                self.first_object = False
+
+    def feed(self, chunk: bytes):
+        position = 0
+        if self.in_string and self.escaped:
+            position = 1
+            self.escaped = False
+        while position < len(chunk):
+            if self.in_string:
+                end = self.string_end(chunk, position)
+                if end < 0:
+                    return
+                self.in_string = False
+                position = end + 1
+                continue
+
+            match = self.TOKENS.search(chunk, position)
+            if match is None:
+                self.value(chunk[position:])
+                return
+            self.value(chunk[position : match.start()])
+            token = match.group()
+            position = match.end()
+
+            if self.array is None:
+                self.array = token == b"["
+            if token == b'"':
+                self.in_string = True
+                if self.depth == 1:
+                    self.nonempty = True
+                    if self.first_object is None:
+                        self.first_object = False
+                elif self.depth == 2 and self.commas == 0 and self.first_object and not self.keys:
+                    self.keys = 1
+            elif token in (b"[", b"{"):
+                if self.depth == 1:
+                    self.nonempty = True
+                    if self.first_object is None:
+                        self.first_object = token == b"{"
+                self.depth += 1
+            elif token in (b"]", b"}"):
+                self.depth -= 1
+            elif self.depth == 1:
+                self.commas += 1
+            elif self.depth == 2 and self.commas == 0 and self.first_object:
+                self.keys += 1
+
+    def counts(self) -> Tuple[Optional[int], Optional[int]]:
+        if not self.array:
+            return None, None
+        return self.commas + self.nonempty, self.keys if self.first_object else None
+
+
+COUNTERS = {"csv": DelimitedCounter, "ndjson": LineCounter, "json": JsonCounter}
+
+
+@dataclass
+class OpenedSource:
+    # Total bytes, None when the server does not say
+    size: Optional[int]
+    chunks: AsyncIterator[bytes]
+    # Reads the last n bytes, None when the source can not seek
+    read_tail: Optional[Callable[[int], Awaitable[bytes]]]
+
+
+def public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    # is_global is false for private, loopback, link-local, reserved and unspecified addresses
+    return ip.is_global and not ip.is_multicast
+
+
+async def resolve_source(url: httpx.URL) -> httpx.URL:
+    """
+    The URL with its host replaced by a resolved address, raises ProbeError unless every address of the host
+    is public. Requests go to the checked address, so the name can not resolve elsewhere in between.
+    """
+    if url.scheme not in ("http", "https") or not url.raw_host:
+        raise ProbeError("Source is not an http(s) URL")
+    host = url.raw_host.decode("ascii")
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(
+            host, url.port or (443 if url.scheme == "https" else 80), type=socket.SOCK_STREAM
+        )
+    except socket.gaierror:
+        raise ProbeError(f"Could not resolve {host}")
+    if not addresses or not all(public_address(info[4][0]) for info in addresses):
+        raise ProbeError(f"{host} resolves to a private or reserved address")
+    return url.copy_with(host=addresses[0][4][0].split("%", 1)[0])
+
+
+async def send_checked(
+    client: httpx.AsyncClient, url: httpx.URL, headers: Dict[str, str]
+) -> Tuple[httpx.Response, httpx.URL]:
+    """
+    Streams a GET of a public URL and the URL that answered. Redirects are followed here rather than by
+    the client, so every hop is resolved and checked again.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        request = client.build_request(
+            "GET",
+            await resolve_source(url),
+            # The original name is kept for virtual hosting and certificate checks
+            headers={**headers, "Host": url.netloc.decode("ascii")},
+            extensions={"sni_hostname": url.raw_host.decode("ascii")},
+        )
+        response = await client.send(request, stream=True)
+        if not response.is_redirect:
+            return response, url
+        await response.aclose()
+        url = url.join(response.headers["location"])
+    raise ProbeError(f"Source redirected more than {MAX_REDIRECTS} times")
+
+
+@asynccontextmanager
+async def open_http(client: httpx.AsyncClient, source: str, max_bytes: int):
+    # Identity encoding keeps sizes and ranges in bytes of the file itself
+    headers = {"Range": f"bytes=0-{max_bytes - 1}", "Accept-Encoding": "identity"}
+    response, url = await send_checked(client, httpx.URL(source), headers)
+    try:
+        response.raise_for_status()
+        size, read_tail = None, None
+        if response.status_code == 206:
+            total = response.headers.get("content-range", "").rpartition("/")[2]
+            size = int(total) if total.isdigit() else None
+
+            async def read_tail(length: int) -> bytes:
+                if length > max_bytes:
+                    raise ProbeError(f"Parquet footer is larger than {max_bytes} bytes")
+                tail, _ = await send_checked(
+                    client, url, {"Range": f"bytes=-{length}", "Accept-Encoding": "identity"}
+                )
+                try:
+                    tail.raise_for_status()
+                    # A server that ignores the range would send the whole file
+                    if tail.status_code != 206:
+                        raise ProbeError("Source did not answer a range request for the Parquet footer")
+                    return (await tail.aread())[-length:]
+                finally:
+                    await tail.aclose()
+
+        elif "content-length" in response.headers:
+            size = int(response.headers["content-length"])
+        yield OpenedSource(size, response.aiter_bytes(PROBE_CHUNK_SIZE), read_tail)
+    finally:
+        await response.aclose()
+
+
+def local_path(source: str) -> Optional[str]:
+    """
+    Path of a file:// URL or absolute path under PROBE_LOCAL_ROOT, None for anything else
+    """
+    if not config.PROBE_LOCAL_ROOT:
+        return None
+    parsed = urlparse(source)
+    if parsed.scheme == "file":
+        path = url2pathname(parsed.path)
+    elif not parsed.scheme and os.path.isabs(source):
+        path = source
+    else:
+        return None
+
+    root = os.path.realpath(config.PROBE_LOCAL_ROOT)
+    path = os.path.realpath(path)
+    return path if os.path.commonpath([root, path]) == root else None
+
+
+@asynccontextmanager
+async def open_local(path: str):
+    file = await run_in_threadpool(open, path, "rb")
+    try:
+        size = os.fstat(file.fileno()).st_size
+
+        async def chunks() -> AsyncIterator[bytes]:
+            while chunk := await run_in_threadpool(file.read, PROBE_CHUNK_SIZE):
+                yield chunk
+
+        def read_last(length: int) -> bytes:
+            file.seek(max(0, size - length))
+            return file.read(length)
+
+        async def read_tail(length: int) -> bytes:
+            return await run_in_threadpool(read_last, length)
+
+        yield OpenedSource(size, chunks(), read_tail)
+    finally:
+        file.close()
+
+
+async def parquet_counts(opened: OpenedSource) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Rows and columns from the footer of a Parquet file, read without fetching the rest of it
+    """
+    if pyarrow is None or opened.read_tail is None:
+        return None, None
+    tail = await opened.read_tail(PARQUET_TAIL_SIZE)
+    # The file ends with the footer, its length and the magic bytes
+    length = struct.unpack("<I", tail[-8:-4])[0] + 8
+    if length > len(tail):
+        tail = await opened.read_tail(length)
+    # Only the footer is read, the leading magic stands in for the rest of the file
+    metadata = pyarrow.parquet.read_metadata(pyarrow.BufferReader(b"PAR1" + tail[-length:]))
+    return metadata.num_rows, metadata.num_columns
+
+
+async def measure(
+    opened: OpenedSource, max_bytes: int
+) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """
+    Size, rows and columns of an opened source. Rows are only counted when at most max_bytes
+    have to be read, larger sources get their size and columns.
+    """
+    sample = b""
+    async for chunk in opened.chunks:
+        sample += chunk
+        if len(sample) >= SNIFF_SIZE:
+            break
+
+    format = sniff(sample[:SNIFF_SIZE])
+    if format == "markup":
+        raise ProbeError("Source is a web page or XML document rather than a data file")
+    if format == "parquet":
+        return (opened.size, *await parquet_counts(opened))
+    if format not in COUNTERS:
+        return opened.size, None, None
+
+    counter = COUNTERS[format](sample[:SNIFF_SIZE])
+    counter.feed(sample)
+    read, complete = len(sample), True
+    async for chunk in opened.chunks:
+        if read + len(chunk) > max_bytes:
+            complete = False
+            break
+        counter.feed(chunk)
+        read += len(chunk)
+    # A range response stops at max_bytes even though the file goes on
+    if opened.size is not None and read < opened.size:
+        complete = False
+
+    rows, columns = counter.counts()
+    size = opened.size if opened.size is not None else read if complete else None
+    return size, rows if complete else None, columns
+
+
+async def probe_source(
+    client: httpx.AsyncClient, source: str, max_bytes: int
+) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    if urlparse(source).scheme in ("http", "https"):
+        opener = open_http(client, source, max_bytes)
+    else:
+        path = local_path(source)
+        if path is None:
+            raise ProbeError("Source is neither an http(s) URL nor a file under PROBE_LOCAL_ROOT")
+        opener = open_local(path)
+    async with opener as opened:
+        return await measure(opened, max_bytes)
+
+
+async def write_measurements(measurements: List[Measurement]) -> int:
+    """
+    Writes a batch of measurements in one UPDATE ... FROM (VALUES ...) and returns how many datasets changed.
+    Values that could not be measured keep what is stored, datasets whose source changed since are left alone.
+    """
+    if not measurements:
+        return 0
+    rows = values(
+        column("id", Uuid),
+        column("source", String),
+        column("size", BigInteger),
+        column("row_count", Integer),
+        column("column_count", Integer),
+        name="measurements",
+    ).data(
+        [
+            (item.dataset_id, item.source, item.size, item.row_count, item.column_count)
+            for item in measurements
+        ]
+    )
+    measured = {
+        name: func.coalesce(rows.c[name], getattr(Dataset, name))
+        for name in ("size", "row_count", "column_count")
+    }
+    async with db.async_session() as session:
+        changed = (
+            await session.scalars(
+                update(Dataset)
+                .filter(
+                    Dataset.id == rows.c.id,
+                    Dataset.source == rows.c.source,
+                    Dataset.deleted_at == None,
+                    or_(
+                        *(
+                            getattr(Dataset, name).is_distinct_from(value)
+                            for name, value in measured.items()
+                        )
+                    ),
+                )
+                .values(**measured, updated_at=datetime.now(timezone.utc))
+                .returning(Dataset.id)
+            )
+        ).all()
+        await session.commit()
+
+    if changed:
+        await response_cache.invalidate(
+            "datasets", *(f"dataset:{dataset_id}" for dataset_id in changed)
+        )
+    return len(changed)
+
+
+async def datasets_to_probe(
+    dataset_ids: Optional[List[UUID]], missing_only: bool
+) -> AsyncIterator[Tuple[UUID, str]]:
+    """
+    (id, source) of the active datasets to probe, read a page at a time in id order
+    """
+    filters = [Dataset.deleted_at == None]
+    if dataset_ids is not None:
+        filters.append(Dataset.id.in_(dataset_ids))
+    if missing_only:
+        filters.append(Dataset.size == None)
+
+    after = None
+    while True:
+        statement = (
+            select(Dataset.id, Dataset.source)
+            .filter(*filters)
+            .order_by(Dataset.id)
+            .limit(PROBE_PAGE_SIZE)
+        )
+        if after is not None:
+            statement = statement.filter(Dataset.id > after)
+        async with db.async_session() as session:
+            rows = (await session.execute(statement)).all()
+        for dataset_id, source in rows:
+            yield dataset_id, source
+        if len(rows) < PROBE_PAGE_SIZE:
+            return
+        after = rows[-1][0]
+
+
+async def probe_datasets(
+    dataset_ids: Optional[List[UUID]] = None,
+    missing_only: bool = True,
+    limit: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> ProbeResult:
+    """
+    Measures the size, row count and column count of datasets from their sources and writes them back
+    in batches. At most concurrency sources are read at once. By default only datasets without a size are probed.
+    Rows are only counted for sources of at most max_bytes, PROBE_MAX_BYTES by default.
+    """
+    concurrency = concurrency or config.PROBE_CONCURRENCY
+    batch_size = batch_size or config.PROBE_BATCH_SIZE
+    max_bytes = max_bytes or config.PROBE_MAX_BYTES
+    result = ProbeResult()
+    measurements: List[Measurement] = []
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def probe(client: httpx.AsyncClient, dataset_id: UUID, source: str):
+        try:
+            size, rows, columns = await asyncio.wait_for(
+                probe_source(client, source, max_bytes), config.PROBE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            result.add_error(dataset_id, f"Timed out after {config.PROBE_TIMEOUT}s")
+        except httpx.HTTPStatusError as e:
+            result.add_error(dataset_id, f"Source answered HTTP {e.response.status_code}")
+        except Exception as e:
+            logger.warning(f"Failed to probe dataset {dataset_id}: {e}")
+            result.add_error(dataset_id, str(e) or type(e).__name__)
+        else:
+            if (size, rows, columns) != (None, None, None):
+                measurements.append(Measurement(dataset_id, source, size, rows, columns))
+        finally:
+            slots.release()
+
+    async def flush(minimum: int):
+        if len(measurements) >= minimum:
+            batch = measurements[:]
+            measurements.clear()
+            result.updated += await write_measurements(batch)
+
+    timeout = httpx.Timeout(30, connect=10)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async for dataset_id, source in datasets_to_probe(dataset_ids, missing_only):
+            if limit is not None and result.probed >= limit:
+                break
+            await slots.acquire()
+            result.probed += 1
+            task = asyncio.create_task(probe(client, dataset_id, source))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            await flush(batch_size)
+        await asyncio.gather(*tasks)
+    await flush(1)
+    return result
+
+
+@job_queue.register("probe_datasets", timeout=2 * config.PROBE_TIMEOUT)
+async def probe_datasets_job(dataset_ids: List[str], max_bytes: Optional[int] = None) -> dict:
+    result = await probe_datasets(
+        [UUID(id) for id in dataset_ids], missing_only=False, max_bytes=max_bytes
+    )
+    return {"probed": result.probed, "updated": result.updated, "failed": result.failed}
+
+
+async def schedule_probe(*dataset_ids: UUID):
+    """
+    Queues a probe of the datasets after a write, reading at most PROBE_ON_WRITE_MAX_BYTES of each source.
+    Failing to queue it only skips it, `cli.py probe-datasets` catches up.
+    """
+    if not config.PROBE_ON_WRITE or not dataset_ids:
+        return
+    try:
+        await job_queue.enqueue(
+            "probe_datasets",
+            dataset_ids=[str(id) for id in dataset_ids],
+            max_bytes=config.PROBE_ON_WRITE_MAX_BYTES,
+        )
+    except Exception as e:
+        logger.warning(f"Could not queue a probe of datasets {dataset_ids}: {e}")
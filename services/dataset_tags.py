@@ -0,0 +1,161 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Annotated, Dict, Iterable, List, Literal, Set, Tuple
+from uuid import UUID
+
+from pydantic import BaseModel, Field, StringConstraints
+from sqlalchemy import delete, select, true, update
+from sqlalchemy.dialects.postgresql import insert
+
+from schema import Dataset, DatasetTag, Tag
+from services.facets import adjust_tag_facets
+
+# Per operation bounds, each statement binds at most MAX_BATCH_DATASETS + MAX_BATCH_TAGS parameters
+MAX_BATCH_DATASETS = 1000
+MAX_BATCH_TAGS = 100
+MAX_BATCH_OPERATIONS = 50
+
+TagName = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=50)]
+
+
+class TagOperation(BaseModel):
+    # replace leaves each dataset with exactly the given tags, an empty list removes them all
+    action: Literal["attach", "detach", "replace"]
+    dataset_ids: List[UUID] = Field(min_length=1, max_length=MAX_BATCH_DATASETS)
+    tags: List[TagName] = Field(max_length=MAX_BATCH_TAGS)
+
+
+class TagBatch(BaseModel):
+    operations: List[TagOperation] = Field(min_length=1, max_length=MAX_BATCH_OPERATIONS)
+
+
+@dataclass
+class TagBatchResult:
+    attached: int = 0
+    detached: int = 0
+    created_tags: int = 0
+    datasets_changed: int = 0
+
+
+class DatasetsNotFound(Exception):
+    def __init__(self, dataset_ids: List[UUID]):
+        self.dataset_ids = dataset_ids
+        super().__init__(f"Datasets not found: {', '.join(str(id) for id in dataset_ids)}")
+
+
+async def ensure_tags(session, names: Iterable[str]) -> Tuple[Dict[str, UUID], int]:
+    """
+    Ids of the active tags with the given names, creating the missing ones, and how many were created.
+    A name held by a soft deleted tag can not be reused and is left out.
+    """
+    names = set(names)
+    if not names:
+        return {}, 0
+
+    created = (
+        await session.execute(
+            insert(Tag)
+            # In name order, so concurrent writers creating the same tags wait rather than deadlock
+            .values([Tag(name=name).to_dict() for name in sorted(names)])
+            .on_conflict_do_nothing(index_elements=[Tag.name])
+            .returning(Tag.id)
+        )
+    ).all()
+    tag_ids = dict(
+        (
+            await session.execute(
+                select(Tag.name, Tag.id).filter(Tag.name.in_(names), Tag.deleted_at == None)
+            )
+        ).all()
+    )
+    return tag_ids, len(created)
+
+
+async def link_tags(
+    session, dataset_ids: Iterable[UUID], tag_ids: Iterable[UUID]
+) -> List[Tuple[UUID, UUID]]:
+    """
+    Links every dataset to every tag in one INSERT ... SELECT, existing links are left alone.
+    Returns the (dataset_id, tag_id) of each new link.
+    """
+    statement = (
+        insert(DatasetTag)
+        .from_select(
+            ["dataset_id", "tag_id"],
+            select(Dataset.id, Tag.id)
+            .join(Tag, true())
+            .filter(Dataset.id.in_(list(dataset_ids)), Tag.id.in_(list(tag_ids))),
+        )
+        .on_conflict_do_nothing()
+        .returning(DatasetTag.dataset_id, DatasetTag.tag_id)
+    )
+    return [tuple(row) for row in await session.execute(statement)]
+
+
+async def unlink_tags(
+    session, dataset_ids: Iterable[UUID], tag_ids: Iterable[UUID], keep: bool = False
+) -> List[Tuple[UUID, UUID]]:
+    """
+    Removes the datasets' links to the tags, or with keep their links to every other tag.
+    Returns the (dataset_id, tag_id) of each removed link.
+    """
+    tag_ids = list(tag_ids)
+    statement = delete(DatasetTag).filter(
+        DatasetTag.dataset_id.in_(list(dataset_ids)),
+        DatasetTag.tag_id.not_in(tag_ids) if keep else DatasetTag.tag_id.in_(tag_ids),
+    )
+    statement = statement.returning(DatasetTag.dataset_id, DatasetTag.tag_id)
+    return [tuple(row) for row in await session.execute(statement)]
+
+
+async def apply_tag_batch(session, batch: TagBatch) -> TagBatchResult:
+    """
+    Applies the operations in order within the session's transaction, the caller commits.
+    Raises DatasetsNotFound before changing anything when a dataset does not exist or was deleted.
+    """
+    known: Set[UUID] = set()
+    for operation in batch.operations:
+        unchecked = set(operation.dataset_ids) - known
+        if unchecked:
+            found = set(
+                await session.scalars(
+                    select(Dataset.id).filter(Dataset.id.in_(unchecked), Dataset.deleted_at == None)
+                )
+            )
+            if unchecked - found:
+                raise DatasetsNotFound(sorted(unchecked - found))
+            known |= found
+
+    result = TagBatchResult()
+    changed: Set[UUID] = set()
+    now = datetime.now(timezone.utc)
+    for operation in batch.operations:
+        added, removed = [], []
+        if operation.action == "detach":
+            tag_ids = list(
+                await session.scalars(select(Tag.id).filter(Tag.name.in_(set(operation.tags))))
+            )
+            if tag_ids:
+                removed = await unlink_tags(session, operation.dataset_ids, tag_ids)
+        else:
+            by_name, created = await ensure_tags(session, operation.tags)
+            tag_ids = list(by_name.values())
+            result.created_tags += created
+            if operation.action == "replace":
+                removed = await unlink_tags(session, operation.dataset_ids, tag_ids, keep=True)
+            if tag_ids:
+                added = await link_tags(session, operation.dataset_ids, tag_ids)
+        result.attached += len(added)
+        result.detached += len(removed)
+        await adjust_tag_facets(session, added, removed)
+
+        # Links live in their own table, touch the datasets so their validators change
+        touched = {dataset_id for dataset_id, _ in added + removed}
+        if touched - changed:
+            await session.execute(
+                update(Dataset).filter(Dataset.id.in_(touched - changed)).values(updated_at=now)
+            )
+        changed |= touched
+
+    result.datasets_changed = len(changed)
+    return result
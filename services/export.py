@@ -0,0 +1,131 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, List
+
+import orjson
+from sqlalchemy import Select
+
+from core import db
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Rows fetched from the server side cursor and encoded per chunk
+EXPORT_CHUNK_SIZE = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportFormatUnavailable(Exception):
+    pass
+
+
+def open_export(statement: Select, format: str) -> AsyncIterator[bytes]:
+    """
+    Returns the encoded export of the statement's rows, memory use is bounded by EXPORT_CHUNK_SIZE
+    """
+    encoders = {"ndjson": encode_ndjson, "csv": encode_csv, "parquet": encode_parquet}
+    if format == "parquet" and pyarrow is None:
+        raise ExportFormatUnavailable("Parquet export requires pyarrow to be installed")
+    return encoders[format](statement)
+
+
+async def fetch_chunks(statement: Select) -> AsyncIterator[List[dict]]:
+    # Responses stream after request dependencies have closed, so the export owns its session
+    async with db.async_session() as session:
+        result = await session.stream(
+            statement.execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        async for partition in result.mappings().partitions():
+            yield [dict(row) for row in partition]
+
+
+async def encode_ndjson(statement: Select) -> AsyncIterator[bytes]:
+    async for rows in fetch_chunks(statement):
+        yield b"".join(
+            # default=str covers asyncpg's UUID subclass, which orjson does not encode natively
+            orjson.dumps(row, default=str, option=orjson.OPT_APPEND_NEWLINE)
+            for row in rows
+        )
+
+
+async def encode_csv(statement: Select) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in statement.selected_columns])
+    async for rows in fetch_chunks(statement):
+        writer.writerows(row.values() for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only file that hands back what was written since the last drain, while reporting
+    the absolute position the Parquet writer needs for its footer offsets
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_type(column):
+    python_type = column.type.python_type
+    if python_type is int:
+        return pyarrow.int64()
+    if python_type is datetime:
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+
+async def encode_parquet(statement: Select) -> AsyncIterator[bytes]:
+    columns = list(statement.selected_columns)
+    schema = pyarrow.schema([(column.name, parquet_type(column)) for column in columns])
+    # Values without a native Parquet type (UUIDs) are written as strings
+    as_string = [
+        column.name for column in columns if column.type.python_type not in (int, datetime, str)
+    ]
+
+    sink = ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    try:
+        async for rows in fetch_chunks(statement):
+            for row in rows:
+                for name in as_string:
+                    if row[name] is not None:
+                        row[name] = str(row[name])
+            # Each chunk becomes its own row group
+            writer.write_table(pyarrow.Table.from_pylist(rows, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,168 @@
+from collections import Counter as Tally
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import BigInteger, String, cast, delete, func, insert, literal, select
+
+from schema import Counter, Dataset, DatasetTag, Tag
+
+# Dataset attributes counted per value, tags are counted per tag id so renames need no update
+FACETS = ("tags", "license", "format")
+PREFIX = "facet:"
+
+
+@dataclass
+class FacetCount:
+    value: str
+    count: int
+
+
+@dataclass
+class Facets:
+    tags: List[FacetCount]
+    license: List[FacetCount]
+    format: List[FacetCount]
+
+
+def facet_counter(facet: str, value) -> str:
+    return f"{PREFIX}{facet}:{value}"
+
+
+def dataset_facets(license: str, format: str, tag_ids: Iterable[UUID] = ()) -> List[str]:
+    """
+    Counters an active dataset with these attributes and tags is counted in
+    """
+    return [
+        facet_counter("license", license),
+        facet_counter("format", format),
+        *(facet_counter("tags", tag_id) for tag_id in tag_ids),
+    ]
+
+
+async def adjust_facets(session, added: Iterable[str] = (), removed: Iterable[str] = ()):
+    """
+    Applies a write's changes to the unfiltered facet counts in the session's transaction
+    """
+    deltas = Tally(added)
+    deltas.subtract(removed)
+    await Counter.increment_many(session, deltas)
+
+
+async def adjust_tag_facets(
+    session,
+    added: Iterable[Tuple[UUID, UUID]] = (),
+    removed: Iterable[Tuple[UUID, UUID]] = (),
+):
+    """
+    Counts (dataset_id, tag_id) links that were created and removed, in one name ordered statement
+    """
+    await adjust_facets(
+        session,
+        added=(facet_counter("tags", tag_id) for _, tag_id in added),
+        removed=(facet_counter("tags", tag_id) for _, tag_id in removed),
+    )
+
+
+def rebuild_statements() -> list:
+    """
+    Statements that recount every facet from the active datasets, run them in one transaction.
+    Links to soft deleted tags are counted too, reads leave those tags out.
+    """
+    active = Dataset.deleted_at == None
+    counts = [
+        select(literal(f"{PREFIX}{facet}:") + getattr(Dataset, facet), literal(0), func.count())
+        .filter(active)
+        .group_by(getattr(Dataset, facet))
+        for facet in ("license", "format")
+    ]
+    counts.append(
+        select(
+            literal(f"{PREFIX}tags:") + cast(DatasetTag.tag_id, String), literal(0), func.count()
+        )
+        .join(Dataset, Dataset.id == DatasetTag.dataset_id)
+        .filter(active)
+        .group_by(DatasetTag.tag_id)
+    )
+    return [
+        delete(Counter).filter(Counter.name.startswith(PREFIX)),
+        *(insert(Counter).from_select(["name", "shard", "value"], count) for count in counts),
+    ]
+
+
+async def rebuild_facets(session):
+    for statement in rebuild_statements():
+        await session.execute(statement)
+
+
+async def read_facets(session, limit: int) -> Dict[str, List[dict]]:
+    """
+    Unfiltered facets from the counters, one row per counter shard rather than a scan of the datasets
+    """
+    total = cast(func.sum(Counter.value), BigInteger)
+    rows = await session.execute(
+        select(Counter.name, total)
+        .filter(Counter.name.startswith(PREFIX))
+        .group_by(Counter.name)
+        .having(total > 0)
+    )
+    counts = {facet: {} for facet in FACETS}
+    for name, count in rows:
+        facet, value = name[len(PREFIX) :].split(":", 1)
+        counts[facet][UUID(value) if facet == "tags" else value] = count
+
+    # Tags are counted by id, named here and left out once deleted
+    names = {}
+    if counts["tags"]:
+        names = dict(
+            (
+                await session.execute(
+                    select(Tag.id, Tag.name).filter(
+                        Tag.id.in_(list(counts["tags"])), Tag.deleted_at == None
+                    )
+                )
+            ).all()
+        )
+    counts["tags"] = {
+        names[tag_id]: count for tag_id, count in counts["tags"].items() if tag_id in names
+    }
+    return {facet: top(values.items(), limit) for facet, values in counts.items()}
+
+
+async def count_facets(session, filters: list, limit: int) -> Dict[str, List[dict]]:
+    """
+    Facets of the datasets matching a search, counted with one GROUP BY per facet
+    """
+    facets = {}
+    for facet in ("license", "format"):
+        column = getattr(Dataset, facet)
+        count = func.count().label("count")
+        rows = await session.execute(
+            select(column, count)
+            .filter(*filters)
+            .group_by(column)
+            .order_by(count.desc(), column)
+            .limit(limit)
+        )
+        facets[facet] = top(rows.all(), limit)
+
+    count = func.count().label("count")
+    rows = await session.execute(
+        select(Tag.name, count)
+        .select_from(DatasetTag)
+        .join(Tag, Tag.id == DatasetTag.tag_id)
+        .filter(
+            DatasetTag.dataset_id.in_(select(Dataset.id).filter(*filters)),
+            Tag.deleted_at == None,
+        )
+        .group_by(Tag.name)
+        .order_by(count.desc(), Tag.name)
+        .limit(limit)
+    )
+    facets["tags"] = top(rows.all(), limit)
+    return {facet: facets[facet] for facet in FACETS}
+
+
+def top(counts: Iterable[Tuple[str, int]], limit: Optional[int]) -> List[dict]:
+    ordered = sorted(counts, key=lambda item: (-item[1], item[0]))
+    return [{"value": value, "count": count} for value, count in ordered[:limit]]
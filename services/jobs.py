@@ -0,0 +1,295 @@
+import asyncio
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Set
+from uuid import UUID, uuid4
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+
+from core import config, db, logger
+from core.cache import TTLCache
+from schema import Job
+
+
+def utcnow() -> datetime:
+    return datetime.now(tz=timezone.utc)
+
+
+@dataclass
+class JobStatus:
+    id: UUID
+    name: str
+    # queued, running, succeeded or failed
+    status: str = "queued"
+    attempts: int = 0
+    result: Any = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=utcnow)
+    updated_at: datetime = field(default_factory=utcnow)
+
+    @classmethod
+    def from_row(cls, job: Job) -> "JobStatus":
+        return cls(
+            id=job.id,
+            name=job.name,
+            status=job.status,
+            attempts=job.attempts,
+            result=job.result,
+            error=job.error,
+            created_at=job.created_at,
+            updated_at=job.updated_at,
+        )
+
+
+class JobQueueFull(Exception):
+    def __init__(self, size: int):
+        super().__init__(f"Job queue is full ({size} jobs waiting)")
+
+
+class JobQueue:
+    """
+    Runs registered handlers on a fixed number of worker tasks, so slow side effects leave the request early.
+    Coroutine handlers run on the event loop, plain functions on the thread pool. Failed attempts are retried
+    with exponential backoff. With persist every job is also recorded in the jobs table, and jobs that were
+    queued, retrying or interrupted when a process stopped are run again by the next one to start.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        size: int,
+        max_attempts: int,
+        timeout: float,
+        backoff: float,
+        backoff_max: float,
+        status_ttl: float,
+        persist: bool,
+    ):
+        self.workers = workers
+        self.size = size
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.persist = persist
+        self.handlers: Dict[str, Callable] = {}
+        self.timeouts: Dict[str, float] = {}
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.statuses = TTLCache(maxsize=10 * size, ttl=status_ttl)
+        # Retries waiting out their backoff
+        self.retries: Set[asyncio.Task] = set()
+
+    def register(self, name: str, timeout: Optional[float] = None):
+        """
+        Registers the decorated function as the handler of jobs with the given name, its keyword arguments
+        are the job's payload and its return value the job's result (both JSON serializable with persist).
+        timeout overrides the queue's limit on each attempt.
+        """
+
+        def decorator(handler: Callable) -> Callable:
+            self.handlers[name] = handler
+            self.timeouts[name] = timeout or self.timeout
+            return handler
+
+        return decorator
+
+    async def enqueue(self, name: str, **payload) -> JobStatus:
+        """
+        Queues a job and returns its status, raises JobQueueFull instead of waiting for room
+        """
+        if name not in self.handlers:
+            raise ValueError(f"No handler registered for job {name}")
+        if self.queue.full():
+            raise JobQueueFull(self.size)
+
+        job = JobStatus(id=uuid4(), name=name)
+        if self.persist:
+            async with db.async_session() as session:
+                session.add(Job(id=job.id, name=name, payload=payload))
+                await session.commit()
+        self.statuses.set(job.id, job)
+        self.queue.put_nowait((job, payload))
+        return job
+
+    async def status(self, job_id: UUID) -> Optional[JobStatus]:
+        job = self.statuses.get(job_id)
+        if job is None and self.persist:
+            async with db.async_session() as session:
+                row = await session.get(Job, job_id)
+            if row is not None:
+                job = JobStatus.from_row(row)
+        return job
+
+    def backoff_delay(self, attempts: int) -> float:
+        # Jittered, so jobs that failed together during an outage do not all retry at once
+        delay = min(self.backoff * 2 ** (attempts - 1), self.backoff_max)
+        return delay * random.uniform(0.5, 1)
+
+    async def claim(self, job: JobStatus) -> bool:
+        """
+        Marks a persisted job as running, False when another process already claimed or finished it
+        """
+        async with db.async_session() as session:
+            attempts = await session.scalar(
+                update(Job)
+                .filter(Job.id == job.id, Job.status == "queued")
+                .values(status="running", attempts=Job.attempts + 1, updated_at=utcnow())
+                .returning(Job.attempts)
+            )
+            await session.commit()
+        if attempts is None:
+            return False
+        job.attempts = attempts
+        return True
+
+    async def record(self, job: JobStatus, run_after: Optional[datetime] = None):
+        job.updated_at = utcnow()
+        # Kept for status_ttl after the latest update, not after it was queued
+        self.statuses.set(job.id, job)
+        if not self.persist:
+            return
+        async with db.async_session() as session:
+            await session.execute(
+                update(Job)
+                .filter(Job.id == job.id)
+                .values(
+                    status=job.status,
+                    result=job.result,
+                    error=job.error,
+                    run_after=run_after,
+                    updated_at=job.updated_at,
+                )
+            )
+            await session.commit()
+
+    async def execute(self, job: JobStatus, payload: dict):
+        if self.persist:
+            if not await self.claim(job):
+                return
+        else:
+            job.attempts += 1
+        job.status = "running"
+        job.updated_at = utcnow()
+
+        handler = self.handlers[job.name]
+        timeout = self.timeouts[job.name]
+        try:
+            if asyncio.iscoroutinefunction(handler):
+                result = await asyncio.wait_for(handler(**payload), timeout)
+            else:
+                # A timed out thread keeps running, the attempt is only given up on
+                result = await asyncio.wait_for(run_in_threadpool(handler, **payload), timeout)
+        except asyncio.TimeoutError:
+            job.error = f"Timed out after {timeout}s"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+        else:
+            job.status = "succeeded"
+            job.result = result
+            job.error = None
+            await self.record(job)
+            return
+
+        if job.attempts >= self.max_attempts:
+            logger.error(f"Job {job.name} {job.id} failed after {job.attempts} attempts: {job.error}")
+            job.status = "failed"
+            await self.record(job)
+            return
+
+        delay = self.backoff_delay(job.attempts)
+        logger.warning(
+            f"Job {job.name} {job.id} attempt {job.attempts} failed, retrying in {delay:.1f}s: {job.error}"
+        )
+        job.status = "queued"
+        await self.record(job, run_after=utcnow() + timedelta(seconds=delay))
+        self.schedule(job, payload, delay)
+
+    def schedule(self, job: JobStatus, payload: dict, delay: float):
+        async def requeue():
+            await asyncio.sleep(delay)
+            # Retries wait for room in the queue rather than being dropped
+            await self.queue.put((job, payload))
+
+        task = asyncio.create_task(requeue())
+        self.retries.add(task)
+        task.add_done_callback(self.retries.discard)
+
+    async def recover(self) -> int:
+        """
+        Schedules the persisted jobs that are queued or waiting to retry, and returns how many. A job still
+        running after the longest timeout belongs to a process that stopped mid attempt and is run again.
+        """
+        now = utcnow()
+        longest = max(self.timeouts.values(), default=self.timeout)
+        async with db.async_session() as session:
+            await session.execute(
+                update(Job)
+                .filter(
+                    Job.status == "running",
+                    Job.updated_at < now - timedelta(seconds=longest),
+                )
+                .values(status="queued")
+            )
+            rows = (
+                await session.scalars(
+                    select(Job).filter(Job.status == "queued").order_by(Job.created_at)
+                )
+            ).all()
+            await session.commit()
+
+        recovered = 0
+        for row in rows:
+            if row.name not in self.handlers:
+                logger.warning(f"Job {row.name} {row.id} has no registered handler, left queued")
+                continue
+            job = JobStatus.from_row(row)
+            self.statuses.set(job.id, job)
+            # Stored as naive UTC
+            run_after = row.run_after.replace(tzinfo=timezone.utc) if row.run_after else now
+            self.schedule(job, row.payload, max(0.0, (run_after - now).total_seconds()))
+            recovered += 1
+        return recovered
+
+    async def work(self):
+        while True:
+            job, payload = await self.queue.get()
+            try:
+                await self.execute(job, payload)
+            except Exception as e:
+                # Failures of the job itself are handled by execute, this is the jobs table being unreachable
+                logger.error(f"Job {job.name} {job.id} could not be run: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def run(self):
+        """
+        Runs the workers until cancelled. Without persist, jobs still queued at that point are dropped.
+        """
+        if self.persist:
+            try:
+                recovered = await self.recover()
+                if recovered:
+                    logger.info(f"Recovered {recovered} persisted jobs")
+            except Exception as e:
+                logger.error(f"Failed to recover persisted jobs: {e}")
+
+        workers = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in (*workers, *self.retries):
+                task.cancel()
+
+
+job_queue = JobQueue(
+    workers=config.JOB_WORKERS,
+    size=config.JOB_QUEUE_SIZE,
+    max_attempts=config.JOB_MAX_ATTEMPTS,
+    timeout=config.JOB_TIMEOUT,
+    backoff=config.JOB_RETRY_BACKOFF,
+    backoff_max=config.JOB_RETRY_BACKOFF_MAX,
+    status_ttl=config.JOB_STATUS_TTL,
+    persist=config.JOB_PERSIST,
+)
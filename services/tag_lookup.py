@@ -0,0 +1,41 @@
+from typing import Dict, Iterable
+from uuid import UUID
+
+from sqlalchemy import select
+
+from core import AsyncSession, config
+from core.cache import TTLCache
+from schema import Tag
+
+# Name to id of active tags, only tags that exist are cached so newly created ones are found right away
+tag_ids = TTLCache(maxsize=10000, ttl=config.TAG_LOOKUP_TTL)
+
+
+async def resolve_tag_ids(session: AsyncSession, names: Iterable[str]) -> Dict[str, UUID]:
+    """
+    Ids of the active tags with the given names, names without an active tag are left out.
+    Cached names cost no query, the rest are looked up together.
+    """
+    resolved, missing = {}, []
+    for name in set(names):
+        tag_id = tag_ids.get(name)
+        if tag_id is None:
+            missing.append(name)
+        else:
+            resolved[name] = tag_id
+
+    if missing:
+        rows = await session.execute(
+            select(Tag.name, Tag.id).filter(Tag.name.in_(missing), Tag.deleted_at == None)
+        )
+        for name, tag_id in rows:
+            tag_ids.set(name, tag_id)
+            resolved[name] = tag_id
+    return resolved
+
+
+def forget_tag_ids():
+    """
+    Drops cached lookups after a tag is renamed or deleted, other workers catch up within TAG_LOOKUP_TTL
+    """
+    tag_ids.clear()
@@ -0,0 +1,144 @@
+import asyncio
+from collections import Counter as Tally
+from dataclasses import dataclass
+from typing import List, Tuple
+from uuid import UUID
+
+from sqlalchemy import Integer, Uuid, column, delete, func, literal_column, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+
+from core import config, db, logger, response_cache
+from schema import Dataset, Vote
+
+
+@dataclass
+class VoteResult:
+    dataset_id: UUID
+    # The caller's vote after the request, 0 when retracted
+    vote: int
+    votes: int
+
+
+async def cast_vote(session, user_id: str, dataset_id: UUID, value: int) -> int:
+    """
+    Records the user's vote and returns how much it changes the dataset's total: the value for a new vote,
+    twice the value when it reverses an earlier one and 0 when it repeats it
+    """
+    statement = insert(Vote).values(user_id=user_id, dataset_id=dataset_id, value=value)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Vote.user_id, Vote.dataset_id],
+        set_={"value": statement.excluded.value},
+        where=Vote.value != statement.excluded.value,
+    ).returning(literal_column("xmax = 0").label("inserted"))
+    row = (await session.execute(statement)).first()
+    if row is None:
+        return 0
+    return value if row.inserted else 2 * value
+
+
+async def retract_vote(session, user_id: str, dataset_id: UUID) -> int:
+    """
+    Removes the user's vote and returns how much that changes the dataset's total
+    """
+    value = await session.scalar(
+        delete(Vote)
+        .filter(Vote.user_id == user_id, Vote.dataset_id == dataset_id)
+        .returning(Vote.value)
+    )
+    return -value if value else 0
+
+
+async def apply_vote_deltas(session, deltas: List[Tuple[UUID, int]]):
+    """
+    Adds each delta to its dataset's votes in a single UPDATE ... FROM (VALUES ...)
+    """
+    rows = values(column("id", Uuid), column("delta", Integer), name="deltas").data(deltas)
+    await session.execute(
+        update(Dataset)
+        .filter(Dataset.id == rows.c.id)
+        # A vote is not an edit of the dataset, updated_at is set to itself so its onupdate does not apply
+        .values(votes=Dataset.votes + rows.c.delta, updated_at=Dataset.updated_at)
+    )
+
+
+class VoteBuffer:
+    """
+    Sums vote deltas per dataset in memory and writes them in batches, so a popular dataset takes one row
+    update per flush instead of one per vote. Votes themselves are committed before their delta is buffered,
+    deltas lost to a crash are restored from the votes table by reconcile_votes.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.deltas: Tally = Tally()
+        self.lock = asyncio.Lock()
+
+    def add(self, dataset_id: UUID, delta: int):
+        if delta:
+            self.deltas[dataset_id] += delta
+
+    def pending(self, dataset_id: UUID) -> int:
+        return self.deltas[dataset_id]
+
+    async def flush(self) -> int:
+        """
+        Writes the buffered deltas and returns how many datasets were updated.
+        Deltas of a batch that fails are put back and retried on the next flush.
+        """
+        async with self.lock:
+            deltas, self.deltas = self.deltas, Tally()
+            pending = [(dataset_id, delta) for dataset_id, delta in deltas.items() if delta]
+            flushed = []
+            for offset in range(0, len(pending), self.batch_size):
+                batch = pending[offset : offset + self.batch_size]
+                try:
+                    async with db.async_session() as session:
+                        await apply_vote_deltas(session, batch)
+                        await session.commit()
+                except Exception as e:
+                    logger.error(f"Failed to flush votes, retrying on the next flush: {e}")
+                    for dataset_id, delta in pending[offset:]:
+                        self.deltas[dataset_id] += delta
+                    break
+                flushed.extend(dataset_id for dataset_id, _ in batch)
+
+        # Details and the top list go stale once per flush rather than once per vote. Other lists show votes
+        # too but expire after CACHE_TTL, dropping every cached page on each flush would leave none
+        if flushed:
+            await response_cache.invalidate(
+                "top", *(f"dataset:{dataset_id}" for dataset_id in flushed)
+            )
+        return len(flushed)
+
+    async def run(self):
+        """
+        Flushes every interval seconds until cancelled
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Cancelling mid flush would lose the deltas it took, the flush finishes on its own
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                logger.error(f"Vote flush failed: {e}")
+
+
+vote_buffer = VoteBuffer(config.VOTE_FLUSH_INTERVAL, config.VOTE_FLUSH_BATCH_SIZE)
+
+
+async def reconcile_votes() -> int:
+    """
+    Sets every dataset's votes to the sum of its vote rows and returns how many datasets changed.
+    Run it while no workers hold buffered deltas, they would be counted twice.
+    """
+    total = func.coalesce(
+        select(func.sum(Vote.value)).filter(Vote.dataset_id == Dataset.id).scalar_subquery(), 0
+    )
+    async with db.async_session() as session:
+        result = await session.execute(
+            update(Dataset).filter(Dataset.votes != total).values(votes=total)
+        )
+        await session.commit()
+    await response_cache.invalidate("datasets", "dataset:*")
+    return result.rowcount
@@ -0,0 +1,94 @@
+import os
+import time
+
+import pytest
+
+# Tests run against a throwaway database, they create, truncate and drop rows freely
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+JWT_SECRET = "test-secret-with-at-least-32-bytes!"
+
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.test")
+    os.environ.setdefault("SUPABASE_JWT_SECRET", JWT_SECRET)
+    os.environ.setdefault("AUTH_REMOTE_FALLBACK", "false")
+    os.environ.setdefault("CACHE_BACKEND", "memory")
+    os.environ.setdefault("PROBE_ON_WRITE", "false")
+    os.environ.setdefault("LOG_SINKS", '["stdout"]')
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+else:
+    # core connects to the database on import, nothing can be collected without one
+    collect_ignore_glob = ["test_*.py"]
+
+
+def pytest_report_header(config):
+    if not TEST_DATABASE_URL:
+        return "TEST_DATABASE_URL is not set, skipping all tests"
+
+
+@pytest.fixture
+def database():
+    """
+    Empties every table and the caches in front of them
+    """
+    from sqlalchemy import text
+
+    from api.v1.router.dataset import search_counts
+    from core import db, response_cache
+    from schema import Base
+    from services import forget_tag_ids
+
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    with db.engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+    response_cache.backend.entries.clear()
+    search_counts.clear()
+    forget_tag_ids()
+    return db
+
+
+@pytest.fixture
+def client(database):
+    """
+    Client of the app without its lifespan, so no vote flusher or job workers run in the background
+    """
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def auth_headers():
+    import jwt
+
+    from core import config
+
+    claims = {
+        "sub": "5b0c1d9e-8a3f-4c7e-9d12-6f4a2b8c0e13",
+        "aud": config.JWT_AUDIENCE,
+        "exp": int(time.time()) + 3600,
+    }
+    return {"Authorization": f"Bearer {jwt.encode(claims, config.SUPABASE_JWT_SECRET, algorithm='HS256')}"}
+
+
+@pytest.fixture
+def statements():
+    """
+    SQL statements the app runs while the test uses it, recorded from before_cursor_execute
+    like the request metrics
+    """
+    from sqlalchemy import event
+
+    from core import db
+
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+
+    event.listen(db.async_engine.sync_engine, "before_cursor_execute", record)
+    yield recorded
+    event.remove(db.async_engine.sync_engine, "before_cursor_execute", record)
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+from supabase import create_client
+
+from core import auth, config
+
+SECRET = "test-secret-with-at-least-32-bytes!"
+RSA_KID = "rsa-key"
+HMAC_KID = "hmac-key"
+
+rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def jwks() -> dict:
+    public = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(rsa_key.public_key()))
+    # A symmetric key published by mistake must not be usable to sign tokens
+    secret = json.loads(jwt.algorithms.HMACAlgorithm.to_jwk(SECRET.encode()))
+    return {
+        "keys": [
+            {**public, "kid": RSA_KID, "alg": "RS256", "use": "sig"},
+            {**secret, "kid": HMAC_KID, "alg": "HS256", "use": "sig"},
+        ]
+    }
+
+
+class AuthServer(BaseHTTPRequestHandler):
+    """
+    Stands in for Supabase Auth: serves the JWKS and answers /user for tokens in `users`
+    """
+
+    users = {}
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, code: int, body: dict):
+        content = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if self.path == "/auth/v1/.well-known/jwks.json":
+            return self.reply(200, jwks())
+        if self.path == "/auth/v1/user":
+            token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+            if token in self.users:
+                return self.reply(200, self.users[token])
+            return self.reply(401, {"code": 401, "msg": "invalid JWT"})
+        self.reply(404, {})
+
+
+@pytest.fixture(scope="module")
+def auth_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), AuthServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def local_keys(monkeypatch, auth_server):
+    monkeypatch.setattr(config, "SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setattr(config, "AUTH_REMOTE_FALLBACK", False)
+    monkeypatch.setattr(
+        auth, "jwks_client", jwt.PyJWKClient(f"{auth_server}/auth/v1/.well-known/jwks.json")
+    )
+    monkeypatch.setattr(auth, "supabase", create_client(auth_server, os.environ["SUPABASE_KEY"]))
+    auth.verified_tokens.clear()
+
+
+def claims(**overrides) -> dict:
+    return {
+        "sub": "5b0c1d9e-8a3f-4c7e-9d12-6f4a2b8c0e13",
+        "aud": config.JWT_AUDIENCE,
+        "exp": int(time.time()) + 3600,
+        "role": "authenticated",
+        **overrides,
+    }
+
+
+def verify(token: str) -> dict:
+    return asyncio.run(auth.verify_user(token))
+
+
+def assert_unauthorized(token: str):
+    with pytest.raises(HTTPException) as error:
+        verify(token)
+    assert error.value.status_code == 401
+
+
+def test_hs256_token_is_verified_with_the_secret():
+    token = jwt.encode(claims(), SECRET, algorithm="HS256")
+    assert verify(token)["sub"] == claims()["sub"]
+
+
+def test_rs256_token_is_verified_with_the_jwks():
+    token = jwt.encode(claims(), rsa_key, algorithm="RS256", headers={"kid": RSA_KID})
+    assert verify(token)["sub"] == claims()["sub"]
+
+
+def invalid_tokens() -> dict:
+    now = int(time.time())
+    return {
+        "wrong secret": jwt.encode(claims(), "another-secret-with-at-least-32-bytes", algorithm="HS256"),
+        "expired": jwt.encode(claims(exp=now - 60), SECRET, algorithm="HS256"),
+        "audience": jwt.encode(claims(aud="anon"), SECRET, algorithm="HS256"),
+        "no sub": jwt.encode({"aud": config.JWT_AUDIENCE, "exp": now + 60}, SECRET, algorithm="HS256"),
+        "garbage": "not-a-token",
+    }
+
+
+@pytest.mark.parametrize("case", invalid_tokens().keys())
+def test_invalid_tokens_are_rejected(case):
+    assert_unauthorized(invalid_tokens()[case])
+
+
+def test_hmac_algorithm_with_an_rsa_key_id_is_rejected():
+    # PyJWT raises TypeError when an RSA key is used for HMAC, which used to become a 500
+    token = jwt.encode(claims(), "anything", algorithm="HS384", headers={"kid": RSA_KID})
+    assert_unauthorized(token)
+
+
+def test_hmac_key_from_the_jwks_is_not_accepted():
+    token = jwt.encode(claims(), SECRET, algorithm="HS512", headers={"kid": HMAC_KID})
+    assert_unauthorized(token)
+
+
+def test_header_algorithm_must_match_the_key():
+    token = jwt.encode(claims(), rsa_key, algorithm="PS256", headers={"kid": RSA_KID})
+    assert_unauthorized(token)
+
+
+def test_unknown_key_is_rejected_without_remote_fallback():
+    token = jwt.encode(claims(), rsa_key, algorithm="RS256", headers={"kid": "rotated-away"})
+    assert_unauthorized(token)
+
+
+def test_unknown_key_falls_back_to_supabase(monkeypatch):
+    monkeypatch.setattr(config, "AUTH_REMOTE_FALLBACK", True)
+    token = jwt.encode(claims(), rsa_key, algorithm="RS256", headers={"kid": "rotated-away"})
+    monkeypatch.setitem(
+        AuthServer.users,
+        token,
+        {
+            "id": claims()["sub"],
+            "aud": config.JWT_AUDIENCE,
+            "role": "authenticated",
+            "email": "user@example.com",
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": "2025-01-01T00:00:00Z",
+        },
+    )
+    assert verify(token)["email"] == "user@example.com"
+
+    assert_unauthorized(
+        jwt.encode(claims(sub="someone-else"), rsa_key, algorithm="RS256", headers={"kid": "unknown"})
+    )
+
+
+def test_verified_claims_are_cached(monkeypatch):
+    token = jwt.encode(claims(), SECRET, algorithm="HS256")
+    verify(token)
+    # A secret rotated after the first check does not matter until the cache entry expires
+    monkeypatch.setattr(config, "SUPABASE_JWT_SECRET", "rotated-secret-with-at-least-32-bytes")
+    assert verify(token)["sub"] == claims()["sub"]
@@ -0,0 +1,193 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Request
+
+from core.cache import MemoryBackend, RedisBackend, ResponseCache
+from core.conditional import Version, Versioned
+
+fakeredis = pytest.importorskip("fakeredis")
+
+VERSION = Version.of("rows", last_modified=datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+
+def request(path: str = "/datasets", query: bytes = b"", **headers) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": query,
+            "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+            "route": SimpleNamespace(path=path),
+        }
+    )
+
+
+class Builds:
+    """
+    Build function counting its calls, each build returns a new body
+    """
+
+    def __init__(self, version: Version = None):
+        self.calls = 0
+        self.version = version
+
+    async def __call__(self):
+        self.calls += 1
+        content = {"build": self.calls}
+        return Versioned(content, self.version) if self.version else content
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        return lambda: MemoryBackend(maxsize=100, ttl=60)
+    # The fake is created inside the test's event loop
+    return lambda: RedisBackend(fakeredis.FakeAsyncRedis())
+
+
+def run(make_backend, test):
+    async def main():
+        return await test(ResponseCache(make_backend(), ttl=60))
+
+    return asyncio.run(main())
+
+
+def test_second_request_is_a_hit(backend):
+    async def test(cache):
+        build = Builds()
+        first = await cache.respond(request(), ["datasets"], build)
+        second = await cache.respond(request(), ["datasets"], build)
+        other_page = await cache.respond(request(query=b"page=2"), ["datasets"], build)
+        assert [first.headers["X-Cache"], second.headers["X-Cache"]] == ["MISS", "HIT"]
+        assert first.body == second.body == b'{"build":1}'
+        assert other_page.body == b'{"build":2}'
+        assert build.calls == 2
+
+    run(backend, test)
+
+
+def test_invalidate_drops_only_the_group(backend):
+    async def test(cache):
+        groups = {
+            "/datasets": ["datasets"],
+            "/datasets/1": ["dataset:1", "dataset:*"],
+            "/tags": ["tags"],
+        }
+        builds = {path: Builds() for path in groups}
+        for path, path_groups in groups.items():
+            await cache.respond(request(path), path_groups, builds[path])
+
+        await cache.invalidate("datasets")
+        statuses = {
+            path: (await cache.respond(request(path), path_groups, builds[path])).headers["X-Cache"]
+            for path, path_groups in groups.items()
+        }
+        assert statuses == {"/datasets": "MISS", "/datasets/1": "HIT", "/tags": "HIT"}
+
+        await cache.invalidate("dataset:*")
+        response = await cache.respond(request("/datasets/1"), groups["/datasets/1"], builds["/datasets/1"])
+        assert response.headers["X-Cache"] == "MISS"
+        assert response.body == b'{"build":2}'
+
+    run(backend, test)
+
+
+def test_redis_entries_expire_and_share_the_prefix():
+    async def test(cache):
+        await cache.respond(request(), ["datasets"], Builds())
+        await cache.invalidate("datasets")
+        keys = await cache.backend.client.keys("*")
+        assert keys and all(key.startswith(b"opendataghana:cache:") for key in keys)
+        for key in keys:
+            ttl = await cache.backend.client.ttl(key)
+            # Versions live on, entries expire
+            assert ttl == -1 if b"version:" in key else 0 < ttl <= 60
+
+    run(lambda: RedisBackend(fakeredis.FakeAsyncRedis()), test)
+
+
+def test_conditional_requests_get_304(backend):
+    async def test(cache):
+        build = Builds(VERSION)
+        response = await cache.respond(request(), ["datasets"], build)
+        assert response.headers["ETag"] == VERSION.etag
+        assert response.headers["Last-Modified"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+
+        # From the cached validators
+        cached = await cache.respond(request(if_none_match=VERSION.etag), ["datasets"], build)
+        assert cached.status_code == 304
+        assert cached.headers["ETag"] == VERSION.etag
+        since = await cache.respond(
+            request(if_modified_since="Wed, 01 Jan 2025 00:00:00 GMT"), ["datasets"], build
+        )
+        assert since.status_code == 304
+        changed = await cache.respond(request(if_none_match='"other"'), ["datasets"], build)
+        assert changed.status_code == 200
+
+        # From validate, without building the body
+        async def validate():
+            return VERSION
+
+        await cache.invalidate("datasets")
+        validated = await cache.respond(
+            request(if_none_match=f"W/{VERSION.etag}"), ["datasets"], build, validate
+        )
+        assert validated.status_code == 304
+        assert build.calls == 1
+
+    run(backend, test)
+
+
+def test_validate_only_runs_for_conditional_requests(backend):
+    async def test(cache):
+        validations = []
+
+        async def validate():
+            validations.append(1)
+            return VERSION
+
+        await cache.respond(request(), ["datasets"], Builds(VERSION), validate)
+        assert validations == []
+
+    run(backend, test)
+
+
+class BrokenBackend(MemoryBackend):
+    async def get_versions(self, keys):
+        raise ConnectionError("cache is down")
+
+    async def incr(self, key):
+        raise ConnectionError("cache is down")
+
+
+def test_broken_backend_serves_uncached():
+    async def test(cache):
+        build = Builds()
+        for _ in range(2):
+            response = await cache.respond(request(), ["datasets"], build)
+            assert response.status_code == 200
+        await cache.invalidate("datasets")
+        assert build.calls == 2
+
+    run(lambda: BrokenBackend(maxsize=100, ttl=60), test)
+
+
+def test_memory_versions_are_bounded_without_reviving_entries():
+    async def test(cache):
+        build = Builds()
+        await cache.respond(request(), ["datasets"], build)
+        await cache.invalidate("datasets")
+        # Enough other groups to evict the version of datasets
+        for index in range(10):
+            await cache.invalidate(f"dataset:{index}")
+        assert len(cache.backend.versions) <= 4
+
+        response = await cache.respond(request(), ["datasets"], build)
+        assert response.headers["X-Cache"] == "MISS"
+        assert response.body == b'{"build":2}'
+
+    run(lambda: MemoryBackend(maxsize=4, ttl=60), test)
@@ -0,0 +1,139 @@
+import json
+from datetime import timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+
+import pytest
+
+from core import config, response_cache
+
+IDENTITY = {"Accept-Encoding": "identity"}
+TAGS = [f"tag-{index:02d}" for index in range(12)]
+
+
+def dataset(index: int, **fields) -> dict:
+    return {
+        "name": f"dataset-{index}",
+        "description": "Rainfall by district",
+        "source": f"https://example.com/{index}.csv",
+        "license": "CC-BY-4.0",
+        "format": "csv",
+        **fields,
+    }
+
+
+@pytest.fixture
+def catalog(client, auth_headers) -> dict:
+    """
+    Datasets sharing a dozen tags, enough for the lists and a dataset with its tags to be compressed
+    """
+    records = [dataset(index, tags=TAGS) for index in range(10)]
+    response = client.post(
+        "/api/v1/dataset/bulk",
+        content="".join(json.dumps(record) + "\n" for record in records),
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.json()["errors"] == []
+    return {
+        "dataset_id": client.get("/api/v1/dataset/", params={"limit": 1}).json()["items"][0]["id"],
+        "tag_id": client.get("/api/v1/tag/").json()[0]["id"],
+    }
+
+
+def update_dataset(client, auth_headers, catalog):
+    response = client.patch(
+        f"/api/v1/dataset/{catalog['dataset_id']}",
+        json=dataset(0, description="Rainfall by district and month"),
+        headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+
+
+def update_tag(client, auth_headers, catalog):
+    response = client.put(f"/api/v1/tag/{catalog['tag_id']}", json={"name": "renamed"})
+    assert response.status_code == 200, response.text
+
+
+RESOURCES = {
+    "datasets": ("/api/v1/dataset/?limit=10", update_dataset),
+    "dataset": ("/api/v1/dataset/{dataset_id}", update_dataset),
+    "dataset with tags": ("/api/v1/dataset/{dataset_id}?include_tags=true", update_tag),
+    "tags": ("/api/v1/tag/", update_tag),
+    "tag": ("/api/v1/tag/{tag_id}", update_tag),
+}
+
+
+@pytest.fixture(params=RESOURCES, ids=str)
+def resource(request, client, auth_headers, catalog) -> tuple:
+    url, write = RESOURCES[request.param]
+    return url.format(**catalog), lambda: write(client, auth_headers, catalog)
+
+
+def get(client, url: str, **headers):
+    response = client.get(url, headers={**IDENTITY, **headers})
+    assert response.status_code in (200, 304), response.text
+    return response
+
+
+def test_if_none_match_is_304(client, resource):
+    url, _ = resource
+    etag = get(client, url).headers["ETag"]
+
+    response = get(client, url, **{"If-None-Match": etag})
+    assert (response.status_code, response.content) == (304, b"")
+    assert response.headers["ETag"] == etag
+    assert get(client, url, **{"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert get(client, url, **{"If-None-Match": '"other"'}).status_code == 200
+
+    # Without a cached response the validators come from the database
+    response_cache.backend.entries.clear()
+    response = get(client, url, **{"If-None-Match": etag})
+    assert (response.status_code, response.headers["ETag"]) == (304, etag)
+
+
+def test_writes_change_the_etag(client, resource):
+    url, write = resource
+    etag = get(client, url).headers["ETag"]
+
+    write()
+    response = get(client, url, **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert get(client, url, **{"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+def test_if_modified_since(client, resource):
+    url, _ = resource
+    last_modified = get(client, url).headers["Last-Modified"]
+    earlier = format_datetime(parsedate_to_datetime(last_modified) - timedelta(seconds=1), usegmt=True)
+
+    assert get(client, url, **{"If-Modified-Since": last_modified}).status_code == 304
+    assert get(client, url, **{"If-Modified-Since": earlier}).status_code == 200
+    # If-None-Match takes precedence
+    response = get(client, url, **{"If-Modified-Since": last_modified, "If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+    response_cache.backend.entries.clear()
+    assert get(client, url, **{"If-Modified-Since": last_modified}).status_code == 304
+    assert get(client, url, **{"If-Modified-Since": earlier}).status_code == 200
+
+
+@pytest.mark.parametrize("resource", ["datasets", "dataset with tags", "tags"], indirect=True)
+def test_compressed_responses_have_weak_etags(client, resource):
+    url, _ = resource
+    identity = get(client, url)
+    assert len(identity.content) >= config.COMPRESSION_MIN_SIZE
+    assert "Content-Encoding" not in identity.headers
+    etag = identity.headers["ETag"]
+    assert not etag.startswith("W/")
+
+    # Built and compressed on the first request, served compressed from the cache on the second
+    for _ in range(2):
+        response = get(client, url, **{"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["ETag"] == f"W/{etag}"
+        assert response.content == identity.content
+
+    # Either form of the ETag validates either representation
+    response = get(client, url, **{"Accept-Encoding": "gzip", "If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+    assert get(client, url, **{"If-None-Match": f"W/{etag}"}).status_code == 304
@@ -0,0 +1,59 @@
+import asyncio
+
+import httpx
+from sqlalchemy import func, select
+
+from core import db
+from schema import Counter, Dataset
+
+DATASETS = 60
+
+
+async def churn(app, headers: dict):
+    """
+    Creates datasets concurrently and deletes most of them while other creates are still running,
+    some of them twice at once
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+        async def create_and_delete(index: int):
+            response = await client.post(
+                "/api/v1/dataset/",
+                json={
+                    "name": f"dataset-{index}",
+                    "description": "Rainfall by district",
+                    "source": f"https://example.com/{index}.csv",
+                    "license": "CC-BY-4.0",
+                    "format": "csv",
+                },
+                headers=headers,
+            )
+            assert response.status_code == 200, response.text
+            dataset_id = response.json()["id"]
+            if index % 3 == 0:
+                return
+            deletes = 2 if index % 3 == 1 else 1
+            responses = await asyncio.gather(
+                *(client.delete(f"/api/v1/dataset/{dataset_id}") for _ in range(deletes))
+            )
+            # Only one of the deletes of the same dataset may count, the other finds it gone
+            assert sorted(response.status_code for response in responses) == [200, 404][:deletes]
+
+        await asyncio.gather(*(create_and_delete(index) for index in range(DATASETS)))
+
+
+async def counts() -> tuple:
+    async with db.async_session() as session:
+        total = await Counter.total(session, "active_datasets_count")
+        active = await session.scalar(
+            select(func.count()).select_from(Dataset).filter(Dataset.deleted_at == None)
+        )
+    return total, active
+
+
+def test_active_count_survives_concurrent_creates_and_deletes(client, auth_headers):
+    asyncio.run(churn(client.app, auth_headers))
+    total, active = asyncio.run(counts())
+    assert active == DATASETS // 3
+    assert total == active
@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import text
+
+from benchmarks import seed
+from benchmarks.explain import explain, hot_queries
+from core import db
+
+QUERIES = hot_queries()
+# Enough rows that the planner weighs the indexes against each other rather than against an empty table
+DATASETS = 2000
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    if db.engine.dialect.name != "postgresql":
+        pytest.skip(f"EXPLAIN checks need Postgres, the test database is {db.engine.dialect.name}")
+    seed.seed(DATASETS)
+
+
+@pytest.fixture
+def connection(seeded):
+    """
+    Connection planning like benchmarks.explain: fresh statistics of the seeded rows and sequential
+    scans disabled
+    """
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql("ANALYZE datasets, dataset_tags")
+        connection.exec_driver_sql("SET enable_seqscan = off")
+        yield connection
+        connection.rollback()
+
+
+def has_trigram_ops(connection) -> bool:
+    return bool(
+        connection.scalar(text("SELECT count(*) FROM pg_opclass WHERE opcname = 'gin_trgm_ops'"))
+    )
+
+
+@pytest.mark.parametrize("name, statement, indexes", QUERIES, ids=[name for name, _, _ in QUERIES])
+def test_hot_query_uses_its_index(connection, name, statement, indexes):
+    if all(index.endswith("_trgm") for index in indexes) and not has_trigram_ops(connection):
+        pytest.skip("pg_trgm is not installed")
+    plan = explain(connection, statement)
+    assert any(index in plan for index in indexes), plan
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import httpx
+from sqlalchemy import func, select
+
+from core import db
+from schema import Dataset, DatasetTag, Tag
+
+LICENSES = ["CC-BY-4.0", "CC0-1.0", "ODbL-1.0"]
+FORMATS = ["csv", "json", "parquet"]
+
+
+def dataset(index: int, **fields) -> dict:
+    return {
+        "name": f"dataset-{index}",
+        "description": "Rainfall by district",
+        "source": f"https://example.com/{index}.csv",
+        "license": LICENSES[index % len(LICENSES)],
+        "format": FORMATS[index % len(FORMATS)],
+        **fields,
+    }
+
+
+def ndjson(records: list) -> bytes:
+    return b"".join(json.dumps(record).encode() + b"\n" for record in records)
+
+
+def recount() -> dict:
+    """
+    Facets of the active datasets counted with GROUP BY, the way rebuild-facets does
+    """
+    active = Dataset.deleted_at == None
+    facets = {}
+    with db.engine.connect() as connection:
+        for facet in ("license", "format"):
+            column = getattr(Dataset, facet)
+            facets[facet] = dict(
+                connection.execute(select(column, func.count()).filter(active).group_by(column)).all()
+            )
+        facets["tags"] = dict(
+            connection.execute(
+                select(Tag.name, func.count())
+                .select_from(DatasetTag)
+                .join(Dataset, Dataset.id == DatasetTag.dataset_id)
+                .join(Tag, Tag.id == DatasetTag.tag_id)
+                .filter(active, Tag.deleted_at == None)
+                .group_by(Tag.name)
+            ).all()
+        )
+    return facets
+
+
+def facets(client) -> dict:
+    response = client.get("/api/v1/dataset/facets", params={"limit": 1000})
+    assert response.status_code == 200, response.text
+    return {
+        facet: {item["value"]: item["count"] for item in items}
+        for facet, items in response.json().items()
+    }
+
+
+async def churn(app, headers: dict, existing: list):
+    """
+    Creates and deletes datasets while imports relicense and retag the existing ones, two at a time,
+    and add datasets of their own
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+        async def create_and_delete(index: int):
+            response = await client.post("/api/v1/dataset/", json=dataset(index), headers=headers)
+            assert response.status_code == 200, response.text
+            if index % 2:
+                response = await client.delete(f"/api/v1/dataset/{response.json()['id']}")
+                assert response.status_code == 200, response.text
+
+        async def bulk_import(license: str, first: int):
+            records = [
+                *(dataset(index, license=license, tags=[license, "all"]) for index in range(10)),
+                *(dataset(index, tags=[f"tag-{index % 4}", "all"]) for index in range(first, first + 10)),
+            ]
+            response = await client.post(
+                "/api/v1/dataset/bulk",
+                content=ndjson(records),
+                headers={**headers, "Content-Type": "application/x-ndjson"},
+            )
+            assert response.status_code == 200, response.text
+            assert response.json()["errors"] == []
+
+        async def delete(dataset_id: str):
+            response = await client.delete(f"/api/v1/dataset/{dataset_id}")
+            assert response.status_code == 200, response.text
+
+        await asyncio.gather(
+            *(create_and_delete(index) for index in range(100, 130)),
+            bulk_import("MIT", 200),
+            bulk_import("Apache-2.0", 300),
+            *(delete(dataset_id) for dataset_id in existing[8:]),
+        )
+
+
+def test_facets_match_a_recount_after_creates_imports_and_deletes(client, auth_headers):
+    existing = [
+        client.post("/api/v1/dataset/", json=dataset(index), headers=auth_headers).json()["id"]
+        for index in range(12)
+    ]
+    assert facets(client) == recount()
+
+    asyncio.run(churn(client.app, auth_headers, existing))
+    expected = recount()
+    assert expected["tags"]["all"] > 0
+    assert facets(client) == expected
+
+    # Deleting a tagged dataset takes it out of every facet
+    assert client.delete(f"/api/v1/dataset/{existing[0]}").status_code == 200
+    expected = recount()
+    assert facets(client) == expected
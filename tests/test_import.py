@@ -0,0 +1,199 @@
+import asyncio
+import json
+import sys
+
+import pytest
+from sqlalchemy import select
+
+import cli
+from schema import Dataset, DatasetTag, Tag
+from services import import_datasets, parse_csv, parse_ndjson, read_lines
+
+CSV_HEADER = b"name,description,source,license,format,tags\n"
+
+
+def dataset(index: int, **fields) -> dict:
+    return {
+        "name": f"dataset-{index}",
+        "description": "Rainfall by district",
+        "source": f"https://example.com/{index}.csv",
+        "license": "CC-BY-4.0",
+        "format": "csv",
+        **fields,
+    }
+
+
+def ndjson(*records) -> bytes:
+    return b"".join(
+        (record if isinstance(record, bytes) else json.dumps(record).encode()) + b"\n"
+        for record in records
+    )
+
+
+def csv_row(index: int, **fields) -> bytes:
+    record = dataset(index, tags="", **fields)
+    columns = ("name", "description", "source", "license", "format", "tags")
+    return ",".join(record[column] for column in columns).encode() + b"\n"
+
+
+async def chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def run_import(data: bytes, parse=parse_ndjson, batch_size: int = 1000, chunk_size: int = 1 << 16):
+    return asyncio.run(import_datasets(parse(read_lines(chunks(data, chunk_size))), batch_size=batch_size))
+
+
+def stored(database) -> dict:
+    with database.engine.connect() as connection:
+        rows = connection.execute(select(Dataset.name, Dataset.description, Dataset.license))
+        return {name: (description, license) for name, description, license in rows}
+
+
+def test_read_lines_splits_chunks_on_newlines():
+    data = "name\r\nAccra\nKɔforidua\n\nlast".encode()
+
+    async def lines(size):
+        return [line async for line in read_lines(chunks(data, size))]
+
+    # A chunk size of 1 also splits the two bytes of ɔ
+    for size in (1, 3, 1 << 16):
+        assert asyncio.run(lines(size)) == ["name", "Accra", "Kɔforidua", "", "last"]
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 1000])
+def test_import_inserts_then_updates_by_name(database, batch_size):
+    result = run_import(ndjson(*(dataset(index) for index in range(5))), batch_size=batch_size)
+    assert (result.inserted, result.updated, result.errors) == (5, 0, [])
+
+    result = run_import(ndjson(dataset(0, license="MIT"), dataset(5)), batch_size=batch_size)
+    assert (result.inserted, result.updated, result.errors) == (1, 1, [])
+    datasets = stored(database)
+    assert len(datasets) == 6
+    assert datasets["dataset-0"] == ("Rainfall by district", "MIT")
+
+
+def test_import_attaches_tags(database):
+    result = run_import(ndjson(dataset(0, tags=["rain", "weather"]), dataset(1, tags=["rain"])))
+    assert result.errors == []
+    with database.engine.connect() as connection:
+        links = connection.execute(
+            select(Dataset.name, Tag.name)
+            .join(DatasetTag, DatasetTag.dataset_id == Dataset.id)
+            .join(Tag, Tag.id == DatasetTag.tag_id)
+            .order_by(Dataset.name, Tag.name)
+        ).all()
+    assert [tuple(link) for link in links] == [
+        ("dataset-0", "rain"),
+        ("dataset-0", "weather"),
+        ("dataset-1", "rain"),
+    ]
+
+
+def test_bad_rows_are_reported_without_failing_the_import(database):
+    data = ndjson(
+        dataset(0),
+        b"{not json",
+        b"[1, 2]",
+        dataset(1, license=None),
+        dataset(2, tags="rain"),
+        dataset(3),
+    )
+    result = run_import(data, batch_size=2)
+    assert (result.inserted, result.updated) == (2, 0)
+    assert [error["row"] for error in result.errors] == [2, 3, 4, 5]
+    assert "license" in result.errors[2]["error"]
+    assert result.errors[3]["error"] == "tags must be a list of tag names"
+    assert set(stored(database)) == {"dataset-0", "dataset-3"}
+
+
+def test_lines_that_are_not_utf8_are_bad_rows(database):
+    data = ndjson(dataset(0), b'{"name": "Accra \xff"}', dataset(1))
+    # Chunks of one byte split the bad line across reads
+    result = run_import(data, chunk_size=1)
+    assert (result.inserted, result.updated) == (2, 0)
+    assert [error["row"] for error in result.errors] == [2]
+    assert "can't decode byte 0xff" in result.errors[0]["error"]
+
+
+@pytest.mark.parametrize("batch_size", [2, 1000])
+def test_duplicate_names_are_reported(database, batch_size):
+    data = ndjson(
+        dataset(0, description="first"),
+        dataset(0, description="second"),
+        dataset(1),
+        dataset(0, description="third"),
+    )
+    result = run_import(data, batch_size=batch_size)
+    # The last row of a name wins within a batch, the rows it replaces are reported
+    assert stored(database)["dataset-0"] == ("third", "CC-BY-4.0")
+    if batch_size == 2:
+        assert (result.inserted, result.updated) == (2, 1)
+        assert result.errors == [{"row": 1, "error": "Duplicate name dataset-0, replaced by row 2"}]
+    else:
+        assert (result.inserted, result.updated) == (2, 0)
+        assert result.errors == [
+            {"row": 1, "error": "Duplicate name dataset-0, replaced by row 2"},
+            {"row": 2, "error": "Duplicate name dataset-0, replaced by row 4"},
+        ]
+
+
+def test_csv_import(database):
+    data = (
+        CSV_HEADER
+        + csv_row(0)
+        + b'dataset-1,"Rainfall\nby ""district""",https://example.com/1.csv,CC-BY-4.0,csv,rain; weather\n'
+        + b"dataset-2,too,few\n"
+        + csv_row(3)
+        + csv_row(4)
+    )
+    result = run_import(data, parse=parse_csv)
+    assert (result.inserted, result.updated) == (4, 0)
+    assert [error["row"] for error in result.errors] == [3]
+    assert result.errors[0]["error"] == "Expected 6 columns, got 3"
+    assert stored(database)["dataset-1"] == ('Rainfall\nby "district"', "CC-BY-4.0")
+
+
+def test_csv_rows_that_are_not_utf8_are_bad_rows(database):
+    data = CSV_HEADER + csv_row(0) + b"dataset-1,Accra \xff,x,y,z,\n" + csv_row(2)
+    result = run_import(data, parse=parse_csv)
+    assert (result.inserted, result.updated) == (2, 0)
+    assert [error["row"] for error in result.errors] == [2]
+    assert set(stored(database)) == {"dataset-0", "dataset-2"}
+
+
+def test_csv_header_that_is_not_utf8_fails_the_import(database):
+    result = run_import(b"name,\xff\n" + csv_row(0), parse=parse_csv)
+    assert (result.inserted, result.updated) == (0, 0)
+    assert [error["row"] for error in result.errors] == [0]
+    assert stored(database) == {}
+
+
+def run_cli(monkeypatch, capsys, *args) -> dict:
+    monkeypatch.setattr(sys, "argv", ["cli.py", *args])
+    cli.main()
+    return json.loads(capsys.readouterr().out)
+
+
+def test_cli_imports_files(database, monkeypatch, capsys, tmp_path):
+    path = tmp_path / "datasets.ndjson"
+    path.write_bytes(ndjson(*(dataset(index) for index in range(3)), b"{not json"))
+    result = run_cli(monkeypatch, capsys, "import-datasets", str(path), "--batch-size", "2")
+    assert (result["inserted"], result["updated"]) == (3, 0)
+    assert [error["row"] for error in result["errors"]] == [4]
+
+    # The format follows the extension unless given
+    path = tmp_path / "datasets.csv"
+    path.write_bytes(CSV_HEADER + csv_row(0, license="MIT") + csv_row(3))
+    assert run_cli(monkeypatch, capsys, "import-datasets", str(path)) == {
+        "inserted": 1,
+        "updated": 1,
+        "errors": [],
+    }
+    path = tmp_path / "datasets.txt"
+    path.write_bytes(CSV_HEADER + csv_row(4))
+    result = run_cli(monkeypatch, capsys, "import-datasets", str(path), "--format", "csv")
+    assert (result["inserted"], result["errors"]) == (1, [])
+    assert stored(database)["dataset-0"] == ("Rainfall by district", "MIT")
+    assert len(stored(database)) == 5
@@ -0,0 +1,247 @@
+import asyncio
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from schema import Job
+from services import jobs
+from services.jobs import JobQueue, JobQueueFull, JobStatus, utcnow
+
+
+def make_queue(persist: bool = False, **options) -> JobQueue:
+    settings = {
+        "workers": 2,
+        "size": 10,
+        "max_attempts": 3,
+        "timeout": 5,
+        "backoff": 0.01,
+        "backoff_max": 0.05,
+        "status_ttl": 60,
+        "persist": persist,
+    }
+    return JobQueue(**{**settings, **options})
+
+
+async def finish(queue: JobQueue, *job_ids, timeout: float = 5) -> JobStatus:
+    """
+    Runs the queue's workers until all the jobs succeeded or failed, and returns the status of the last.
+    Workers are only stopped once none of the jobs can be mid attempt.
+    """
+    runner = asyncio.create_task(queue.run())
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            jobs = [await queue.status(job_id) for job_id in job_ids]
+            if all(job is not None and job.status in ("succeeded", "failed") for job in jobs):
+                return jobs[-1]
+            await asyncio.sleep(0.01)
+        raise AssertionError(f"Jobs did not finish: {jobs}")
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+
+
+def test_failed_attempts_are_retried():
+    calls = []
+
+    async def test():
+        queue = make_queue()
+
+        @queue.register("flaky")
+        async def flaky(value: int):
+            calls.append(value)
+            if len(calls) < 3:
+                raise ConnectionError("smtp is down")
+            return value * 2
+
+        job = await queue.enqueue("flaky", value=21)
+        return await finish(queue, job.id)
+
+    job = asyncio.run(test())
+    assert (job.status, job.attempts, job.result, job.error) == ("succeeded", 3, 42, None)
+    assert calls == [21, 21, 21]
+
+
+def test_jobs_fail_after_max_attempts():
+    async def test():
+        queue = make_queue(max_attempts=2)
+
+        @queue.register("broken")
+        def broken():
+            raise ValueError("bad address")
+
+        job = await queue.enqueue("broken")
+        return await finish(queue, job.id)
+
+    job = asyncio.run(test())
+    assert (job.status, job.attempts, job.error) == ("failed", 2, "ValueError: bad address")
+
+
+@pytest.mark.parametrize("attempts", [1, 2, 3, 10])
+def test_backoff_doubles_up_to_the_maximum(attempts):
+    queue = make_queue(backoff=1, backoff_max=5)
+    expected = min(2 ** (attempts - 1), 5)
+    for _ in range(20):
+        assert expected / 2 <= queue.backoff_delay(attempts) <= expected
+
+
+def test_attempts_time_out():
+    async def test():
+        queue = make_queue(max_attempts=1)
+
+        @queue.register("slow", timeout=0.05)
+        async def slow():
+            await asyncio.sleep(10)
+
+        job = await queue.enqueue("slow")
+        return await finish(queue, job.id)
+
+    job = asyncio.run(test())
+    assert (job.status, job.error) == ("failed", "Timed out after 0.05s")
+
+
+def test_plain_functions_run_on_the_thread_pool():
+    async def test():
+        queue = make_queue()
+
+        @queue.register("thread")
+        def thread():
+            return threading.current_thread() is threading.main_thread()
+
+        job = await queue.enqueue("thread")
+        return await finish(queue, job.id)
+
+    assert asyncio.run(test()).result is False
+
+
+def test_enqueue_refuses_unknown_jobs_and_a_full_queue():
+    async def test():
+        queue = make_queue(size=1)
+        queue.register("noop")(lambda: None)
+        with pytest.raises(ValueError):
+            await queue.enqueue("missing")
+        await queue.enqueue("noop")
+        with pytest.raises(JobQueueFull):
+            await queue.enqueue("noop")
+
+    asyncio.run(test())
+
+
+def insert_job(database, **values) -> Job:
+    with Session(database.engine, expire_on_commit=False) as session:
+        job = Job(name="noop", payload={}, **values)
+        session.add(job)
+        session.commit()
+        return job
+
+
+def test_claim_hands_a_job_to_one_worker(database):
+    async def test():
+        # Two processes sharing the jobs table, each with workers racing for the job
+        queues = [make_queue(persist=True), make_queue(persist=True)]
+        for queue in queues:
+            queue.register("noop")(lambda: None)
+        job = await queues[0].enqueue("noop")
+        claims = await asyncio.gather(
+            *(queue.claim(JobStatus(id=job.id, name=job.name)) for queue in queues for _ in range(4))
+        )
+        return job, claims
+
+    job, claims = asyncio.run(test())
+    assert claims.count(True) == 1
+    with database.engine.connect() as connection:
+        row = connection.execute(
+            select(Job.status, Job.attempts).filter(Job.id == job.id)
+        ).one()
+    assert tuple(row) == ("running", 1)
+
+
+def test_persisted_jobs_run_once_across_processes(database):
+    calls = []
+
+    async def test():
+        queues = [make_queue(persist=True), make_queue(persist=True)]
+        for queue in queues:
+            queue.register("count")(lambda: calls.append(1) or len(calls))
+        # Reads the jobs table, the queues only know their own attempts
+        observer = make_queue(persist=True)
+        job = await queues[0].enqueue("count")
+        # The second process finds the job while recovering, as if it had started meanwhile
+        await queues[1].recover()
+        runners = [asyncio.create_task(queue.run()) for queue in queues]
+        try:
+            for _ in range(100):
+                if (await observer.status(job.id)).status == "succeeded":
+                    break
+                await asyncio.sleep(0.02)
+            # Give the other worker the chance to run it a second time
+            await asyncio.sleep(0.1)
+        finally:
+            for runner in runners:
+                runner.cancel()
+            await asyncio.gather(*runners, return_exceptions=True)
+        return await observer.status(job.id)
+
+    job = asyncio.run(test())
+    assert (job.status, job.attempts, job.result) == ("succeeded", 1, 1)
+    assert calls == [1]
+
+
+def test_recover_requeues_interrupted_jobs(database):
+    now = utcnow()
+    stuck = insert_job(database, status="running", attempts=1, updated_at=now - timedelta(hours=1))
+    running = insert_job(database, status="running", attempts=1, updated_at=now)
+    waiting = insert_job(database, status="queued", attempts=1, run_after=now + timedelta(seconds=0.2))
+    finished = insert_job(database, status="succeeded", attempts=1)
+    orphan = insert_job(database, status="queued")
+    with database.engine.begin() as connection:
+        connection.execute(Job.__table__.update().filter(Job.id == orphan.id).values(name="removed"))
+
+    async def test():
+        queue = make_queue(persist=True, timeout=60)
+        queue.register("noop")(lambda: "done")
+        recovered = await queue.recover()
+        # One run for both, the waiting job may start while stuck is finishing
+        await finish(queue, stuck.id, waiting.id)
+        statuses = {}
+        for job in (stuck, waiting, running, finished, orphan):
+            statuses[job.id] = await queue.status(job.id)
+        return recovered, statuses
+
+    recovered, statuses = asyncio.run(test())
+    assert recovered == 2
+    assert (statuses[stuck.id].status, statuses[stuck.id].attempts) == ("succeeded", 2)
+    assert (statuses[waiting.id].status, statuses[waiting.id].attempts) == ("succeeded", 2)
+    # Still within the timeout of its attempt, the process running it may be alive
+    assert statuses[running.id].status == "running"
+    assert statuses[finished.id].status == "succeeded"
+    assert statuses[orphan.id].status == "queued"
+
+
+def test_resend_verification_is_queued(client):
+    response = client.get("/api/v1/user/resend-verification", params={"email": "someone@example.com"})
+    assert response.status_code == 202
+    job_id = response.json()["details"]["job_id"]
+
+    job = client.get(f"/api/v1/job/{job_id}")
+    assert job.status_code == 200
+    assert job.json()["name"] == "resend_verification"
+    assert job.json()["status"] == "queued"
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/api/v1/job/00000000-0000-4000-8000-000000000000").status_code == 404
+    assert client.get("/api/v1/job/not-a-uuid").status_code == 422
+
+
+def test_full_queue_is_503(client, monkeypatch):
+    async def full(name, **payload):
+        raise JobQueueFull(1)
+
+    monkeypatch.setattr(jobs.job_queue, "enqueue", full)
+    response = client.get("/api/v1/user/resend-verification", params={"email": "someone@example.com"})
+    assert response.status_code == 503
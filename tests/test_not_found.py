@@ -0,0 +1,52 @@
+import uuid
+
+import pytest
+
+MISSING = str(uuid.uuid4())
+
+
+@pytest.fixture
+def dataset(client, auth_headers) -> dict:
+    return client.post(
+        "/api/v1/dataset/",
+        json={
+            "name": "rainfall",
+            "description": "Rainfall by district",
+            "source": "https://example.com/rainfall.csv",
+            "license": "CC-BY-4.0",
+            "format": "csv",
+        },
+        headers=auth_headers,
+    ).json()
+
+
+@pytest.fixture
+def tag(client) -> dict:
+    return client.post("/api/v1/tag/", json={"name": "climate"}).json()
+
+
+@pytest.mark.parametrize(
+    "method, url, detail",
+    [
+        ("PATCH", f"/api/v1/dataset/add_tag/{MISSING}/{{tag}}", "Dataset not found"),
+        ("PATCH", "/api/v1/dataset/add_tag/{dataset}/" + MISSING, "Tag not found"),
+        ("PATCH", f"/api/v1/dataset/remove_tag/{MISSING}/{{tag}}", "Dataset not found"),
+        ("PATCH", "/api/v1/dataset/remove_tag/{dataset}/" + MISSING, "Tag not found"),
+        ("PATCH", f"/api/v1/dataset/{MISSING}", "Dataset not found"),
+        ("PUT", f"/api/v1/dataset/upvote/{MISSING}", "Dataset not found"),
+        ("DELETE", f"/api/v1/dataset/vote/{MISSING}", "Dataset not found"),
+        ("DELETE", f"/api/v1/dataset/{MISSING}", "Not Found"),
+        ("GET", f"/api/v1/dataset/{MISSING}", "Dataset not found"),
+    ],
+)
+def test_missing_rows_are_404(client, auth_headers, dataset, tag, method, url, detail):
+    url = url.format(dataset=dataset["id"], tag=tag["id"])
+    response = client.request(method, url, json={"name": "renamed"}, headers=auth_headers)
+    assert response.status_code == 404, response.text
+    assert response.json()["detail"] == detail
+
+
+def test_deleted_dataset_is_404(client, dataset):
+    assert client.delete(f"/api/v1/dataset/{dataset['id']}").status_code == 200
+    assert client.delete(f"/api/v1/dataset/{dataset['id']}").status_code == 404
+    assert client.get(f"/api/v1/dataset/{dataset['id']}").status_code == 404
@@ -0,0 +1,104 @@
+import json
+from base64 import urlsafe_b64encode
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, update
+
+from schema import Dataset
+
+
+def cursor_of(payload) -> str:
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.fixture
+def dataset_ids(client, auth_headers, database) -> list:
+    """
+    Datasets in their page order, most of them sharing a created_at with others
+    """
+    for index in range(23):
+        response = client.post(
+            "/api/v1/dataset/",
+            json={
+                "name": f"dataset-{index}",
+                "description": "Rainfall by district",
+                "source": f"https://example.com/{index}.csv",
+                "license": "CC-BY-4.0",
+                "format": "csv",
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == 200, response.text
+
+    with database.engine.begin() as connection:
+        ids = connection.scalars(select(Dataset.id).order_by(Dataset.name)).all()
+        # Groups of 1, 2, 4 and 8 datasets share a created_at, so pages end within ties
+        for group, created_at in enumerate((1, 2, 4, 8)):
+            connection.execute(
+                update(Dataset)
+                .filter(Dataset.id.in_(ids[group * 5 : group * 5 + created_at]))
+                .values(created_at=datetime(2024, 1, created_at))
+            )
+        return [
+            str(dataset_id)
+            for dataset_id in connection.scalars(
+                select(Dataset.id).order_by(Dataset.created_at, Dataset.id)
+            )
+        ]
+
+
+@pytest.mark.parametrize("path", ["/api/v1/dataset/", "/api/v1/dataset/search"])
+@pytest.mark.parametrize("limit", [1, 3, 7, 23, 100])
+def test_cursors_walk_every_dataset_once(client, dataset_ids, path, limit):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": limit, "fields": "id,name"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(path, params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page["items"]) <= limit
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+        assert len(page["items"]) == limit
+
+    assert seen == dataset_ids
+
+
+def test_cursor_skips_deleted_datasets(client, dataset_ids):
+    page = client.get("/api/v1/dataset/", params={"limit": 5}).json()
+    # The row the cursor points at is gone by the time the next page is read
+    assert client.delete(f"/api/v1/dataset/{dataset_ids[4]}").status_code == 200
+    assert client.delete(f"/api/v1/dataset/{dataset_ids[5]}").status_code == 200
+    following = client.get("/api/v1/dataset/", params={"limit": 5, "cursor": page["next_cursor"]}).json()
+    assert [item["id"] for item in following["items"]] == dataset_ids[6:11]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "!!!",
+        "abc",
+        "é",
+        cursor_of([1, 2]),
+        cursor_of({"created_at": "2024-01-01"}),
+        cursor_of(["2024-01-01T00:00:00", "not-a-uuid"]),
+        cursor_of(["yesterday", "5b0c1d9e-8a3f-4c7e-9d12-6f4a2b8c0e13"]),
+        cursor_of(["2024-01-01T00:00:00"]),
+    ],
+)
+@pytest.mark.parametrize("path", ["/api/v1/dataset/", "/api/v1/dataset/search"])
+def test_malformed_cursors_are_400(client, path, cursor):
+    response = client.get(path, params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+def test_cursor_is_refused_with_relevance_ranking(client, dataset_ids):
+    page = client.get("/api/v1/dataset/", params={"limit": 5}).json()
+    response = client.get("/api/v1/dataset/search", params={"q": "rainfall", "cursor": page["next_cursor"]})
+    assert response.status_code == 400
@@ -0,0 +1,332 @@
+import asyncio
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from core import config
+from services import dataset_probe
+from services.dataset_probe import (
+    DelimitedCounter,
+    JsonCounter,
+    LineCounter,
+    ProbeError,
+    measure,
+    open_http,
+    open_local,
+    parquet_counts,
+    probe_source,
+    public_address,
+    send_checked,
+)
+
+CSV = b'id,name,notes\n1,Accra,"first line\nsecond line"\n2,Kumasi,"a ""quoted"" word"\n3,Tamale,plain\n'
+NDJSON = b'{"id": 1, "name": "Accra"}\n{"id": 2, "name": "Kumasi"}\n{"id": 3, "name": "Tamale"}\n'
+JSON = (
+    b'[{"id": 1, "name": "Accra, \\"the capital\\"", "tags": ["a", "b"]},'
+    b' {"id": 2, "name": "[Kumasi]", "tags": []}, {"id": 3, "name": "Tamale\\\\", "tags": [{}]}]'
+)
+
+
+def count(counter_class, data: bytes, chunk_size: int) -> tuple:
+    counter = counter_class(data[: dataset_probe.SNIFF_SIZE])
+    for start in range(0, len(data), chunk_size):
+        counter.feed(data[start : start + chunk_size])
+    return counter.counts()
+
+
+# A chunk size of 1 splits every quote, escape and newline from what follows it
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+@pytest.mark.parametrize(
+    "counter_class, data, expected",
+    [
+        (DelimitedCounter, CSV, (3, 3)),
+        # A last record without its newline
+        (DelimitedCounter, CSV.rstrip(b"\n"), (3, 3)),
+        (DelimitedCounter, b"\xef\xbb\xbfa;b\n1;2\n", (1, 2)),
+        (DelimitedCounter, b"a,b\n", (0, 2)),
+        (LineCounter, NDJSON, (3, 2)),
+        (LineCounter, NDJSON.rstrip(b"\n"), (3, 2)),
+        (JsonCounter, JSON, (3, 3)),
+        (JsonCounter, b"[1, 2.5, null, true]", (4, None)),
+        (JsonCounter, b"[]", (0, None)),
+        (JsonCounter, b'{"rows": [1, 2]}', (None, None)),
+    ],
+)
+def test_counters(counter_class, data, expected, chunk_size):
+    assert count(counter_class, data, chunk_size) == expected
+
+
+@pytest.mark.parametrize(
+    "sample, format",
+    [(CSV, "csv"), (NDJSON, "ndjson"), (JSON, "json"), (b"<html>", "markup"), (b"PAR1", "parquet")],
+)
+def test_sniff(sample, format):
+    assert dataset_probe.sniff(sample) == format
+
+
+def write_parquet(path, rows: int):
+    import pyarrow
+    import pyarrow.parquet
+
+    table = pyarrow.table({"id": list(range(rows)), "name": [f"row-{i}" for i in range(rows)]})
+    pyarrow.parquet.write_table(table, path)
+
+
+@pytest.fixture
+def local_root(monkeypatch, tmp_path):
+    root = tmp_path / "sources"
+    root.mkdir()
+    monkeypatch.setattr(config, "PROBE_LOCAL_ROOT", str(root))
+    return root
+
+
+def test_parquet_counts_read_only_the_footer(local_root):
+    pytest.importorskip("pyarrow")
+    path = local_root / "rows.parquet"
+    write_parquet(path, 5000)
+    reads = []
+
+    async def run():
+        async with open_local(str(path)) as opened:
+            read_tail = opened.read_tail
+
+            async def recorded(length: int) -> bytes:
+                reads.append(length)
+                return await read_tail(length)
+
+            opened.read_tail = recorded
+            return await parquet_counts(opened)
+
+    assert asyncio.run(run()) == (5000, 2)
+    assert reads == [dataset_probe.PARQUET_TAIL_SIZE]
+
+
+def test_probe_source_measures_local_files(local_root):
+    (local_root / "rows.csv").write_bytes(CSV)
+    (local_root / "rows.ndjson").write_bytes(NDJSON)
+    csv_path = str(local_root / "rows.csv")
+    assert asyncio.run(probe_source(None, csv_path, 1 << 20)) == (len(CSV), 3, 3)
+    assert asyncio.run(probe_source(None, f"file://{csv_path}", 1 << 20)) == (len(CSV), 3, 3)
+    ndjson_path = str(local_root / "rows.ndjson")
+    assert asyncio.run(probe_source(None, ndjson_path, 1 << 20)) == (len(NDJSON), 3, 2)
+
+
+def test_probe_source_stops_counting_at_max_bytes(local_root):
+    rows = b"".join(b"%d,Accra,plain\n" % index for index in range(5000))
+    path = local_root / "rows.csv"
+    path.write_bytes(b"id,name,notes\n" + rows)
+    size = path.stat().st_size
+    assert asyncio.run(probe_source(None, str(path), size)) == (size, 5000, 3)
+    # Too large to count, the size and columns are still known
+    assert asyncio.run(probe_source(None, str(path), size - 1)) == (size, None, 3)
+
+
+def test_probe_source_rejects_files_outside_the_root(local_root, tmp_path):
+    outside = tmp_path / "secret.csv"
+    outside.write_bytes(CSV)
+    (local_root / "link.csv").symlink_to(outside)
+    for source in (
+        str(outside),
+        f"file://{outside}",
+        str(local_root / ".." / "secret.csv"),
+        str(local_root / "link.csv"),
+        "sources/rows.csv",
+    ):
+        with pytest.raises(ProbeError):
+            asyncio.run(probe_source(None, source, 1 << 20))
+
+
+def test_local_files_are_not_read_without_a_root(monkeypatch, local_root):
+    (local_root / "rows.csv").write_bytes(CSV)
+    monkeypatch.setattr(config, "PROBE_LOCAL_ROOT", None)
+    with pytest.raises(ProbeError):
+        asyncio.run(probe_source(None, str(local_root / "rows.csv"), 1 << 20))
+
+
+@pytest.mark.parametrize(
+    "address, public",
+    [
+        ("8.8.8.8", True),
+        ("2606:4700:4700::1111", True),
+        ("127.0.0.1", False),
+        ("10.1.2.3", False),
+        ("172.16.0.1", False),
+        ("192.168.1.1", False),
+        ("169.254.169.254", False),
+        ("100.64.0.1", False),
+        ("0.0.0.0", False),
+        ("224.0.0.1", False),
+        ("::1", False),
+        ("fd00::1", False),
+        ("fe80::1%eth0", False),
+        ("::ffff:127.0.0.1", False),
+        ("::ffff:10.0.0.1", False),
+    ],
+)
+def test_public_address(address, public):
+    assert public_address(address) is public
+
+
+# Literal addresses resolve without DNS
+PUBLIC_URL = "http://93.184.216.34/data.csv"
+
+
+def send(url: str, handler, requests: list):
+    """
+    Sends a checked GET through a transport answering with handler, requests collects what reached it
+    """
+
+    def record(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return handler(request)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(record)) as client:
+            response, _ = await send_checked(client, httpx.URL(url), {})
+            await response.aclose()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "http://127.0.0.1/data.csv",
+        "http://localhost:8000/data.csv",
+        "http://[::1]/data.csv",
+        "http://169.254.169.254/latest/meta-data/",
+        "ftp://93.184.216.34/data.csv",
+    ],
+)
+def test_send_checked_refuses_private_sources(url):
+    requests = []
+    with pytest.raises(ProbeError):
+        send(url, lambda request: httpx.Response(200), requests)
+    assert requests == []
+
+
+@pytest.mark.parametrize(
+    "location", ["http://127.0.0.1:5432/", "http://10.0.0.1/data.csv", "http://localhost/data.csv"]
+)
+def test_send_checked_refuses_redirects_to_private_addresses(location):
+    requests = []
+    with pytest.raises(ProbeError):
+        send(PUBLIC_URL, lambda request: httpx.Response(302, headers={"Location": location}), requests)
+    # The redirect is refused before anything is sent to it
+    assert [str(request.url) for request in requests] == [PUBLIC_URL]
+
+
+def test_send_checked_connects_to_the_checked_address():
+    requests = []
+    send(
+        PUBLIC_URL,
+        lambda request: (
+            httpx.Response(302, headers={"Location": "/moved.csv"})
+            if request.url.path == "/data.csv"
+            else httpx.Response(200)
+        ),
+        requests,
+    )
+    assert [str(request.url) for request in requests] == [PUBLIC_URL, "http://93.184.216.34/moved.csv"]
+
+
+def test_send_checked_stops_redirect_loops():
+    requests = []
+    with pytest.raises(ProbeError):
+        send(PUBLIC_URL, lambda request: httpx.Response(302, headers={"Location": PUBLIC_URL}), requests)
+    assert len(requests) == dataset_probe.MAX_REDIRECTS + 1
+
+
+class FileServer(BaseHTTPRequestHandler):
+    """
+    Serves `files` with single range requests, or ignoring them for paths under /norange/
+    """
+
+    files = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        content = self.files.get(self.path.removeprefix("/norange"))
+        if content is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match is None or self.path.startswith("/norange/"):
+            self.send_response(200)
+            body = content
+        else:
+            first, last = match.groups()
+            if first:
+                start, end = int(first), min(int(last or len(content) - 1), len(content) - 1)
+            else:
+                start, end = max(0, len(content) - int(last)), len(content) - 1
+            body = content[start : end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def file_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def loopback_allowed(monkeypatch):
+    # The stub server listens on loopback, which the probe refuses everywhere else
+    monkeypatch.setattr(dataset_probe, "public_address", lambda address: True)
+
+
+def probe_http(url: str, max_bytes: int) -> tuple:
+    async def run():
+        async with httpx.AsyncClient() as client:
+            async with open_http(client, url, max_bytes) as opened:
+                return opened.read_tail is not None, await measure(opened, max_bytes)
+
+    return asyncio.run(run())
+
+
+def test_open_http_reads_ranges(file_server, loopback_allowed, tmp_path):
+    FileServer.files["/rows.csv"] = CSV
+    assert probe_http(f"{file_server}/rows.csv", 1 << 20) == (True, (len(CSV), 3, 3))
+    # Only max_bytes are requested, the size still comes from Content-Range
+    assert probe_http(f"{file_server}/rows.csv", 10) == (True, (len(CSV), None, 3))
+
+
+def test_open_http_reads_the_parquet_footer(file_server, loopback_allowed, tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "rows.parquet"
+    write_parquet(path, 5000)
+    FileServer.files["/rows.parquet"] = path.read_bytes()
+    size = os.path.getsize(path)
+    assert probe_http(f"{file_server}/rows.parquet", 1 << 20) == (True, (size, 5000, 2))
+
+
+def test_open_http_without_ranges(file_server, loopback_allowed):
+    FileServer.files["/rows.ndjson"] = NDJSON
+    assert probe_http(f"{file_server}/norange/rows.ndjson", 1 << 20) == (False, (len(NDJSON), 3, 2))
+
+
+def test_open_http_raises_for_errors(file_server, loopback_allowed):
+    with pytest.raises(httpx.HTTPStatusError):
+        probe_http(f"{file_server}/missing.csv", 1 << 20)
+
+
+def test_open_http_refuses_loopback_by_default(file_server):
+    FileServer.files["/rows.csv"] = CSV
+    with pytest.raises(ProbeError):
+        probe_http(f"{file_server}/rows.csv", 1 << 20)
@@ -0,0 +1,75 @@
+from typing import List
+
+import pytest
+from sqlalchemy.orm import Session
+
+from schema import Dataset, DatasetTag, Tag
+
+MANY = 25
+
+
+def seed(db, datasets: int, tags: int) -> List[str]:
+    """
+    Datasets each linked to the same tags, ids in creation order
+    """
+    with Session(db.engine) as session:
+        tag_rows = [Tag(name=f"tag-{index}") for index in range(tags)]
+        dataset_rows = [
+            Dataset(
+                name=f"dataset-{index}",
+                description="Rainfall by district",
+                source=f"https://example.com/{index}.csv",
+                license="CC-BY-4.0",
+                format="csv",
+            )
+            for index in range(datasets)
+        ]
+        session.add_all(tag_rows + dataset_rows)
+        session.flush()
+        session.add_all(
+            DatasetTag(dataset_id=dataset.id, tag_id=tag.id)
+            for dataset in dataset_rows
+            for tag in tag_rows
+        )
+        session.commit()
+        return [str(dataset.id) for dataset in dataset_rows]
+
+
+def get(client, statements: list, url: str) -> dict:
+    """
+    Body of an uncached GET, statements holds only the ones it ran
+    """
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200, response.text
+    assert response.headers["X-Cache"] == "MISS"
+    return response.json()
+
+
+@pytest.mark.parametrize("rows", [1, MANY])
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        # The page, and the dataset count
+        ("/api/v1/dataset/?limit=100", 2),
+        # Plus the tags of the whole page in one query
+        ("/api/v1/dataset/?limit=100&include_tags=true", 3),
+        ("/api/v1/dataset/?limit=100&fields=id,name", 2),
+        # The page, and the search count
+        ("/api/v1/dataset/search?q=rainfall&limit=100", 2),
+        ("/api/v1/dataset/search?q=rainfall&limit=100&include_tags=true", 3),
+    ],
+)
+def test_list_statements_do_not_grow_with_rows(client, database, statements, url, expected, rows):
+    seed(database, rows, 3)
+    assert len(get(client, statements, url)["items"]) == rows
+    assert len(statements) == expected, statements
+
+
+@pytest.mark.parametrize("tags", [1, MANY])
+def test_dataset_statements_do_not_grow_with_tags(client, database, statements, tags):
+    dataset_id = seed(database, 1, tags)[0]
+    # The dataset with the latest tag write, and its tags
+    dataset = get(client, statements, f"/api/v1/dataset/{dataset_id}?include_tags=true")
+    assert len(dataset["tags"]) == tags
+    assert len(statements) == 2, statements
@@ -0,0 +1,34 @@
+from sqlalchemy import select
+
+from benchmarks import seed
+from schema import Dataset
+
+
+def bench_names(database) -> list:
+    with database.engine.connect() as connection:
+        return list(
+            connection.scalars(
+                select(Dataset.name).filter(Dataset.name.like("bench-0%")).order_by(Dataset.name)
+            )
+        )
+
+
+def test_seeding_resumes_after_other_rows(database, client, auth_headers):
+    seed.seed(5)
+    # Other datasets under the bench- prefix, like the ones older load benchmarks created
+    for index in range(3):
+        response = client.post(
+            "/api/v1/dataset/",
+            json={
+                "name": f"bench-load-run-{index}",
+                "description": "Rainfall by district",
+                "source": "https://data.gov.gh/load",
+                "license": "CC-BY-4.0",
+                "format": "csv",
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == 200, response.text
+
+    assert seed.seed(10)["datasets"] == 13
+    assert bench_names(database) == [f"bench-{index:07d}" for index in range(10)]
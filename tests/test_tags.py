@@ -0,0 +1,52 @@
+import json
+
+
+def import_tagged(client, headers: dict, count: int, tags: list):
+    records = [
+        {
+            "name": f"dataset-{index}",
+            "description": "Rainfall by district",
+            "source": f"https://example.com/{index}.csv",
+            "license": "CC-BY-4.0",
+            "format": "csv",
+            "tags": tags,
+        }
+        for index in range(count)
+    ]
+    response = client.post(
+        "/api/v1/dataset/bulk",
+        content="".join(json.dumps(record) + "\n" for record in records),
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.json()["errors"] == []
+
+
+def tag_id(client, name: str) -> str:
+    return next(tag["id"] for tag in client.get("/api/v1/tag/").json() if tag["name"] == name)
+
+
+def search(client, tag: str) -> tuple:
+    body = client.get("/api/v1/dataset/search", params={"tags": tag}).json()
+    return body["item_count"], len(body["items"])
+
+
+def test_renaming_a_tag_refreshes_search_totals(client, auth_headers):
+    import_tagged(client, auth_headers, 3, ["rain"])
+    assert search(client, "rain") == (3, 3)
+
+    response = client.put(f"/api/v1/tag/{tag_id(client, 'rain')}", json={"name": "rainfall"})
+    assert response.status_code == 200, response.text
+    assert search(client, "rain") == (0, 0)
+    assert search(client, "rainfall") == (3, 3)
+
+    # A new tag takes the old name
+    assert client.post("/api/v1/tag/", json={"name": "rain"}).status_code == 200
+    assert search(client, "rain") == (0, 0)
+
+
+def test_deleting_a_tag_refreshes_search_totals(client, auth_headers):
+    import_tagged(client, auth_headers, 2, ["rain"])
+    assert search(client, "rain") == (2, 2)
+
+    assert client.delete(f"/api/v1/tag/{tag_id(client, 'rain')}").status_code == 200
+    assert search(client, "rain") == (0, 0)
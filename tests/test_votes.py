@@ -0,0 +1,39 @@
+import asyncio
+
+from services import vote_buffer
+
+
+def test_flush_refreshes_the_dataset_and_top_list_only(client, auth_headers):
+    dataset = client.post(
+        "/api/v1/dataset/",
+        json={
+            "name": "rainfall",
+            "description": "Rainfall by district",
+            "source": "https://example.com/rainfall.csv",
+            "license": "CC-BY-4.0",
+            "format": "csv",
+        },
+        headers=auth_headers,
+    ).json()
+    detail_url = f"/api/v1/dataset/{dataset['id']}"
+    before = {url: client.get(url) for url in (detail_url, "/api/v1/dataset/top", "/api/v1/dataset/")}
+
+    response = client.put(f"/api/v1/dataset/upvote/{dataset['id']}", headers=auth_headers)
+    assert response.json()["votes"] == 1
+    assert asyncio.run(vote_buffer.flush()) == 1
+
+    detail = client.get(detail_url)
+    assert detail.headers["X-Cache"] == "MISS"
+    assert detail.json()["votes"] == 1
+    # Votes are not an edit, but the ETag still changes with them
+    assert detail.json()["updated_at"] == before[detail_url].json()["updated_at"]
+    assert detail.headers["ETag"] != before[detail_url].headers["ETag"]
+
+    top = client.get("/api/v1/dataset/top")
+    assert top.headers["X-Cache"] == "MISS"
+    assert top.json()[0]["votes"] == 1
+
+    # Other lists keep their cached page until it expires
+    page = client.get("/api/v1/dataset/")
+    assert page.headers["X-Cache"] == "HIT"
+    assert page.json()["items"][0]["votes"] == 0